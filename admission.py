@@ -0,0 +1,147 @@
+"""
+Admission control for CPU/IO-heavy requests (uploads and thumbnailing).
+
+``@heavy`` on a view makes it take a slot before it runs. There are two
+limits:
+
+  * per process: a semaphore of ADMISSION_PER_PROCESS slots, so one
+    gunicorn worker (threads) never spends all its threads in Pillow;
+  * across processes: ADMISSION_GLOBAL slot files under ADMISSION_LOCK_DIR,
+    each held with a non-blocking flock (msvcrt.locking on Windows). The
+    kernel drops the lock if the worker dies, so a crash can't leak a slot.
+
+A request waits up to ADMISSION_WAIT_SECONDS for both. If it still has no
+slot it gets 503 with Retry-After, so clients back off and page views are
+not stuck behind a queue of uploads. GET/HEAD requests to a decorated
+view are never limited.
+
+Metrics: app_admission_waiting / app_admission_inflight gauges (summed
+over workers by /metrics), app_admission_rejected_total and the
+app_admission_wait_seconds histogram.
+"""
+import os
+import pathlib
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+POLL_S = 0.05
+
+_sem_lock = threading.Lock()
+_semaphores = {}   # per-process limit -> BoundedSemaphore (one per app config)
+
+
+def _semaphore(limit: int) -> threading.BoundedSemaphore:
+    with _sem_lock:
+        sem = _semaphores.get(limit)
+        if sem is None:
+            sem = _semaphores[limit] = threading.BoundedSemaphore(limit)
+        return sem
+
+
+def _lock_dir() -> pathlib.Path:
+    d = current_app.config.get("ADMISSION_LOCK_DIR") or os.path.join(current_app.config["UPLOAD_ROOT"], ".locks")
+    return pathlib.Path(d)
+
+
+def _lock_nowait(fd) -> bool:
+    """Take an exclusive lock on fd without blocking; False if another open file holds it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)  # first byte; dropped when fd closes
+        return True
+    except OSError:  # BlockingIOError from flock, PermissionError from locking
+        return False
+
+
+def _try_global_slot(slots: int, lock_dir: pathlib.Path):
+    """An fd holding one of the slot flocks, or None if all are taken."""
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    order = list(range(slots))
+    random.shuffle(order)  # spread waiters over the slots instead of all hammering slot 0
+    for i in order:
+        # a fresh open per attempt: the lock belongs to the open file, so threads
+        # sharing one fd would all "hold" the same slot
+        fd = os.open(lock_dir / f"admission-{i}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        if _lock_nowait(fd):
+            return fd
+        os.close(fd)
+    return None
+
+
+class Slot:
+    def __init__(self, sem, fd):
+        self.sem, self.fd = sem, fd
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)  # closing drops the flock
+        self.sem.release()
+        metrics.REGISTRY.add_gauge("app_admission_inflight", None, -1)
+
+
+def acquire(per_process: int, global_slots: int, wait_s: float, lock_dir: pathlib.Path):
+    """A Slot, or None if none came free within wait_s."""
+    deadline = time.monotonic() + wait_s
+    t0 = time.perf_counter()
+    sem = _semaphore(per_process)
+    metrics.REGISTRY.add_gauge("app_admission_waiting", None, 1)
+    try:
+        if not sem.acquire(timeout=max(0.0, wait_s)):
+            return None
+        fd = None
+        if global_slots > 0:
+            while (fd := _try_global_slot(global_slots, lock_dir)) is None:
+                if time.monotonic() >= deadline:
+                    sem.release()
+                    return None
+                time.sleep(POLL_S)
+        metrics.REGISTRY.add_gauge("app_admission_inflight", None, 1)
+        return Slot(sem, fd)
+    finally:
+        metrics.REGISTRY.add_gauge("app_admission_waiting", None, -1)
+        metrics.REGISTRY.observe("app_admission_wait_seconds", None, time.perf_counter() - t0)
+
+
+def _busy_response():
+    retry = str(current_app.config["ADMISSION_RETRY_AFTER"])
+    metrics.REGISTRY.inc("app_admission_rejected_total", {"endpoint": request.endpoint or "unmatched"})
+    if request.path.startswith("/api/") or request.accept_mimetypes.best == "application/json":
+        resp = jsonify(ok=False, error="busy", retry_after=int(retry))
+    else:
+        resp = current_app.response_class(
+            "The server is busy processing other uploads. Please try again in a few seconds.\n",
+            mimetype="text/plain")
+    resp.status_code = 503
+    resp.headers["Retry-After"] = retry
+    return resp
+
+
+def heavy(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        cfg = current_app.config
+        if request.method in ("GET", "HEAD") or not cfg["ADMISSION_PER_PROCESS"]:
+            return fn(*args, **kwargs)
+        slot = acquire(cfg["ADMISSION_PER_PROCESS"], cfg["ADMISSION_GLOBAL"],
+                       cfg["ADMISSION_WAIT_SECONDS"], _lock_dir())
+        if slot is None:
+            return _busy_response()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            slot.release()
+    return wrapper
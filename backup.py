@@ -0,0 +1,276 @@
+"""
+Online backups of the SQLite database and UPLOAD_ROOT.
+
+A snapshot is a directory BACKUP_ROOT/<YYYYmmdd-HHMMSS>/ holding
+
+    media.db        copy made with SQLite's online backup API
+    uploads/        the upload tree
+    manifest.json   per-file size, mtime_ns and sha256, plus db details
+
+The database is copied BACKUP_PAGES_PER_STEP pages at a time with a short
+sleep between steps. The copy runs inside one read transaction, so it is a
+consistent point-in-time copy. With WAL the site keeps reading and writing
+while it runs. The copy is then checked with PRAGMA integrity_check.
+
+Uploads are incremental. A file whose size and mtime match the previous
+snapshot's manifest is hard-linked to that snapshot's copy without being
+read. A changed or new file is hashed; if some file in the previous
+snapshot has the same sha256 (a rename or move), it is linked too.
+Otherwise it is copied. Backups never link to the live files, so editing an
+upload can't alter a snapshot. Unchanged snapshots cost only directory
+entries, and deleting an old one frees only what no newer snapshot shares.
+
+A snapshot is built under a ".tmp-" name and renamed when complete, so
+list/restore/retention never see a half-written one.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+from uploads import iter_upload_files
+
+DB_NAME = "media.db"
+UPLOADS_DIR = "uploads"
+MANIFEST = "manifest.json"
+READ_SIZE = 1024 * 1024
+
+
+def _sha256(path, read_size: int = READ_SIZE) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(read_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _copy_hashing(src, dest) -> str:
+    """Copy src to dest (with its mtime) and return the sha256 of what was written."""
+    h = hashlib.sha256()
+    with open(src, "rb") as fin, open(dest, "wb") as fout:
+        while chunk := fin.read(READ_SIZE):
+            h.update(chunk)
+            fout.write(chunk)
+    shutil.copystat(src, dest)
+    return h.hexdigest()
+
+
+def _link_or_copy(src, dest):
+    try:
+        os.link(src, dest)
+        return True
+    except OSError:  # other filesystem, link limit, ...
+        shutil.copy2(src, dest)
+        return False
+
+
+# ---------------- Snapshots ----------------
+def snapshots(root) -> list[pathlib.Path]:
+    """Complete snapshots, oldest first."""
+    root = pathlib.Path(root)
+    if not root.is_dir():
+        return []
+    return sorted(p for p in root.iterdir() if p.is_dir() and not p.name.startswith(".") and (p / MANIFEST).is_file())
+
+
+def load_manifest(snapshot) -> dict:
+    return json.loads((pathlib.Path(snapshot) / MANIFEST).read_text())
+
+
+def backup_database(db_path, dest, pages_per_step: int = 1024, sleep: float = 0.005) -> dict:
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    dst = sqlite3.connect(dest)
+    t0 = time.perf_counter()
+    try:
+        # Hold one read transaction for the whole copy. Every step then reads
+        # the same WAL snapshot. Without it, each commit by another connection
+        # restarts the backup from page 1, and a busy site never finishes.
+        src.execute("BEGIN")
+        src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=pages_per_step, sleep=sleep)
+        src.execute("COMMIT")
+        integrity = dst.execute("PRAGMA integrity_check").fetchone()[0]
+        dst.execute("PRAGMA journal_mode=DELETE")  # a self-contained file, no -wal beside it
+    finally:
+        dst.close()
+        src.close()
+    return {"file": DB_NAME, "size": os.path.getsize(dest), "sha256": _sha256(dest),
+            "integrity": integrity, "seconds": round(time.perf_counter() - t0, 2)}
+
+
+def backup_uploads(upload_root, dest, previous=None, log=print) -> tuple[dict, dict]:
+    """Copy/link the upload tree into dest; returns (files manifest, stats)."""
+    prev_files = (load_manifest(previous).get("files") or {}) if previous else {}
+    prev_dir = pathlib.Path(previous) / UPLOADS_DIR if previous else None
+    by_hash = {meta[2]: rel for rel, meta in prev_files.items()}
+    files = {}
+    stats = {"files": 0, "bytes": 0, "linked": 0, "copied": 0, "copied_bytes": 0}
+    made_dirs = set()
+
+    for rel, entry in iter_upload_files(upload_root):
+        st = entry.stat(follow_symlinks=False)
+        target = dest / rel
+        if target.parent not in made_dirs:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            made_dirs.add(target.parent)
+
+        old = prev_files.get(rel)
+        if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+            sha = old[2]
+            linked = _link_or_copy(prev_dir / rel, target)
+        else:
+            sha = _sha256(entry.path)
+            same = by_hash.get(sha)
+            if same is not None:
+                linked = _link_or_copy(prev_dir / same, target)
+            else:
+                sha = _copy_hashing(entry.path, target)
+                linked = False
+        files[rel] = [st.st_size, st.st_mtime_ns, sha]
+        stats["files"] += 1
+        stats["bytes"] += st.st_size
+        if linked:
+            stats["linked"] += 1
+        else:
+            stats["copied"] += 1
+            stats["copied_bytes"] += st.st_size
+        if stats["files"] % 5000 == 0:
+            log(f"  ... {stats['files']} files")
+    return files, stats
+
+
+def create(backup_root, db_path, upload_root, pages_per_step: int = 1024, log=print) -> pathlib.Path:
+    backup_root = pathlib.Path(backup_root)
+    backup_root.mkdir(parents=True, exist_ok=True)
+    name = datetime.now().strftime("%Y%m%d-%H%M%S")
+    final = backup_root / name
+    if final.exists():
+        raise FileExistsError(f"snapshot {name} already exists")
+    work = backup_root / f".tmp-{name}"
+    shutil.rmtree(work, ignore_errors=True)
+    (work / UPLOADS_DIR).mkdir(parents=True)
+    previous = (snapshots(backup_root) or [None])[-1]
+
+    try:
+        t0 = time.perf_counter()
+        db_info = backup_database(db_path, work / DB_NAME, pages_per_step)
+        log(f"database: {db_info['size'] / 1e6:.1f} MB in {db_info['seconds']}s, integrity {db_info['integrity']}")
+        if db_info["integrity"] != "ok":
+            raise RuntimeError(f"backup copy failed integrity_check: {db_info['integrity']}")
+        files, stats = backup_uploads(upload_root, work / UPLOADS_DIR, previous, log=log)
+        log(f"uploads: {stats['files']} files ({stats['bytes'] / 1e6:.1f} MB); "
+            f"{stats['linked']} linked, {stats['copied']} copied ({stats['copied_bytes'] / 1e6:.1f} MB)")
+        manifest = {"name": name, "created": datetime.now().isoformat(timespec="seconds"),
+                    "previous": previous.name if previous else None, "db": db_info,
+                    "uploads": stats, "seconds": round(time.perf_counter() - t0, 2), "files": files}
+        (work / MANIFEST).write_text(json.dumps(manifest, separators=(",", ":")))
+        os.replace(work, final)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    return final
+
+
+def prune(backup_root, keep_daily: int, keep_weekly: int, keep_monthly: int, log=print) -> list[str]:
+    """
+    Grandfather-father-son rotation: keep the newest snapshot of each of the
+    last keep_daily days, keep_weekly ISO weeks and keep_monthly months
+    (the newest snapshot is always kept); delete the rest.
+    """
+    snaps = list(reversed(snapshots(backup_root)))  # newest first
+    keep = set(snaps[:1])
+    for count, key in ((keep_daily, "%Y-%m-%d"), (keep_weekly, "%G-W%V"), (keep_monthly, "%Y-%m")):
+        seen = []
+        for snap in snaps:
+            try:
+                period = datetime.strptime(snap.name, "%Y%m%d-%H%M%S").strftime(key)
+            except ValueError:
+                keep.add(snap)  # not ours to rotate
+                continue
+            if period not in seen:
+                seen.append(period)
+                if len(seen) <= count:
+                    keep.add(snap)
+    removed = []
+    for snap in snaps:
+        if snap not in keep:
+            shutil.rmtree(snap)
+            removed.append(snap.name)
+            log(f"removed old snapshot {snap.name}")
+    return removed
+
+
+def verify(snapshot, deep: bool = False) -> list[str]:
+    """Problems found in a snapshot (empty list = good). deep=True re-hashes every upload."""
+    snapshot = pathlib.Path(snapshot)
+    problems = []
+    manifest = load_manifest(snapshot)
+    db_file = snapshot / DB_NAME
+    if not db_file.is_file():
+        return [f"{DB_NAME} missing"]
+    if _sha256(db_file) != manifest["db"]["sha256"]:
+        problems.append(f"{DB_NAME}: sha256 differs from manifest")
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        problems.append(f"{DB_NAME}: integrity_check: {result}")
+
+    for rel, (size, _mtime, sha) in manifest.get("files", {}).items():
+        path = snapshot / UPLOADS_DIR / rel
+        try:
+            actual = path.stat().st_size
+        except FileNotFoundError:
+            problems.append(f"missing {rel}")
+            continue
+        if actual != size:
+            problems.append(f"{rel}: size {actual}, expected {size}")
+        elif deep and _sha256(path) != sha:
+            problems.append(f"{rel}: sha256 differs")
+    return problems
+
+
+def restore(snapshot, db_path, upload_root, with_db: bool = True, with_uploads: bool = True, log=print) -> dict:
+    """
+    Put a snapshot back. The database is swapped in with os.replace (stop the
+    app first); uploads that are missing or differ in size/mtime are copied
+    back (copies, never links into the backup). Files not in the snapshot are
+    left alone and only counted.
+    """
+    snapshot = pathlib.Path(snapshot)
+    manifest = load_manifest(snapshot)
+    out = {"db": False, "restored": 0, "unchanged": 0, "extra": 0}
+    if with_db:
+        db_path = pathlib.Path(db_path)
+        tmp = db_path.with_name(f".{db_path.name}.restore")
+        shutil.copyfile(snapshot / DB_NAME, tmp)
+        for suffix in ("-wal", "-shm"):  # stale WAL frames would be replayed over the restored file
+            pathlib.Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+        os.replace(tmp, db_path)
+        out["db"] = True
+        log(f"database restored from {snapshot.name}")
+    if with_uploads:
+        root = pathlib.Path(upload_root)
+        files = manifest.get("files", {})
+        for rel, (size, mtime_ns, _sha) in files.items():
+            dest = root / rel
+            try:
+                st = dest.stat()
+                if st.st_size == size and st.st_mtime_ns == mtime_ns:
+                    out["unchanged"] += 1
+                    continue
+            except FileNotFoundError:
+                pass
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(snapshot / UPLOADS_DIR / rel, dest)
+            out["restored"] += 1
+        out["extra"] = sum(1 for rel, _ in iter_upload_files(root) if rel not in files)
+        log(f"uploads: {out['restored']} restored, {out['unchanged']} unchanged, "
+            f"{out['extra']} not in the snapshot (left in place)")
+    return out
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic dataset generator.
+
+Fills an empty database (and optionally UPLOAD_ROOT) with realistic volumes:
+tracker Items with tags, chapters and comments, Trips with photos and
+comments, reactions from a handful of users, and WeddingItems across every
+kind including image boards. The same --seed always produces the same rows.
+
+    python bench/datagen.py --db /tmp/bench.db --uploads /tmp/bench-up --scale 10
+
+Every user gets the password "bench"; "bench" itself is an admin.
+Rows are inserted in bulk with explicit ids, so the target must be empty.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from models import (  # noqa: E402
+    db, MEDIA_TYPES, User, Item, Chapter, ItemComment, Trip, Photo, Comment, CommentReaction, WeddingItem,
+)
+
+WORDS = ("silver moon river garden iron paper city night ghost winter crown blade tide ember glass "
+         "north summer velvet shadow echo harbor lantern orchard quiet storm wild hollow atlas").split()
+TAGS = ("action adventure comedy drama fantasy horror isekai mystery romance sci-fi slice-of-life sports "
+        "thriller historical mecha music psychological school supernatural tragedy cozy dark short "
+        "long-running favorite reread dropped award-winning classic indie co-op open-world").split()
+PLACES = ("Lisbon Kyoto Banff Reykjavik Oaxaca Tallinn Hobart Marrakesh Ljubljana Hanoi Bergen "
+          "Valparaiso Zanzibar Cusco Sapporo Galway Porto Tbilisi").split()
+BOARD_KINDS = {"ring": "rings", "cake": "cakes", "photo": "photos", "bridesmaid": "bridesmaids",
+               "groomsman": "groomsmen", "aesthetic": "aesthetic"}
+
+PRESETS = {  # per unit of --scale
+    "items": 100, "trips": 20, "photos_per_trip": 12, "wedding_per_kind": 15,
+    "comments_max": 4, "users": 6,
+}
+
+
+def _jpeg_variants(rng, n=12, size=(320, 240)):
+    from PIL import Image
+    out = []
+    for _ in range(n):
+        a = tuple(rng.randrange(256) for _ in range(3))
+        b = tuple(rng.randrange(256) for _ in range(3))
+        im = Image.new("RGB", size, a)
+        im.paste(Image.new("RGB", (size[0] // 2, size[1]), b), (size[0] // 2, 0))
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=80)
+        thumb = io.BytesIO()
+        im.resize((size[0] // 2, size[1] // 2)).save(thumb, "JPEG", quality=80)
+        out.append((buf.getvalue(), thumb.getvalue()))
+    return out
+
+
+def _write(root, rel, data):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _title(rng, k=2):
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(k))
+
+
+def generate(scale: float = 1.0, seed: int = 1, upload_root: str | None = None, log=print) -> dict:
+    """Populate the current app's (empty) database. Returns row counts."""
+    rng = random.Random(seed)
+    now = datetime(2025, 6, 1)
+    n = {k: max(1, int(v * scale)) for k, v in PRESETS.items()}
+    n["photos_per_trip"] = PRESETS["photos_per_trip"]
+    n["comments_max"] = PRESETS["comments_max"]
+    n["users"] = PRESETS["users"]
+    images = _jpeg_variants(rng) if upload_root else []
+    pdf = b"%PDF-1.4\n1 0 obj<<>>endobj\ntrailer<<>>\n%%EOF\n"
+    t0 = time.perf_counter()
+
+    pw = generate_password_hash("bench", method="pbkdf2:sha256:1")
+    users = [dict(id=i + 1, username="bench" if i == 0 else f"user{i}", password_hash=pw,
+                  is_admin=(i == 0), can_travel_edit=(i < 3), can_approve_users=(i == 0),
+                  created_at=now) for i in range(n["users"])]
+    user_ids = [u["id"] for u in users]
+
+    items, chapters, item_comments = [], [], []
+    for i in range(1, n["items"] + 1):
+        mtype = rng.choice(MEDIA_TYPES)
+        items.append(dict(
+            id=i, title=_title(rng, rng.randint(1, 4)), media_type=mtype, status="info",
+            tags=", ".join(rng.sample(TAGS, rng.randint(0, 5))), notes=" ".join(rng.choices(WORDS, k=12)),
+            chapter_total=rng.randint(10, 300) if mtype in ("book", "manga", "manhwa") else None,
+            seasons=rng.randint(1, 6) if mtype in ("show", "anime") else None,
+            year=rng.randint(1980, 2025), added_at=now - timedelta(days=rng.randint(0, 900)),
+        ))
+        if mtype in ("book", "manga", "manhwa"):
+            for num in range(1, rng.randint(0, 20) + 1):
+                rel = f"tracker/{i}/chapters/ch-{num:03d}.pdf"
+                chapters.append(dict(id=len(chapters) + 1, item_id=i, number=num, source_path=rel, created_at=now))
+                if upload_root:
+                    _write(upload_root, rel, pdf)
+        for _ in range(rng.randint(0, n["comments_max"])):
+            uid = rng.choice(user_ids)
+            item_comments.append(dict(id=len(item_comments) + 1, item_id=i, user_id=uid,
+                                      author=users[uid - 1]["username"], body=" ".join(rng.choices(WORDS, k=8)),
+                                      created_at=now - timedelta(minutes=rng.randint(0, 100000))))
+
+    trips, photos, trip_comments = [], [], []
+    for t in range(1, n["trips"] + 1):
+        place = rng.choice(PLACES)
+        trips.append(dict(id=t, title=f"{place} {rng.randint(2015, 2025)}", address=f"{place}",
+                          comments=" ".join(rng.choices(WORDS, k=20)),
+                          lat=rng.uniform(-60, 70), lon=rng.uniform(-170, 170),
+                          created_at=now - timedelta(days=rng.randint(0, 2000))))
+        for _ in range(rng.randint(0, n["photos_per_trip"] * 2)):
+            pid = len(photos) + 1
+            rel = f"travel/{t}/{pid:08x}.jpg"
+            rel_thumb = f"travel/{t}/thumbs/{pid:08x}.jpg"
+            size = 0
+            if upload_root:
+                full, thumb = rng.choice(images)
+                _write(upload_root, rel, full)
+                _write(upload_root, rel_thumb, thumb)
+                size = len(full)
+            photos.append(dict(id=pid, trip_id=t, stored_path=rel, thumb_path=rel_thumb,
+                               original_name=f"IMG_{pid:05d}.jpg", mime_type="image/jpeg",
+                               size_bytes=size, uploaded_at=now))
+        for _ in range(rng.randint(0, n["comments_max"])):
+            uid = rng.choice(user_ids)
+            trip_comments.append(dict(id=len(trip_comments) + 1, trip_id=t, user_id=uid,
+                                      author=users[uid - 1]["username"], body=" ".join(rng.choices(WORDS, k=8)),
+                                      created_at=now - timedelta(minutes=rng.randint(0, 100000))))
+
+    reactions = []
+    for kind, rows in (("item", item_comments), ("trip", trip_comments)):
+        for c in rows:
+            for uid in rng.sample(user_ids, rng.randint(0, len(user_ids))):
+                reactions.append(dict(id=len(reactions) + 1, kind=kind, comment_id=c["id"], user_id=uid,
+                                      value=rng.choice((1, 1, -1)), created_at=now))
+
+    wedding = []
+    kinds = ["idea", "link", "vendor", "venue", "task", "ceremony", "reception"] + list(BOARD_KINDS)
+    for kind in kinds:
+        for j in range(1, n["wedding_per_kind"] + 1):
+            wid = len(wedding) + 1
+            row = dict(id=wid, kind=kind, title=f"{kind.capitalize()} {_title(rng)}",
+                       notes=" ".join(rng.choices(WORDS, k=10)), meta={}, created_by_user_id=1,
+                       created_at=now - timedelta(hours=rng.randint(0, 5000)), is_starred=rng.random() < 0.2)
+            if kind == "link":
+                row["url"] = f"https://example.com/{wid}"
+            elif kind in ("ceremony", "reception"):
+                row["meta"] = {"order": j}
+            elif kind == "task":
+                row["meta"] = {"owner": rng.choice(("Tiny", "Rosie")), "status": rng.choice(("todo", "done")),
+                               "due": (now + timedelta(days=rng.randint(-30, 200))).date().isoformat()}
+            elif kind in BOARD_KINDS:
+                rel_thumb = f"wedding/{BOARD_KINDS[kind]}/{wid}/thumbs/{wid:08x}.jpg"
+                if upload_root:
+                    full, thumb = rng.choice(images)
+                    _write(upload_root, f"wedding/{BOARD_KINDS[kind]}/{wid}/{wid:08x}.jpg", full)
+                    _write(upload_root, rel_thumb, thumb)
+                row["image_path"] = rel_thumb
+            wedding.append(row)
+
+    for model, rows in ((User, users), (Item, items), (Chapter, chapters), (ItemComment, item_comments),
+                        (Trip, trips), (Photo, photos), (Comment, trip_comments),
+                        (CommentReaction, reactions), (WeddingItem, wedding)):
+        for start in range(0, len(rows), 2000):
+            db.session.execute(insert(model), rows[start:start + 2000])
+    db.session.commit()
+
+    counts = {"users": len(users), "items": len(items), "chapters": len(chapters),
+              "item_comments": len(item_comments), "trips": len(trips), "photos": len(photos),
+              "trip_comments": len(trip_comments), "reactions": len(reactions), "wedding_items": len(wedding)}
+    if log:
+        log(f"generated {counts} in {time.perf_counter() - t0:.1f}s")
+    return counts
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Generate a synthetic dataset into an empty database.")
+    ap.add_argument("--db", required=True, help="SQLite file path (created if missing; must be empty)")
+    ap.add_argument("--uploads", help="UPLOAD_ROOT to write JPEG/PDF files into (omit for rows only)")
+    ap.add_argument("--scale", type=float, default=1.0, help="1.0 = 100 items, 20 trips, ~240 photos")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    from app import create_app, ensure_schema
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.abspath(args.db),
+                      "UPLOAD_ROOT": args.uploads or os.path.join(os.path.dirname(os.path.abspath(args.db)), "uploads")})
+    ensure_schema(app)
+    with app.app_context():
+        if db.session.query(Item.id).first() or db.session.query(Trip.id).first():
+            print("Database already has data; point --db at a new file.")
+            return 1
+        # home cards / schema rows from migrations are fine; users must be ours
+        db.session.query(User).delete()
+        generate(args.scale, args.seed, args.uploads)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark runner.
+
+Drives the key read and write endpoints at several concurrency levels and
+prints (or writes) one JSON document with p50/p95/p99 latency, error count
+and throughput per (endpoint, concurrency), tagged with the current git
+commit so runs can be compared:
+
+    # in-process: generates a dataset into a temp dir, Flask test client per thread
+    python bench/run.py --scale 5 --concurrency 1 4 16 --out before.json
+
+    # against a running server (data from bench/datagen.py, user bench/bench)
+    python bench/run.py --url http://127.0.0.1:8000 --out after.json
+
+    python bench/run.py --compare before.json after.json
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = ["tracker_rows", "travel", "api_trips", "react", "wedding_upload", "travel_upload"]
+
+
+def _jpeg_bytes(seed: int) -> bytes:
+    from PIL import Image
+    rng = random.Random(seed)
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), tuple(rng.randrange(256) for _ in range(3))).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+# ---------------- Clients ----------------
+class TestClientDriver:
+    """One Flask test client per thread, all sharing one app and SQLite file."""
+
+    def __init__(self, app):
+        self.app = app
+        self._tls = threading.local()
+
+    def _client(self):
+        c = getattr(self._tls, "client", None)
+        if c is None:
+            c = self._tls.client = self.app.test_client()
+            c.post("/login", data={"username": "bench", "password": "bench"})
+        return c
+
+    def get(self, path):
+        r = self._client().get(path)
+        return r.status_code, len(r.data)
+
+    def post_json(self, path, payload):
+        r = self._client().post(path, json=payload)
+        return r.status_code, len(r.data)
+
+    def post_files(self, path, fields, files):
+        data = dict(fields)
+        for name, filename, blob in files:
+            data.setdefault(name, []).append((io.BytesIO(blob), filename))
+        r = self._client().post(path, data=data, content_type="multipart/form-data")
+        return r.status_code, len(r.data)
+
+
+class HttpDriver:
+    """urllib with a cookie jar per thread; talks to gunicorn or the dev server."""
+
+    def __init__(self, base_url):
+        self.base = base_url.rstrip("/")
+        self._tls = threading.local()
+
+    def _opener(self):
+        op = getattr(self._tls, "opener", None)
+        if op is None:
+            op = self._tls.opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+            body = urllib.parse.urlencode({"username": "bench", "password": "bench"}).encode()
+            op.open(self.base + "/login", body).read()
+        return op
+
+    def _send(self, req):
+        try:
+            with self._opener().open(req) as resp:
+                return resp.status, len(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read() or b"")
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base + path))
+
+    def post_json(self, path, payload):
+        return self._send(urllib.request.Request(self.base + path, data=json.dumps(payload).encode(),
+                                                 headers={"Content-Type": "application/json"}))
+
+    def post_files(self, path, fields, files):
+        boundary = uuid.uuid4().hex
+        out = io.BytesIO()
+        for k, v in fields.items():
+            out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+        for name, filename, blob in files:
+            out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                      f'filename="{filename}"\r\nContent-Type: image/jpeg\r\n\r\n'.encode())
+            out.write(blob + b"\r\n")
+        out.write(f"--{boundary}--\r\n".encode())
+        return self._send(urllib.request.Request(
+            self.base + path, data=out.getvalue(),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}))
+
+
+# ---------------- Scenarios ----------------
+def make_scenarios(driver, ids):
+    photos = [_jpeg_bytes(i) for i in range(4)]
+    rng = random.Random(7)
+    lock = threading.Lock()
+
+    def pick(seq):
+        with lock:
+            return rng.choice(seq)
+
+    return {
+        "tracker_rows": lambda: driver.get("/tracker/rows?type=" + pick(["book", "manga", "show", "game"])),
+        "travel": lambda: driver.get("/travel"),
+        "api_trips": lambda: driver.get("/api/trips"),
+        "react": lambda: driver.post_json(f"/api/comments/trip/{pick(ids['trip_comments'])}/react",
+                                          {"action": pick(["like", "dislike"])}),
+        "wedding_upload": lambda: driver.post_files(
+            "/wedding/upload/rings", {}, [("images", f"r{i}.jpg", photos[i]) for i in range(2)]),
+        "travel_upload": lambda: driver.post_files(
+            f"/travel/{pick(ids['trips'])}/update",
+            {"title": "Bench trip", "address": "Bench", "lat": "1.0", "lon": "2.0"},
+            [("photos", f"p{i}.jpg", photos[i]) for i in range(3)]),
+    }
+
+
+def _pct(sorted_ms, p):
+    if not sorted_ms:
+        return None
+    k = max(0, min(len(sorted_ms) - 1, int(round(p / 100.0 * len(sorted_ms) + 0.5)) - 1))
+    return round(sorted_ms[k], 2)
+
+
+def run_level(fn, concurrency: int, total: int) -> dict:
+    lat, errors = [], 0
+    lat_lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            status, _size = fn()
+            ok = status < 400
+        except Exception:
+            ok = False
+        ms = (time.perf_counter() - t0) * 1000.0
+        with lat_lock:
+            lat.append(ms)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "requests": total, "errors": errors, "wall_s": round(wall, 3),
+        "throughput_rps": round(total / wall, 1) if wall else None,
+        "mean_ms": round(sum(lat) / len(lat), 2) if lat else None,
+        "p50_ms": _pct(lat, 50), "p95_ms": _pct(lat, 95), "p99_ms": _pct(lat, 99),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(a_path, b_path):
+    a, b = (json.load(open(p)) for p in (a_path, b_path))
+    index = {(r["scenario"], r["concurrency"]): r for r in a["results"]}
+    print(f"{a.get('commit')} -> {b.get('commit')}")
+    print(f"{'scenario':16} {'conc':>4} {'p50 ms':>16} {'p95 ms':>16} {'rps':>16}")
+    for r in b["results"]:
+        o = index.get((r["scenario"], r["concurrency"]))
+        if not o:
+            continue
+        fmt = lambda x, y: f"{x or 0:>7.1f}->{y or 0:<7.1f}"
+        print(f"{r['scenario']:16} {r['concurrency']:>4} {fmt(o['p50_ms'], r['p50_ms'])} "
+              f"{fmt(o['p95_ms'], r['p95_ms'])} {fmt(o['throughput_rps'], r['throughput_rps'])}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark key endpoints at several concurrency levels.")
+    ap.add_argument("--url", help="base URL of a running server; default is in-process test clients")
+    ap.add_argument("--scale", type=float, default=2.0, help="dataset scale for in-process runs")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--requests", type=int, default=100, help="requests per scenario per level")
+    ap.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    ap.add_argument("--compare", nargs=2, metavar=("A.json", "B.json"))
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    tmp = None
+    if args.url:
+        driver = HttpDriver(args.url)
+        # trip ids come from the server; datagen numbers comments from 1 so low ids exist
+        trips = json.loads(driver._opener().open(driver.base + "/api/trips").read())
+        ids = {"trips": [t["id"] for t in trips] or [1], "trip_comments": list(range(1, 50))}
+        target = args.url
+    else:
+        from app import create_app, ensure_schema
+        from datagen import generate
+        from models import db, Comment, Trip, User
+        tmp = tempfile.TemporaryDirectory(prefix="tinybench-")
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp.name, "bench.db"),
+            "UPLOAD_ROOT": os.path.join(tmp.name, "uploads"),
+            "SESSION_COOKIE_SECURE": False,
+        })
+        ensure_schema(app)
+        with app.app_context():
+            db.session.query(User).delete()
+            counts = generate(args.scale, args.seed, app.config["UPLOAD_ROOT"], log=None)
+            ids = {"trips": [t for (t,) in db.session.query(Trip.id)],
+                   "trip_comments": [c for (c,) in db.session.query(Comment.id)] or [1]}
+        driver = TestClientDriver(app)
+        target = f"testclient scale={args.scale} {counts}"
+
+    scenarios = make_scenarios(driver, ids)
+    results = []
+    for name in args.scenarios:
+        for conc in args.concurrency:
+            res = run_level(scenarios[name], conc, args.requests)
+            results.append({"scenario": name, "concurrency": conc, **res})
+            print(f"{name:16} c={conc:<3} p50={res['p50_ms']}ms p95={res['p95_ms']}ms "
+                  f"p99={res['p99_ms']}ms {res['throughput_rps']} rps errors={res['errors']}", file=sys.stderr)
+
+    doc = {"commit": _git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "target": target,
+           "python": sys.version.split()[0], "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+    else:
+        print(json.dumps(doc, indent=2))
+    if tmp:
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Read/write concurrency benchmark: stock SQLite settings vs. the tuned profile.
+
+Spawns writer processes that hold a write transaction open for --hold-ms
+(standing in for an upload that inserts rows and thumbnails before commit)
+and reader processes that run the kind of SELECTs the list pages do.
+Prints one JSON line per profile:
+
+    python bench/sqlite_profile.py --seconds 5 --writers 2 --readers 6
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlite_tuning import apply_pragmas  # noqa: E402
+
+TUNED = {
+    "journal_mode": "WAL", "busy_timeout": 15000, "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024, "cache_size": -65536, "temp_store": "MEMORY",
+}
+
+
+def _connect(path, pragmas, timeout):
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    if pragmas:
+        apply_pragmas(conn, pragmas)
+    return conn
+
+
+def _setup(path, pragmas):
+    conn = _connect(path, pragmas, 5.0)
+    conn.execute("CREATE TABLE photo (id INTEGER PRIMARY KEY, trip_id INTEGER, stored_path TEXT, size_bytes INTEGER)")
+    conn.execute("CREATE INDEX ix_photo_trip_id ON photo (trip_id)")
+    conn.executemany("INSERT INTO photo (trip_id, stored_path, size_bytes) VALUES (?, ?, ?)",
+                     [(i % 200, f"travel/{i % 200}/{i:08x}.jpg", 1000 + i) for i in range(20000)])
+    conn.close()
+
+
+def _writer(path, pragmas, timeout, hold_ms, stop_at, out):
+    conn = _connect(path, pragmas, timeout)
+    ok = locked = 0
+    while time.time() < stop_at:
+        try:
+            conn.execute("BEGIN")
+            conn.execute("INSERT INTO photo (trip_id, stored_path, size_bytes) VALUES (1, 'x', 1)")
+            time.sleep(hold_ms / 1000.0)  # thumbnailing while the transaction is open
+            conn.execute("COMMIT")
+            ok += 1
+        except sqlite3.OperationalError:
+            locked += 1
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.OperationalError:
+                pass
+    out.put(("w", ok, locked, []))
+
+
+def _reader(path, pragmas, timeout, stop_at, out):
+    conn = _connect(path, pragmas, timeout)
+    ok = locked = 0
+    lat = []
+    while time.time() < stop_at:
+        t0 = time.perf_counter()
+        try:
+            conn.execute("SELECT COUNT(*), SUM(size_bytes) FROM photo WHERE trip_id = ?", (ok % 200,)).fetchone()
+            conn.execute("SELECT * FROM photo WHERE trip_id = ? ORDER BY id DESC LIMIT 24", (ok % 200,)).fetchall()
+            ok += 1
+            lat.append((time.perf_counter() - t0) * 1000.0)
+        except sqlite3.OperationalError:
+            locked += 1
+    out.put(("r", ok, locked, lat))
+
+
+def _pct(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))], 2)
+
+
+def run(profile, pragmas, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _setup(path, pragmas)
+        out = mp.Queue()
+        stop_at = time.time() + args.seconds
+        procs = [mp.Process(target=_writer, args=(path, pragmas, args.timeout, args.hold_ms, stop_at, out))
+                 for _ in range(args.writers)]
+        procs += [mp.Process(target=_reader, args=(path, pragmas, args.timeout, stop_at, out))
+                  for _ in range(args.readers)]
+        for p in procs:
+            p.start()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+    reads = sum(r[1] for r in results if r[0] == "r")
+    writes = sum(r[1] for r in results if r[0] == "w")
+    lat = [x for r in results if r[0] == "r" for x in r[3]]
+    return {
+        "profile": profile,
+        "reads_per_s": round(reads / args.seconds, 1),
+        "writes_per_s": round(writes / args.seconds, 1),
+        "read_locked_errors": sum(r[2] for r in results if r[0] == "r"),
+        "write_locked_errors": sum(r[2] for r in results if r[0] == "w"),
+        "read_p50_ms": _pct(lat, 50),
+        "read_p95_ms": _pct(lat, 95),
+        "read_p99_ms": _pct(lat, 99),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--readers", type=int, default=6)
+    ap.add_argument("--hold-ms", type=float, default=150.0, help="time each write transaction stays open")
+    ap.add_argument("--timeout", type=float, default=0.5,
+                    help="driver busy timeout (s) for the stock profile; the tuned profile sets busy_timeout itself")
+    args = ap.parse_args()
+    print(json.dumps(run("stock", {}, args)))
+    print(json.dumps(run("tuned", TUNED, args)))
+
+
+if __name__ == "__main__":
+    main()
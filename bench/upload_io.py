@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Upload ingestion I/O: Werkzeug form parsing + FileStorage.save() versus the
+streaming ingest path (ingest.py), for one multipart batch of photos.
+
+Reports bytes written/read by the process (rchar/wchar from /proc/self/io,
+i.e. at the syscall level, so page cache hits count too), the tracemalloc
+peak, and wall time. Both paths thumbnail every photo, as wedding uploads do.
+
+    python bench/upload_io.py --photos 60 --mb 2
+"""
+import argparse
+import io
+import json
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _photo(size_mb: float, seed: int) -> bytes:
+    from PIL import Image
+    side = int((size_mb * 1024 * 1024 / 1.5) ** 0.5)  # noise JPEGs are ~1.5 bytes/pixel
+    rnd = random.Random(seed)
+    im = Image.effect_noise((side, side), 60).convert("RGB")
+    im.paste(tuple(rnd.randrange(256) for _ in range(3)), (0, 0, side // 4, side // 4))
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _body(photos):
+    boundary = uuid.uuid4().hex
+    out = io.BytesIO()
+    out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="title"\r\n\r\nbench\r\n'.encode())
+    for i, blob in enumerate(photos):
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="photos"; filename="p{i}.jpg"\r\n'
+                  f'Content-Type: image/jpeg\r\n\r\n'.encode())
+        out.write(blob + b"\r\n")
+    out.write(f"--{boundary}--\r\n".encode())
+    return out.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def _io():
+    with open("/proc/self/io") as f:
+        d = dict(line.split(": ") for line in f.read().splitlines())
+    return int(d["rchar"]), int(d["wchar"])
+
+
+def _werkzeug(app, dest_root):
+    from flask import request
+    from uploads import make_thumbnail
+    for f in request.files.getlist("photos"):
+        dest = dest_root / f"{uuid.uuid4().hex}.jpg"
+        f.save(dest)
+        make_thumbnail(dest, dest_root / "thumbs" / dest.name, app.config["THUMB_MAX_PX"], app.config["THUMB_QUALITY"])
+
+
+def _ingest(app, dest_root):
+    from ingest import ingest_request
+    from uploads import make_thumbnail
+    with ingest_request() as ing:
+        for f in ing.files.getlist("photos"):
+            dest = f.move_to(dest_root / f"{uuid.uuid4().hex}.jpg")
+            make_thumbnail(f.open(), dest_root / "thumbs" / dest.name,
+                           app.config["THUMB_MAX_PX"], app.config["THUMB_QUALITY"])
+
+
+def measure(app, body, content_type, fn, tmp):
+    dest_root = pathlib.Path(tmp) / fn.__name__.strip("_")
+    (dest_root / "thumbs").mkdir(parents=True)
+    with app.test_request_context("/", method="POST", data=body, content_type=content_type):
+        r0, w0 = _io()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        fn(app, dest_root)
+        wall = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        r1, w1 = _io()
+    return {"read_mb": round((r1 - r0) / 1e6, 1), "written_mb": round((w1 - w0) / 1e6, 1),
+            "peak_alloc_mb": round(peak / 1e6, 1), "wall_s": round(wall, 2)}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--photos", type=int, default=60)
+    ap.add_argument("--mb", type=float, default=2.0, help="approximate size of each photo")
+    args = ap.parse_args()
+
+    from app import create_app
+    with tempfile.TemporaryDirectory(prefix="upload-io-") as tmp:
+        app = create_app({"UPLOAD_ROOT": os.path.join(tmp, "uploads"), "SQLALCHEMY_DATABASE_URI": "sqlite://"})
+        photos = [_photo(args.mb, i) for i in range(min(args.photos, 8))]
+        photos = [photos[i % len(photos)] for i in range(args.photos)]
+        body, ctype = _body(photos)
+        result = {"photos": args.photos, "batch_mb": round(len(body) / 1e6, 1)}
+        for fn in (_werkzeug, _ingest):
+            result[fn.__name__.strip("_")] = measure(app, body, ctype, fn, tmp)
+        print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""One blueprint per section; registered by app.create_app()."""
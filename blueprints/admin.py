@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+
+import storage
+from helpers import login_required, admin_required, approve_users_required
+from metrics import query_budget
+from models import db, WEDDING_BOARDS, User, RegistrationRequest, Trip, Item
+
+bp = Blueprint("admin", __name__)
+
+@bp.get("/admin/requests")
+@login_required
+@approve_users_required
+def admin_user_requests():
+    pending = (RegistrationRequest.query
+               .filter_by(status="pending")
+               .order_by(RegistrationRequest.created_at.asc())
+               .all())
+    recent = (RegistrationRequest.query
+              .filter(RegistrationRequest.status != "pending")
+              .order_by(RegistrationRequest.decided_at.desc().nullslast())
+              .limit(50).all())
+    return render_template("admin_requests.html", pending=pending, recent=recent)
+
+@bp.get("/admin/users")
+@login_required
+@admin_required
+def admin_users():
+    users = User.query.order_by(User.username.asc()).all()
+    return render_template("admin_users.html", users=users)
+
+@bp.get("/admin/storage")
+@login_required
+@admin_required
+@query_budget(6)
+def admin_storage():
+    """Upload disk usage per section and the biggest trips, tracker items and wedding boards."""
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+    trips, items = storage.largest("travel", limit), storage.largest("tracker", limit)
+    boards = storage.largest("wedding", limit)
+
+    def titles(model, rows):
+        ids = [int(r.entity) for r in rows if r.entity.isdigit()]
+        if not ids:
+            return {}
+        return {str(i): t for i, t in db.session.query(model.id, model.title).filter(model.id.in_(ids))}
+
+    return render_template("admin_storage.html", sections=storage.sections(), limit=limit,
+                           trips=trips, trip_titles=titles(Trip, trips),
+                           items=items, item_titles=titles(Item, items),
+                           boards=boards, board_titles={b: t for b, (_, t) in WEDDING_BOARDS.items()})
+
+@bp.post("/admin/users/<int:user_id>/update")
+@login_required
+@admin_required
+def admin_users_update(user_id):
+    u = User.query.get_or_404(user_id)
+    # checkboxes are present → "on" when checked
+    u.is_admin = bool(request.form.get("is_admin"))
+    u.can_travel_edit = bool(request.form.get("can_travel_edit"))
+    u.can_approve_users = bool(request.form.get("can_approve_users"))
+    db.session.commit()
+    flash(f"Updated permissions for {u.username}.", "success")
+    return redirect(url_for("admin.admin_users"))
+
+@bp.post("/admin/requests/<int:req_id>/approve")
+@login_required
+@approve_users_required
+def admin_user_request_approve(req_id):
+    rr = RegistrationRequest.query.get_or_404(req_id)
+    if rr.status != "pending":
+        flash("This request has already been decided.", "warning")
+        return redirect(url_for("admin.admin_user_requests"))
+    if User.query.filter_by(username=rr.username).first():
+        rr.status = "denied"; rr.decided_at = datetime.utcnow(); rr.decided_by_user_id = session.get("user_id")
+        db.session.commit()
+        flash(f"Username '{rr.username}' already exists. Request auto-denied.", "danger")
+        return redirect(url_for("admin.admin_user_requests"))
+    new_user = User(
+        username=rr.username,
+        password_hash=rr.password_hash,
+        can_travel_edit=False,
+        can_approve_users=False
+    )
+    db.session.add(new_user)
+    rr.status = "approved"
+    rr.decided_at = datetime.utcnow()
+    rr.decided_by_user_id = session.get("user_id")
+    db.session.commit()
+    flash(f"Approved and created user '{rr.username}'.", "success")
+    return redirect(url_for("admin.admin_user_requests"))
+
+@bp.post("/admin/requests/<int:req_id>/deny")
+@login_required
+@approve_users_required
+def admin_user_request_deny(req_id):
+    rr = RegistrationRequest.query.get_or_404(req_id)
+    if rr.status != "pending":
+        flash("This request has already been decided.", "warning")
+        return redirect(url_for("admin.admin_user_requests"))
+    rr.status = "denied"
+    rr.decided_at = datetime.utcnow()
+    rr.decided_by_user_id = session.get("user_id")
+    db.session.commit()
+    flash(f"Denied request for '{rr.username}'.", "info")
+    return redirect(url_for("admin.admin_user_requests"))
@@ -0,0 +1,217 @@
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort, jsonify
+
+from admission import heavy
+from helpers import login_required
+from ingest import ingest_request
+from metrics import query_budget
+from models import db, WorkoutSession
+import tracks
+import workouts
+
+bp = Blueprint("fitness", __name__)
+
+TREND_COUNTS = {"day": 30, "week": 26, "month": 24}
+TRACK_FORMATS = {".gpx": "gpx", ".gpx.gz": "gpx", ".tcx": "tcx", ".tcx.gz": "tcx"}
+
+
+def _duration(value: str) -> int | None:
+    """'45' (minutes), '45:30' (m:s) or '1:02:03' (h:m:s) -> seconds."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    parts = value.split(":")
+    if len(parts) > 3 or not all(p.strip().isdigit() for p in parts):
+        raise ValueError("duration must be minutes, mm:ss or h:mm:ss")
+    nums = [int(p) for p in parts]
+    if len(nums) == 1:
+        return nums[0] * 60
+    if len(nums) == 2:
+        return nums[0] * 60 + nums[1]
+    return nums[0] * 3600 + nums[1] * 60 + nums[2]
+
+
+def _number(value, cast=float):
+    value = (str(value) if value is not None else "").strip()
+    if not value:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"{value!r} is not a number") from None
+
+
+def _session_fields(form) -> dict:
+    """Summary fields from the log/edit form; raises ValueError."""
+    try:
+        started_at = datetime.fromisoformat((form.get("started_at") or "").strip())
+    except ValueError:
+        raise ValueError("start time is required") from None
+    km = _number(form.get("distance_km"))
+    return {
+        "activity": form.get("activity") or "other",
+        "started_at": started_at,
+        "duration_s": _duration(form.get("duration")) or 0,
+        "distance_m": km * 1000 if km is not None else None,
+        "calories": _number(form.get("calories"), int),
+        "avg_hr": _number(form.get("avg_hr")),
+        "max_hr": _number(form.get("max_hr")),
+        "title": (form.get("title") or "").strip() or None,
+        "notes": (form.get("notes") or "").strip() or None,
+    }
+
+
+def _own_session(session_id: int) -> WorkoutSession:
+    ws = db.session.get(WorkoutSession, session_id)
+    if ws is None or ws.user_id != session.get("user_id"):
+        abort(404)
+    return ws
+
+
+@bp.get("/fitness")
+@login_required
+@query_budget(4)
+def fitness():
+    uid = session["user_id"]
+    activity = request.args.get("activity") if request.args.get("activity") in workouts.ACTIVITIES else None
+    page = request.args.get("page", 1, type=int)
+    sessions, has_next = workouts.sessions_page(uid, page, activity)
+    return render_template("fitness.html", sessions=sessions, page=max(1, page), has_next=has_next,
+                           activity=activity, activities=workouts.ACTIVITIES,
+                           totals=workouts.totals(uid), now=datetime.now())
+
+
+@bp.post("/fitness/session")
+@login_required
+def fitness_add():
+    try:
+        workouts.add_session(session["user_id"], **_session_fields(request.form))
+    except ValueError as e:
+        flash(str(e), "warning")
+        return redirect(url_for("fitness.fitness"))
+    db.session.commit()
+    flash("Workout logged.", "success")
+    return redirect(url_for("fitness.fitness"))
+
+
+@bp.post("/fitness/session/<int:session_id>/update")
+@login_required
+def fitness_update(session_id):
+    ws = _own_session(session_id)
+    try:
+        workouts.update_session(ws, **_session_fields(request.form))
+    except ValueError as e:
+        flash(str(e), "warning")
+        return redirect(url_for("fitness.fitness"))
+    db.session.commit()
+    flash("Workout updated.", "success")
+    return redirect(url_for("fitness.fitness"))
+
+
+@bp.post("/fitness/session/<int:session_id>/delete")
+@login_required
+def fitness_delete(session_id):
+    workouts.delete_session(_own_session(session_id))
+    db.session.commit()
+    flash("Workout deleted.", "success")
+    return redirect(url_for("fitness.fitness"))
+
+
+def _track_format(filename: str) -> str | None:
+    name = filename.lower()
+    return next((fmt for suffix, fmt in TRACK_FORMATS.items() if name.endswith(suffix)), None)
+
+
+@bp.post("/fitness/import")
+@login_required
+@heavy
+def fitness_import():
+    # files are streamed to staging, then parsed one point at a time (tracks.py)
+    with ingest_request() as ing:
+        return _fitness_import(ing.form, ing.files.getlist("tracks"))
+
+def _fitness_import(form, files):
+    uid = session["user_id"]
+    activity = form.get("activity") if form.get("activity") in workouts.ACTIVITIES else None
+    imported, problems = 0, []
+    for f in files:
+        if not f.filename:
+            continue
+        fmt = _track_format(f.filename)
+        if fmt is None:
+            problems.append(f"{f.filename}: not a .gpx or .tcx file")
+            continue
+        if tracks.already_imported(uid, f.sha256):
+            problems.append(f"{f.filename}: already imported")
+            continue
+        try:
+            tracks.import_track(uid, f.open(), activity=activity, source=fmt, source_ref=f.sha256)
+        except ValueError as e:
+            problems.append(f"{f.filename}: {e}")
+            continue
+        db.session.commit()
+        imported += 1
+    if imported:
+        flash(f"Imported {imported} workout{'' if imported == 1 else 's'}.", "success")
+    for p in problems:
+        flash(p, "warning")
+    if not imported and not problems:
+        flash("Choose a GPX or TCX file to import.", "warning")
+    return redirect(url_for("fitness.fitness"))
+
+
+@bp.get("/fitness/session/<int:session_id>/route.json")
+@login_required
+@query_budget(2)
+def fitness_route(session_id):
+    ws = _own_session(session_id)
+    r = tracks.route(ws.id, request.args.get("tolerance", type=int))
+    if r is None:
+        abort(404)
+    return jsonify(id=ws.id, tolerance_m=r.tolerance_m, n=r.n, polyline=r.polyline)
+
+
+@bp.get("/fitness/trends.json")
+@login_required
+@query_budget(1)
+def fitness_trends():
+    period = request.args.get("period") if request.args.get("period") in workouts.PERIODS else "week"
+    count = min(max(request.args.get("count", TREND_COUNTS[period], type=int), 1), 400)
+    activity = request.args.get("activity") if request.args.get("activity") in workouts.ACTIVITIES else None
+    return jsonify(period=period, activity=activity,
+                   series=workouts.trend(session["user_id"], period, count, activity))
+
+
+@bp.get("/fitness/session/<int:session_id>/samples.json")
+@login_required
+def fitness_samples(session_id):
+    ws = _own_session(session_id)
+    points = min(max(request.args.get("points", 600, type=int), 10), workouts.MAX_SAMPLES)
+    return jsonify(id=ws.id, started_at=ws.started_at.isoformat(), units=workouts.METRICS,
+                   samples=workouts.samples(ws.id, points))
+
+
+@bp.post("/api/fitness/sessions")
+@login_required
+def api_fitness_create():
+    """
+    JSON: {"activity", "started_at" (ISO), "duration_s"?, "distance_m"?, "calories"?,
+    "avg_hr"?, "max_hr"?, "title"?, "notes"?, "samples"?: {"t": [...], "heart_rate": [...], ...}}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(error="expected a JSON object"), 400
+    try:
+        started_at = datetime.fromisoformat(str(data.get("started_at") or ""))
+        ws = workouts.add_session(
+            session["user_id"], activity=data.get("activity") or "other", started_at=started_at,
+            duration_s=_number(data.get("duration_s"), int), distance_m=_number(data.get("distance_m")),
+            calories=_number(data.get("calories"), int), avg_hr=_number(data.get("avg_hr")),
+            max_hr=_number(data.get("max_hr")), title=data.get("title"), notes=data.get("notes"),
+            source="api", samples=data.get("samples"))
+    except (ValueError, TypeError) as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    db.session.commit()
+    return jsonify(id=ws.id, duration_s=ws.duration_s, avg_hr=ws.avg_hr, max_hr=ws.max_hr), 201
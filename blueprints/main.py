@@ -0,0 +1,391 @@
+import hmac
+import os
+import pathlib
+import uuid
+
+from flask import (
+    Blueprint, current_app, render_template, request, redirect, url_for,
+    session, flash, abort, jsonify, send_from_directory
+)
+from sqlalchemy import func, text
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from admission import heavy
+import jobs
+import metrics
+import search
+import storage
+from helpers import login_required
+from ingest import ingest_request
+from metrics import query_budget
+from models import db, User, HomeCard, Comment, ItemComment, CommentReaction, RegistrationRequest
+from uploads import ALLOWED_EXTS, make_thumbnail
+
+bp = Blueprint("main", __name__)
+
+# ---------------- Template helpers ----------------
+@bp.get("/favicon.ico")
+def favicon_root():
+    return send_from_directory(
+        os.path.join(current_app.static_folder, "icons"),
+        "favicon.ico",
+        max_age=31536000  # replaces cache_timeout
+    )
+
+@bp.route("/assets/<path:filename>")
+def assets(filename):
+    folder = os.path.join(current_app.root_path, "assets")
+    return send_from_directory(folder, filename)
+
+@bp.app_context_processor
+def inject_user():
+    u = None
+    uid = session.get("user_id")
+    if uid:
+        u = User.query.get(uid)
+    return {"current_user": u}
+
+@bp.app_context_processor
+def override_url_for():
+    def dated_url_for(endpoint, **values):
+        if endpoint == 'static':
+            filename = values.get('filename', '')
+            if filename:
+                filepath = os.path.join(current_app.root_path, 'static', filename)
+                if os.path.exists(filepath):
+                    values['v'] = int(os.path.getmtime(filepath))
+        return url_for(endpoint, **values)
+    return dict(url_for=dated_url_for)
+
+# ---------------- Routes ----------------
+@bp.get("/")
+def root():
+    if session.get("user_id"):
+        return redirect(url_for("main.home"))
+    return redirect(url_for("main.login"))
+
+# ----- Home (cards) -----
+@bp.get("/home")
+@login_required
+def home():
+    cards = HomeCard.query.order_by(HomeCard.sort_order.asc(), HomeCard.id.asc()).all()
+    return render_template("home.html", cards=cards)
+
+# ----- Search (all sections; see search.py) -----
+def _search_args():
+    """(q, allowed sections, chosen sections, page); admin-only sections are not allowed for other users."""
+    user = db.session.get(User, session.get("user_id"))
+    allowed = [s for s in search.SECTIONS if (user and user.is_admin) or s not in search.ADMIN_SECTIONS]
+    chosen = [s for s in allowed if s in request.args.getlist("in")] or allowed
+    return (request.args.get("q") or "").strip(), allowed, chosen, max(1, request.args.get("page", 1, type=int))
+
+def _search_hits(q, sections, page):
+    """search.query() hits, each with its section, a link and the title of what it belongs to."""
+    hits, has_next = search.query(q, sections, page)
+    parents = search.parent_titles(hits)
+    for h in hits:
+        kind = h["kind"]
+        if kind in ("trip_comment", "item_comment"):
+            h["author"], h["title"] = h["title"], parents.get((kind, int(h["parent"])), "(deleted)")
+        if kind in ("trip", "trip_comment"):
+            trip_id = h["id"] if kind == "trip" else int(h["parent"])
+            h["section"], h["url"] = "travel", url_for("travel.travel") + f"#trip{trip_id}"
+        elif kind in ("item", "item_comment"):
+            h["section"], h["url"] = "tracker", url_for("tracker.tracker", q=h["title"])
+        else:
+            h["section"], h["url"] = "wedding", url_for("wedding.wedding_index")
+    return hits, has_next
+
+@bp.get("/search")
+@login_required
+@query_budget(4)
+def search_page():
+    q, allowed, chosen, page = _search_args()
+    hits, has_next = _search_hits(q, chosen, page) if q else ([], False)
+    return render_template("search.html", q=q, hits=hits, page=page, has_next=has_next,
+                           allowed=allowed, chosen=chosen if chosen != allowed else [])
+
+@bp.get("/api/search")
+@login_required
+@query_budget(4)
+def api_search():
+    q, _, chosen, page = _search_args()
+    hits, has_next = _search_hits(q, chosen, page) if q else ([], False)
+    return jsonify(q=q, page=page, has_next=has_next, results=hits)
+
+@bp.post("/home/card/<int:card_id>/update")
+@login_required
+@heavy
+def home_card_update(card_id):
+    # auth: admin OR approver
+    uid = session.get("user_id")
+    me = User.query.get(uid) if uid else None
+    if not me or not (me.is_admin or me.can_approve_users):
+        abort(403)
+
+    card = HomeCard.query.get_or_404(card_id)
+    with ingest_request() as ing:
+        title = (ing.form.get("title") or "").strip()
+        description = (ing.form.get("description") or "").strip()
+        if not title:
+            flash("Title is required.", "warning")
+            return redirect(url_for("main.home"))
+
+        f = ing.files.get("image")
+        if f:
+            try:
+                if f.looks_like_image():
+                    dest_dir = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / "homecards" / str(card.id)
+                    unique = f"{uuid.uuid4().hex}{f.ext if f.ext in ALLOWED_EXTS else '.jpg'}"
+                    f.move_to(dest_dir / unique)
+
+                    preview_name = f"{pathlib.Path(unique).stem}.jpg"
+                    preview_path = dest_dir / "thumbs" / preview_name
+                    make_thumbnail(f.open(), preview_path, max_px=1200, quality=max(82, current_app.config["THUMB_QUALITY"]))
+                    card.image_path = str(pathlib.Path("homecards") / str(card.id) / "thumbs" / preview_name)
+                    storage.record(pathlib.Path("homecards") / str(card.id) / unique, card.image_path)
+                else:
+                    flash("That file doesn't look like an image.", "warning")
+            except Exception:
+                flash("Failed to process the image.", "danger")
+
+    card.title = title
+    card.description = description
+    db.session.commit()
+    flash("Card updated.", "success")
+    return redirect(url_for("main.home"))
+
+# ----- Login / Logout -----
+@bp.route("/login", methods=["GET", "POST"])
+def login():
+    if session.get("user_id"):
+        return redirect(url_for("main.home"))
+    if request.method == "POST":
+        username = request.form.get("username", "").strip()
+        password = request.form.get("password", "")
+        user = User.query.filter_by(username=username).first()
+        if not user or not check_password_hash(user.password_hash, password):
+            flash("Invalid credentials", "danger")
+            return render_template("login.html"), 401
+        session.clear()
+        session.permanent = True
+        session["user_id"] = user.id
+        return redirect(request.args.get("next") or url_for("main.home"))
+    return render_template("login.html")
+
+@bp.post("/logout")
+def logout():
+    session.clear()
+    return redirect(url_for("main.login"))
+
+# ----- Registration requests -----
+@bp.route("/register", methods=["GET", "POST"])
+def register():
+    if session.get("user_id"):
+        return redirect(url_for("main.home"))
+    if request.method == "POST":
+        username = (request.form.get("username") or "").strip()
+        password = (request.form.get("password") or "")
+        confirm  = (request.form.get("confirm") or "")
+        reason   = (request.form.get("reason") or "").strip()
+
+        if not username or not password or not confirm:
+            flash("All fields are required.", "warning")
+            return render_template("register.html"), 400
+        if password != confirm:
+            flash("Passwords do not match.", "warning")
+            return render_template("register.html"), 400
+        if len(password) < 8:
+            flash("Use at least 8 characters for the password.", "warning")
+            return render_template("register.html"), 400
+        if User.query.filter_by(username=username).first():
+            flash("Username is taken. Pick another.", "danger")
+            return render_template("register.html"), 400
+        if RegistrationRequest.query.filter_by(username=username).first():
+            flash("There is already a pending/decided request for that username.", "danger")
+            return render_template("register.html"), 400
+
+        rr = RegistrationRequest(
+            username=username,
+            password_hash=generate_password_hash(password),
+            reason=reason,
+            status="pending",
+        )
+        db.session.add(rr)
+        db.session.commit()
+        flash("Request submitted. An admin will approve or deny it.", "success")
+        return redirect(url_for("main.login"))
+    return render_template("register.html")
+
+# ----- Admin Creation - 404 once created -----
+def _any_admin_exists() -> bool:
+    return bool(User.query.filter_by(is_admin=True).first())
+
+@bp.route("/setup", methods=["GET", "POST"])
+def setup_admin():
+    # Only usable if there is no admin yet
+    if _any_admin_exists():
+        # Hide this endpoint once an admin exists
+        abort(404)
+
+    if request.method == "POST":
+        mode = (request.form.get("mode") or "").strip()
+
+        if mode == "promote":
+            username = (request.form.get("username") or "").strip()
+            u = User.query.filter_by(username=username).first()
+            if not u:
+                flash("User not found.", "danger")
+                return redirect(url_for("main.setup_admin"))
+            u.is_admin = True
+            # (optional) grant your other perms so the admin sees all controls:
+            u.can_travel_edit = True
+            u.can_approve_users = True
+            db.session.commit()
+            flash(f"Promoted {u.username} to admin.", "success")
+            return redirect(url_for("main.login"))
+
+        elif mode == "create":
+            new_username = (request.form.get("new_username") or "").strip()
+            new_password = request.form.get("new_password") or ""
+            if not new_username or not new_password:
+                flash("Username and password are required.", "warning")
+                return redirect(url_for("main.setup_admin"))
+            if User.query.filter_by(username=new_username).first():
+                flash("That username already exists.", "warning")
+                return redirect(url_for("main.setup_admin"))
+
+            u = User(
+                username=new_username,
+                password_hash=generate_password_hash(new_password),
+                is_admin=True,
+                can_travel_edit=True,
+                can_approve_users=True,
+            )
+            db.session.add(u)
+            db.session.commit()
+            flash(f"Created admin user {u.username}.", "success")
+            return redirect(url_for("main.login"))
+
+        else:
+            flash("Invalid request.", "danger")
+            return redirect(url_for("main.setup_admin"))
+
+    # GET: render the setup page with current users to pick from
+    users = User.query.order_by(User.username.asc()).all()
+    return render_template("setup_admin.html", users=users)
+
+# ----- Serve uploaded files (auth required) -----
+@bp.get("/u/<path:subpath>")
+@login_required
+def serve_upload(subpath):
+    if subpath.startswith("."):
+        abort(404)  # in-progress state such as .partial/ is not content
+    resp = send_from_directory(current_app.config["UPLOAD_ROOT"], subpath)
+    resp.headers["Cache-Control"] = "public, max-age=2592000, immutable"
+    return resp
+
+# ----- Reactions API (like/dislike) -----
+@bp.post("/api/comments/<kind>/<int:comment_id>/react")
+@login_required
+def api_comment_react(kind, comment_id):
+    kind = (kind or "").lower()
+    if kind not in ("trip", "item"):
+        return jsonify(ok=False, error="bad kind"), 400
+
+    # must exist
+    target = Comment if kind == "trip" else ItemComment
+    if not target.query.get(comment_id):
+        return jsonify(ok=False, error="not found"), 404
+
+    uid = session.get("user_id")
+    if not uid:
+        return jsonify(ok=False, error="auth"), 401
+
+    data = request.get_json(silent=True) or {}
+    action = (data.get("action") or "").lower()
+    if action not in ("like", "dislike"):
+        return jsonify(ok=False, error="bad action"), 400
+    val = 1 if action == "like" else -1
+
+    rec = (CommentReaction.query
+           .filter_by(kind=kind, comment_id=comment_id, user_id=uid)
+           .first())
+
+    if rec is None:
+        rec = CommentReaction(kind=kind, comment_id=comment_id, user_id=uid, value=val)
+        db.session.add(rec)
+        user_reaction = val
+    elif rec.value == val:
+        db.session.delete(rec)
+        user_reaction = 0
+    else:
+        rec.value = val
+        user_reaction = val
+
+    db.session.commit()
+
+    likes = (db.session.query(func.count(CommentReaction.id))
+             .filter_by(kind=kind, comment_id=comment_id, value=1).scalar()) or 0
+    dislikes = (db.session.query(func.count(CommentReaction.id))
+                .filter_by(kind=kind, comment_id=comment_id, value=-1).scalar()) or 0
+
+    return jsonify(
+        ok=True,
+        likes=int(likes),
+        dislikes=int(dislikes),
+        user_reaction=("like" if user_reaction == 1 else "dislike" if user_reaction == -1 else None)
+    )
+
+# ----- Background job status (for polling after an upload) -----
+def _job_scope():
+    """user_id to scope job status to: the caller's own jobs, or None (all) for admins."""
+    uid = session.get("user_id")
+    me = User.query.get(uid) if uid else None
+    return None if me and me.is_admin else uid
+
+@bp.get("/api/jobs/<int:job_id>")
+@login_required
+def api_job(job_id):
+    found = jobs.job_status([job_id], _job_scope())
+    if not found:
+        abort(404)
+    return jsonify(found[0])
+
+@bp.get("/api/jobs")
+@login_required
+def api_jobs():
+    ids = [int(x) for x in (request.args.get("ids") or "").split(",") if x.strip().isdigit()][:200]
+    return jsonify(jobs.job_status(ids, _job_scope()))
+
+@bp.get("/healthz")
+def healthz():
+    try:
+        db.session.execute(text("SELECT 1"))
+    except Exception:
+        return {"ok": False, "db": "unreachable"}, 503
+    return {"ok": True}, 200
+
+# ----- Metrics (Prometheus text format) -----
+@bp.get("/metrics")
+def metrics_endpoint():
+    token = current_app.config.get("METRICS_TOKEN")
+    auth = request.headers.get("Authorization", "")
+    if not (token and hmac.compare_digest(auth, f"Bearer {token}")):
+        uid = session.get("user_id")
+        user = User.query.get(uid) if uid else None
+        if not user or not user.is_admin:
+            abort(403)
+    body = metrics.render(current_app.extensions["metrics"].collect())
+    return body, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+# ----- 413 handler -----
+@bp.app_errorhandler(RequestEntityTooLarge)
+def handle_413(e):
+    if request.path.startswith("/api/"):
+        return jsonify(ok=False, error="request too large"), 413
+    flash("That upload was too large. Try fewer/smaller files or upload in batches.", "danger")
+    # send them back to the section they were uploading to
+    back = {"tracker": "tracker.tracker", "wedding": "wedding.wedding_index"}.get(request.blueprint, "travel.travel")
+    return redirect(url_for(back))
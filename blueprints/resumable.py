@@ -0,0 +1,366 @@
+"""
+Resumable chunked uploads (a small tus-style protocol).
+
+    POST   /api/uploads                {target, filename, size, sha256?, ...}  -> 201 {id, offset}
+    HEAD   /api/uploads/<id>           -> Upload-Offset / Upload-Length headers
+    PATCH  /api/uploads/<id>           raw bytes, header Upload-Offset: <n>    -> 204 (409 on wrong offset)
+    POST   /api/uploads/<id>/finalize  {sha256?}                               -> 201 {kind, id, ...}
+    DELETE /api/uploads/<id>
+
+Targets: ``travel`` (trip_id) -> Photo, ``chapter`` (item_id, number?) ->
+Chapter, ``wedding`` (bucket) -> WeddingItem.
+
+State lives on disk under UPLOAD_ROOT/.partial/<id>/ (info.json + data), so
+any gunicorn worker can take the next chunk and a restart loses nothing.
+The data file's size is the offset; PATCH holds an flock on it while
+appending (on Windows, which has no flock, a lock within the process). Chunks are copied from the request stream in 1 MB pieces, so
+memory stays flat whatever the file size. Finalize hashes the file
+(sha256, checked against the client's value when given), sniffs it and
+moves it into place with os.replace. Abandoned uploads are removed after
+RESUMABLE_TTL_HOURS by ``manage.py cleanup-uploads`` (and opportunistically
+on create).
+"""
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import Blueprint, current_app, request, session, jsonify, url_for
+from sqlalchemy import func
+from werkzeug.utils import secure_filename
+
+import dupes
+import jobs
+import storage
+from admission import heavy
+from models import db, WEDDING_BOARDS, User, Trip, Photo, Item, Chapter, WeddingItem
+from uploads import (
+    CHAPTER_DIRNAME, _looks_like_image, _looks_like_pdf, _infer_chapter_number, make_thumbnail,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+bp = Blueprint("resumable", __name__)
+
+PARTIAL_DIRNAME = ".partial"
+COPY_BUFSIZE = 1024 * 1024
+_local_locks = [threading.Lock() for _ in range(64)]  # by upload id, where there is no flock
+
+
+def _partial_root() -> pathlib.Path:
+    return pathlib.Path(current_app.config["UPLOAD_ROOT"]) / PARTIAL_DIRNAME
+
+
+def _error(status: int, message: str, **extra):
+    return jsonify(ok=False, error=message, **extra), status
+
+
+@contextmanager
+def _exclusive(f, upload_id: str):
+    """Hold f's flock, which every worker sees (released when f closes), or without fcntl a lock in this process."""
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+    else:
+        with _local_locks[hash(upload_id) % len(_local_locks)]:
+            yield
+
+
+def _int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _load(upload_id: str):
+    """(dir, info) for an upload owned by the current user, or (None, None)."""
+    if not upload_id.isalnum():
+        return None, None
+    d = _partial_root() / upload_id
+    try:
+        info = json.loads((d / "info.json").read_text())
+    except (OSError, ValueError):
+        return None, None
+    if info.get("user_id") != session.get("user_id"):
+        return None, None
+    return d, info
+
+
+def _offset(d: pathlib.Path) -> int:
+    try:
+        return (d / "data").stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def cleanup_expired(root: pathlib.Path, ttl_seconds: float) -> tuple[int, int]:
+    """Remove partial uploads untouched for ttl_seconds. Returns (removed, bytes)."""
+    removed = freed = 0
+    if not root.is_dir():
+        return removed, freed
+    cutoff = time.time() - ttl_seconds
+    with os.scandir(root) as it:
+        for entry in it:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            data = os.path.join(entry.path, "data")
+            try:
+                st = os.stat(data)
+                mtime, size = st.st_mtime, st.st_size
+            except FileNotFoundError:
+                mtime, size = entry.stat().st_mtime, 0
+            if mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+                freed += size
+    return removed, freed
+
+
+# ---------------- Targets ----------------
+def _check_target(info: dict, user: User):
+    """Permission + existence check shared by create and finalize. Returns an error message or None."""
+    target = info["target"]
+    if target == "travel":
+        if not user.can_travel_edit:
+            return "travel edit permission required"
+        if db.session.get(Trip, info.get("trip_id") or 0) is None:
+            return "trip not found"
+    elif target == "chapter":
+        if db.session.get(Item, info.get("item_id") or 0) is None:
+            return "item not found"
+    elif target == "wedding":
+        if not user.is_admin:
+            return "admin only"
+        if info.get("bucket") not in WEDDING_BOARDS:
+            return "unknown bucket"
+    else:
+        return "unknown target"
+    return None
+
+
+def _finalize_travel(src: pathlib.Path, info: dict, ext: str) -> dict:
+    # the thumbnail is a job, so decode here, before anything is written
+    if dupes.hash_file(src) is None:
+        raise ValueError("not a readable image")
+    trip_id = info["trip_id"]
+    unique = f"{uuid.uuid4().hex}{ext}"
+    rel = pathlib.Path("travel") / str(trip_id) / unique
+    dest = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / rel
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(src, dest)
+    storage.record(rel)
+    photo = Photo(trip_id=trip_id, stored_path=str(rel), thumb_path=None,
+                  original_name=info["filename"], mime_type=info.get("mime_type") or "",
+                  size_bytes=info["size"])
+    db.session.add(photo)
+    db.session.flush()
+    job_id = jobs.enqueue("photo.thumb", {"photo_id": photo.id}, dedupe_key=f"photo.thumb:{photo.id}")
+    return {"kind": "photo", "id": photo.id, "path": str(rel), "job_id": job_id}
+
+
+def _finalize_chapter(src: pathlib.Path, info: dict, ext: str) -> dict:
+    item_id = info["item_id"]
+    n = info.get("number") or _infer_chapter_number(info["filename"])
+    if not n:
+        n = (db.session.query(func.coalesce(func.max(Chapter.number), 0)).filter_by(item_id=item_id).scalar() or 0) + 1
+    rel = pathlib.Path("tracker") / str(item_id) / CHAPTER_DIRNAME / f"ch-{n:03d}.pdf"
+    dest = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / rel
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    before = storage.sizes(rel)
+    os.replace(src, dest)
+    storage.record(rel, before=before)
+    ch = Chapter.query.filter_by(item_id=item_id, number=n).first()
+    if ch:
+        ch.source_path = str(rel)
+    else:
+        ch = Chapter(item_id=item_id, number=n, source_path=str(rel))
+        db.session.add(ch)
+    db.session.flush()
+    return {"kind": "chapter", "id": ch.id, "number": n, "path": str(rel)}
+
+
+def _finalize_wedding(src: pathlib.Path, info: dict, ext: str) -> dict:
+    bucket = info["bucket"]
+    # decode before anything is written: the magic bytes can be fine and the rest not
+    thumb_tmp = src.with_name("thumb.jpg")
+    try:
+        h = make_thumbnail(src, thumb_tmp, current_app.config["THUMB_MAX_PX"], current_app.config["THUMB_QUALITY"])
+    except Exception as e:
+        raise ValueError("not a readable image") from e
+    kind, default_title = WEDDING_BOARDS[bucket]
+    it = WeddingItem(kind=kind, title=(info.get("title") or "").strip() or default_title,
+                     created_by_user_id=info["user_id"])
+    db.session.add(it)
+    db.session.flush()
+    base = pathlib.Path("wedding") / bucket / str(it.id)
+    unique = f"{uuid.uuid4().hex}{ext}"
+    root = pathlib.Path(current_app.config["UPLOAD_ROOT"])
+    rel_thumb = base / "thumbs" / f"{pathlib.Path(unique).stem}.jpg"
+    (root / rel_thumb).parent.mkdir(parents=True, exist_ok=True)
+    os.replace(src, root / base / unique)
+    os.replace(thumb_tmp, root / rel_thumb)
+    it.image_path = str(rel_thumb)
+    storage.record(base / unique, rel_thumb)
+    # a resumed transfer is always kept; the client is told about a near-duplicate instead
+    duplicate_of = dupes.screen([h])[0] if dupes.policy() != "off" else None
+    dupes.record(rel_thumb, h)
+    return {"kind": "wedding_item", "id": it.id, "path": str(rel_thumb), "duplicate_of": duplicate_of}
+
+
+FINALIZERS = {"travel": _finalize_travel, "chapter": _finalize_chapter, "wedding": _finalize_wedding}
+
+
+# ---------------- Routes ----------------
+@bp.post("/api/uploads")
+def upload_create():
+    uid = session.get("user_id")
+    user = db.session.get(User, uid) if uid else None
+    if not user:
+        return _error(401, "login required")
+    body = request.get_json(silent=True) or {}
+    try:
+        size = int(body.get("size"))
+    except (TypeError, ValueError):
+        return _error(400, "size is required")
+    filename = secure_filename(body.get("filename") or "")
+    if not filename:
+        return _error(400, "filename is required")
+    if not 0 < size <= current_app.config["RESUMABLE_MAX_BYTES"]:
+        return _error(413, "file too large", max=current_app.config["RESUMABLE_MAX_BYTES"])
+
+    info = {
+        "target": body.get("target"), "filename": filename, "size": size,
+        "sha256": (body.get("sha256") or "").lower() or None, "mime_type": body.get("mime_type"),
+        "user_id": user.id, "created_at": time.time(),
+        "trip_id": _int(body.get("trip_id")), "item_id": _int(body.get("item_id")),
+        "number": _int(body.get("number")), "bucket": body.get("bucket"), "title": body.get("title"),
+    }
+    err = _check_target(info, user)
+    if err:
+        return _error(403 if "permission" in err or "admin" in err else 400, err)
+
+    root = _partial_root()
+    cleanup_expired(root, current_app.config["RESUMABLE_TTL_HOURS"] * 3600)
+    upload_id = uuid.uuid4().hex
+    d = root / upload_id
+    d.mkdir(parents=True)
+    (d / "data").touch()
+    (d / "info.json").write_text(json.dumps(info))
+    url = url_for("resumable.upload_patch", upload_id=upload_id)
+    return jsonify(ok=True, id=upload_id, offset=0, url=url), 201, {"Location": url}
+
+
+@bp.route("/api/uploads/<upload_id>", methods=["HEAD"])
+def upload_head(upload_id):
+    d, info = _load(upload_id)
+    if d is None:
+        return "", 404
+    return "", 200, {"Upload-Offset": str(_offset(d)), "Upload-Length": str(info["size"]),
+                     "Cache-Control": "no-store"}
+
+
+@bp.patch("/api/uploads/<upload_id>")
+def upload_patch(upload_id):
+    d, info = _load(upload_id)
+    if d is None:
+        return _error(404, "unknown upload")
+    try:
+        claimed = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return _error(400, "Upload-Offset header required")
+
+    with open(d / "data", "ab") as out, _exclusive(out, upload_id):
+        offset = os.fstat(out.fileno()).st_size
+        if claimed != offset:
+            return _error(409, "offset mismatch", offset=offset)
+        remaining = info["size"] - offset
+        stream = request.stream
+        while True:
+            chunk = stream.read(min(COPY_BUFSIZE, remaining + 1))
+            if not chunk:
+                break
+            if len(chunk) > remaining:
+                out.truncate(offset)
+                return _error(413, "chunk runs past the declared size", offset=offset)
+            out.write(chunk)
+            remaining -= len(chunk)
+        out.flush()
+        new_offset = out.tell()
+    return "", 204, {"Upload-Offset": str(new_offset)}
+
+
+@bp.post("/api/uploads/<upload_id>/finalize")
+@heavy
+def upload_finalize(upload_id):
+    d, info = _load(upload_id)
+    if d is None:
+        return _error(404, "unknown upload")
+    try:
+        lock = open(d / "data", "rb")
+    except FileNotFoundError:
+        return _error(404, "unknown upload")
+    # a second finalize for the same upload waits here, then finds it gone
+    with lock, _exclusive(lock, upload_id):
+        if not (d / "info.json").exists():
+            return _error(404, "unknown upload")
+        return _finalize(d, info)
+
+
+def _finalize(d: pathlib.Path, info: dict):
+    offset = _offset(d)
+    if offset != info["size"]:
+        return _error(409, "upload incomplete", offset=offset, size=info["size"])
+
+    data = d / "data"
+    h = hashlib.sha256()
+    with open(data, "rb") as f:
+        head = f.read(16)
+        h.update(head)
+        for chunk in iter(lambda: f.read(COPY_BUFSIZE), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    expected = ((request.get_json(silent=True) or {}).get("sha256") or info.get("sha256") or "").lower()
+    if expected and expected != digest:
+        shutil.rmtree(d, ignore_errors=True)
+        return _error(422, "sha256 mismatch", sha256=digest)
+
+    ext = pathlib.Path(info["filename"]).suffix.lower()
+    if info["target"] == "chapter":
+        if not (ext == ".pdf" or _looks_like_pdf(head)):
+            shutil.rmtree(d, ignore_errors=True)
+            return _error(415, "not a PDF")
+        ext = ".pdf"
+    elif not _looks_like_image(head, ext):
+        shutil.rmtree(d, ignore_errors=True)
+        return _error(415, "not an image")
+
+    err = _check_target(info, db.session.get(User, info["user_id"]))
+    if err:
+        return _error(400, err)
+    try:
+        result = FINALIZERS[info["target"]](data, info, ext)
+    except ValueError as e:  # a finalizer rejects the bytes before writing anything
+        db.session.rollback()
+        shutil.rmtree(d, ignore_errors=True)
+        return _error(415, str(e))
+    db.session.commit()
+    shutil.rmtree(d, ignore_errors=True)
+    return jsonify(ok=True, sha256=digest, **result), 201
+
+
+@bp.delete("/api/uploads/<upload_id>")
+def upload_delete(upload_id):
+    d, _ = _load(upload_id)
+    if d is None:
+        return _error(404, "unknown upload")
+    shutil.rmtree(d, ignore_errors=True)
+    return "", 204
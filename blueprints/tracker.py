@@ -0,0 +1,433 @@
+from collections import Counter
+
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort, jsonify
+from sqlalchemy import or_, func
+from sqlalchemy.orm import lazyload, selectinload
+
+from admission import heavy
+from helpers import login_required, hydrate_comment_reactions
+from ingest import ingest_request
+import jobs
+from metrics import query_budget
+from models import db, MEDIA_TYPES, User, Item, Chapter, ItemComment
+import suggest
+from uploads import save_item_cover, save_item_source, save_chapter_pdf, _infer_chapter_number
+import versions
+
+bp = Blueprint("tracker", __name__)
+
+versions.track(Item, "tracker")
+
+def media_type_counts() -> dict:
+    """{media_type: item count} for the menu badges/pills, in one GROUP BY."""
+    have = dict(db.session.query(Item.media_type, func.count(Item.id)).group_by(Item.media_type).all())
+    return {t: have.get(t, 0) for t in MEDIA_TYPES}
+
+def _queue_cover_thumb(item):
+    jobs.enqueue("item.cover_thumb", {"item_id": item.id}, dedupe_key=f"item.cover_thumb:{item.id}")
+
+@bp.get("/tracker/tags")
+@login_required
+@query_budget(4)
+def tracker_tags():
+    """
+    Tags directory for the Media Tracker.
+    Supports optional ?type=<media_type> and ?q=<search>.
+    """
+    # inputs
+    type_filter = (request.args.get("type") or "").strip().lower()
+    q = (request.args.get("q") or "").strip().lower()
+
+    # base query
+    qry = Item.query
+    if type_filter in MEDIA_TYPES:
+        qry = qry.filter(Item.media_type == type_filter)
+
+    if q:
+        like = f"%{q}%"
+        qry = qry.filter(or_(Item.tags.ilike(like),
+                             Item.title.ilike(like),
+                             Item.notes.ilike(like)))
+
+    # only the tags column is needed here (skips the joined chapters load)
+    items = qry.with_entities(Item.tags).all()
+
+    # counts for the type pills (same as tracker list/menu)
+    type_counts = media_type_counts()
+
+    # build tag counts from the items we just pulled
+    counts = Counter()
+    for it in items:
+        if not it.tags:
+            continue
+        for raw in it.tags.split(","):
+            tag = (raw or "").strip().lower()
+            if not tag:
+                continue
+            counts[tag] += 1
+
+    # if user typed q=, also filter the tag list itself
+    if q:
+        counts = Counter({tag: n for tag, n in counts.items() if q in tag})
+
+    # group by first letter for headings (A, B, …, #)
+    grouped = {}
+    for tag, n in counts.items():
+        letter = tag[:1].upper() if tag else "#"
+        if not letter.isalpha():
+            letter = "#"
+        grouped.setdefault(letter, []).append((tag, n))
+
+    # sort groups and entries
+    letters = sorted(grouped.keys())
+    for L in letters:
+        grouped[L].sort(key=lambda x: x[0])
+
+    return render_template(
+        "tracker_tags.html",
+        MEDIA_TYPES=MEDIA_TYPES,
+        type_filter=(type_filter if type_filter in MEDIA_TYPES else ""),
+        type_counts=type_counts,
+        q=(request.args.get("q") or ""),
+        # both a flat dict and a grouped view (use whichever you like in the template)
+        tag_counts=dict(sorted(counts.items())),  # {'action': 12, ...}
+        letters=letters,                          # ['#','A','B',...]
+        grouped=grouped                           # {'A': [('action',12),...], ...}
+    )
+
+# --- Autocomplete for the filter box and tag inputs (see suggest.py) ---
+@bp.get("/tracker/suggest")
+@login_required
+@query_budget(2)
+def tracker_suggest():
+    prefix = (request.args.get("prefix") or "").strip()
+    media_type = (request.args.get("type") or "").strip().lower()
+    kind = (request.args.get("kind") or "").strip().lower()
+    if media_type and media_type not in MEDIA_TYPES:
+        abort(400)
+    kinds = (kind,) if kind in suggest.KINDS else suggest.KINDS
+    limit = request.args.get("limit", 10, type=int)
+    return jsonify(prefix=prefix, suggestions=suggest.suggest(prefix, media_type, kinds, max(1, limit)))
+
+# --- Dynamic rows fragment for AJAX (no full reload) ---
+@bp.route("/tracker/rows")
+@login_required
+@query_budget(3)
+def tracker_rows():
+    # inputs
+    type_filter = (request.args.get("type") or "book").lower()
+    q = (request.args.get("q") or "").strip()
+    tags = [t.strip().lower() for t in request.args.getlist("tag") if t.strip()]
+
+    # build the query exactly like /tracker
+    query = Item.query.filter(Item.media_type == type_filter)
+    if q:
+        like = f"%{q}%"
+        query = query.filter(
+            or_(
+                Item.title.ilike(like),
+                Item.tags.ilike(like),
+                Item.notes.ilike(like),
+            )
+        )
+    for t in tags:
+        query = query.filter(Item.tags.ilike(f"%{t}%"))
+
+    # the fragment renders table cells only: no chapters, comments or reactions
+    rows = query.options(lazyload(Item.chapters)).order_by(Item.title.asc()).all()
+
+    # return just the tbody fragment
+    return render_template(
+        "_tracker_rows.html",
+        rows=rows,
+        type_filter=type_filter,
+        tags=tags,
+        q=q,
+    )
+
+# ----- Tracker (menu-first + create/list + comments) -----
+@bp.route("/tracker", methods=["GET", "POST"])
+@login_required
+@heavy
+def tracker():
+    # Create on POST (handles type-specific fields + optional cover)
+    if request.method == "POST":
+        with ingest_request() as ing:
+            return _tracker_create(ing.form, ing.files)
+
+    # ---- List/menu screens on GET ----
+    with query_budget(8, "tracker.tracker"):
+        return _tracker_list()
+
+def _tracker_create(form, files):
+    media_type = (form.get("media_type") or "").strip().lower()
+    title = (form.get("title") or "").strip()
+    # status/rating removed from UI; set a neutral legacy value
+    status = "info"
+    tags = (form.get("tags") or "").strip()
+    notes = (form.get("notes") or "").strip()
+    release_status = (form.get("release_status") or "").strip() or None
+
+    def to_int(v):
+        try:
+            return int(v)
+        except Exception:
+            return None
+
+    # type-specific
+    chapter_total = None
+    seasons = None
+    # rating removed (per user later)
+    year = to_int(form.get("year"))
+    runtime_mins = to_int(form.get("runtime_mins"))
+    platforms = (form.get("platforms") or "").strip() or None
+
+    if media_type in ("book", "manga", "manhwa"):
+        chapter_total = to_int(form.get("chapter_total"))
+
+    if media_type in ("show", "anime"):
+        seasons = to_int(form.get("seasons"))
+
+    if not title or not media_type:
+        flash("Title and Type are required.", "danger")
+        return redirect(url_for("tracker.tracker"))
+
+    itm = Item(
+        title=title,
+        media_type=media_type,
+        status=status,          # keep legacy column satisfied
+        score=None,             # rating removed from item-level UI
+        tags=tags,
+        notes=notes,
+        chapter_total=chapter_total,
+        seasons=seasons,
+        release_status=release_status,
+        year=year,
+        runtime_mins=runtime_mins,
+        platforms=platforms,
+    )
+    db.session.add(itm)
+    db.session.flush()  # need id for cover path
+
+    # optional cover upload
+    cover = files.get("cover")
+    chapter_files = files.getlist("chapters")
+    if chapter_files:
+        existing_max = db.session.query(func.coalesce(func.max(Chapter.number), 0)).filter_by(item_id=itm.id).scalar() or 0
+        next_num = existing_max + 1
+
+        for f in chapter_files:
+            if not f or not f.filename:
+                continue
+            n = _infer_chapter_number(f.raw_filename) or next_num
+            if n == next_num:
+                next_num += 1
+
+            rel = save_chapter_pdf(f, itm.id, n)
+            ch = Chapter.query.filter_by(item_id=itm.id, number=n).first()
+            if ch:
+                ch.source_path = rel  # replace existing chapter n
+            else:
+                db.session.add(Chapter(item_id=itm.id, number=n, source_path=rel))
+    if cover and cover.filename:
+        rel, _ = save_item_cover(cover, itm.id, thumbnail=False)
+        if rel:
+            itm.cover_path = rel
+            itm.cover_thumb_path = None  # until the cover_thumb job has run
+            _queue_cover_thumb(itm)
+    
+    source = files.get("source")
+    if source and source.filename:
+        rel_src = save_item_source(source, itm.id)
+        if rel_src:
+            itm.source_path = rel_src
+
+
+    db.session.commit()
+    return redirect(url_for("tracker.tracker", type=media_type) if media_type in MEDIA_TYPES else url_for("tracker.tracker"))
+
+def _tracker_list():
+    type_filter = (request.args.get("type") or "").lower()
+    valid_type = type_filter in MEDIA_TYPES
+
+    # counts for menu badges
+    type_counts = media_type_counts()
+
+    if not valid_type:
+        return render_template(
+            "tracker.html",
+            mode="menu",
+            MEDIA_TYPES=MEDIA_TYPES,
+            type_counts=type_counts,
+            type_filter=None,
+            rows=[],
+            q="",
+            tag=""
+        )
+
+    # List screen for chosen type (no status/rating filters; alpha sort)
+    q = (request.args.get("q") or "").strip()
+    tags = [t.strip().lower() for t in request.args.getlist("tag") if t.strip()]
+
+    query = Item.query.filter(Item.media_type == type_filter)
+    if q:
+        like = f"%{q}%"
+        query = query.filter(or_(Item.title.ilike(like), Item.tags.ilike(like), Item.notes.ilike(like)))
+
+    for t in tags:
+        query = query.filter(Item.tags.ilike(f"%{t}%"))
+
+    rows = query.options(selectinload(Item.comments)).order_by(Item.title.asc()).all()
+
+    # hydrate reactions for every item's comments in one pass
+    hydrate_comment_reactions([c for r in rows for c in r.comments], session.get("user_id"), "item")
+
+    return render_template(
+        "tracker.html",
+        mode="list",
+        MEDIA_TYPES=MEDIA_TYPES,
+        type_filter=type_filter,
+        type_counts=type_counts,
+        q=q,
+        tags=tags,
+        rows=rows
+    )
+
+@bp.post("/tracker/<int:item_id>/update")
+@login_required
+@heavy
+def tracker_update(item_id):
+    item = Item.query.get_or_404(item_id)
+    with ingest_request() as ing:
+        return _tracker_update(item, ing.form, ing.files)
+
+def _tracker_update(item, form, files):
+    title = (form.get("title") or "").strip()
+    media_type = (form.get("media_type") or "").strip().lower()
+    # status removed from UI — keep existing item.status (legacy)
+    tags = (form.get("tags") or "").strip()
+    notes = (form.get("notes") or "").strip()
+    release_status = (form.get("release_status") or "").strip() or None
+
+    def to_int(v):
+        try:
+            return int(v)
+        except Exception:
+            return None
+
+    if not title or not media_type:
+        flash("Title and Type are required.", "danger")
+        return redirect(url_for("tracker.tracker") + f"#item{item.id}")
+
+    # reset type-specific fields
+    item.chapter_total = None
+    item.seasons = None
+    item.score = None  # rating removed at item-level
+    item.year = to_int(form.get("year"))
+    item.runtime_mins = to_int(form.get("runtime_mins"))
+    item.platforms = (form.get("platforms") or "").strip() or None
+
+    if media_type in ("book", "manga", "manhwa"):
+        item.chapter_total = to_int(form.get("chapter_total"))
+
+    if media_type in ("show", "anime"):
+        item.seasons = to_int(form.get("seasons"))
+
+    # assign common fields
+    item.title = title
+    item.media_type = media_type
+    # keep item.status as-is (legacy)
+    item.tags = tags
+    item.notes = notes
+    item.release_status = release_status
+
+    # optional cover re-upload
+    cover = files.get("cover")
+    # Multiple chapter PDFs (optional)
+    chapter_files = files.getlist("chapters")
+    if chapter_files:
+        existing_max = db.session.query(func.coalesce(func.max(Chapter.number), 0)).filter_by(item_id=item.id).scalar() or 0
+        next_num = existing_max + 1
+
+        for f in chapter_files:
+            if not f or not f.filename:
+                continue
+            n = _infer_chapter_number(f.raw_filename) or next_num
+            if n == next_num:
+                next_num += 1
+
+            rel = save_chapter_pdf(f, item.id, n)
+            ch = Chapter.query.filter_by(item_id=item.id, number=n).first()
+            if ch:
+                ch.source_path = rel
+            else:
+                db.session.add(Chapter(item_id=item.id, number=n, source_path=rel))
+
+    if cover and cover.filename:
+        rel, _ = save_item_cover(cover, item.id, thumbnail=False)
+        if rel:
+            item.cover_path = rel
+            item.cover_thumb_path = None  # until the cover_thumb job has run
+            _queue_cover_thumb(item)
+
+    source = files.get("source")
+    if source and source.filename:
+        rel_src = save_item_source(source, item.id)
+        if rel_src:
+            item.source_path = rel_src
+
+    db.session.commit()
+    flash(f"Updated '{item.title}'.", "success")
+    return redirect(url_for("tracker.tracker", type=item.media_type) + f"#item{item.id}")
+
+@bp.post("/tracker/<int:item_id>/chapter/<int:number>/delete")
+@login_required
+def delete_chapter(item_id, number):
+    ch = Chapter.query.filter_by(item_id=item_id, number=number).first_or_404()
+    db.session.delete(ch)
+    db.session.commit()
+    # keep modal open if called from inside it
+    if request.headers.get("X-Requested-With") == "fetch" or request.form.get("ajax"):
+        return ("", 204)
+    return redirect(url_for("tracker.tracker", type=request.args.get("type", "book")))
+
+@bp.get("/tracker/<int:item_id>/chapters.json")
+@login_required
+def list_chapters(item_id):
+    q = Chapter.query.filter_by(item_id=item_id).order_by(Chapter.number).all()
+    return jsonify([{"n": c.number, "url": f"/u/{c.source_path}", "title": c.title or f"Chapter {c.number}"} for c in q])
+
+# Item comments
+@bp.post("/tracker/<int:item_id>/comment")
+@login_required
+def tracker_comment_add(item_id):
+    item = Item.query.get_or_404(item_id)
+    uid = session.get("user_id")
+    user = User.query.get(uid)
+    if not user:
+        abort(403)
+    body = (request.form.get("body") or "").strip()
+    if not body:
+        flash("Comment cannot be empty.", "warning")
+        return redirect(url_for("tracker.tracker", type=item.media_type) + f"#item{item.id}")
+    if len(body) > 2000:
+        flash("Comment too long (max 2000 chars).", "warning")
+        return redirect(url_for("tracker.tracker", type=item.media_type) + f"#item{item.id}")
+    c = ItemComment(item_id=item.id, user_id=user.id, author=user.username, body=body)
+    db.session.add(c)
+    db.session.commit()
+    flash("Comment added.", "success")
+    return redirect(url_for("tracker.tracker", type=item.media_type) + f"#item{item.id}")
+
+@bp.post("/tracker/comment/<int:comment_id>/delete")
+@login_required
+def tracker_comment_delete(comment_id):
+    c = ItemComment.query.get_or_404(comment_id)
+    user = User.query.get(session.get("user_id"))
+    if not user or (c.user_id != user.id and not user.can_approve_users):
+        abort(403)
+    item = Item.query.get(c.item_id)
+    db.session.delete(c)
+    db.session.commit()
+    flash("Comment deleted.", "success")
+    return redirect(url_for("tracker.tracker", type=item.media_type) + f"#item{item.id}")
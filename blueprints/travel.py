@@ -0,0 +1,299 @@
+import pathlib
+import uuid
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, session, flash, abort, jsonify
+from sqlalchemy.orm import subqueryload
+
+from admission import heavy
+from metrics import query_budget
+from helpers import (
+    login_required, travel_edit_required, hydrate_comment_reactions,
+    parse_coord, valid_lat_lon,
+)
+import dupes
+import jobs
+import storage
+import trip_import
+from ingest import ingest_request
+from models import db, User, Trip, Photo, Comment, TripImport
+from uploads import _decodes_as_image
+
+bp = Blueprint("travel", __name__)
+
+# ----- Travel -----
+@bp.get("/travel")
+@login_required
+@query_budget(8)
+def travel():
+    trips = (
+        Trip.query
+        .options(subqueryload(Trip.photos), subqueryload(Trip.user_comments))
+        .order_by(Trip.created_at.desc())
+        .all()
+    )
+    # hydrate reactions on comments (all trips at once)
+    hydrate_comment_reactions([c for t in trips for c in t.user_comments], session.get("user_id"), "trip")
+    return render_template("travel.html", trips=trips)
+
+@bp.get("/api/trips")
+@login_required
+@query_budget(2)
+def api_trips():
+    trips = Trip.query.filter(Trip.lat.isnot(None), Trip.lon.isnot(None)).order_by(Trip.created_at.desc()).all()
+    return jsonify([{"id": t.id, "title": t.title, "lat": t.lat, "lon": t.lon} for t in trips])
+
+def _save_photos(trip_id: int, files):
+    """
+    Move ingested photos into the trip folder and add their Photo rows (no
+    commit). Thumbnails are queued, so this only costs the upload itself
+    plus a reduced-scale decode per photo for the near-duplicate check (a
+    verify() pass when that is off); files that don't decode are skipped.
+    Returns (photos, skipped, duplicates), duplicates being "name (match)"
+    strings; under DUPLICATE_POLICY "skip" those are not saved.
+    """
+    photos, skipped, duplicates = [], 0, []
+    if not files:
+        return photos, skipped, duplicates
+    trip_dir = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / "travel" / str(trip_id)
+    policy = dupes.policy()
+    if policy != "off":
+        hashed = [(f, dupes.hash_file(f.open())) for f in files if f.looks_like_image()]
+        images = [f for f, h in hashed if h is not None]
+        matches = dupes.screen([h for _, h in hashed if h is not None])
+    else:
+        images = [f for f in files if f.looks_like_image() and _decodes_as_image(f.open())]
+        matches = [None] * len(images)
+    skipped = len(files) - len(images)
+    for f, match in zip(images, matches):
+        if match:
+            duplicates.append(f"{f.filename} ({match})")
+            if policy == "skip":
+                continue
+        unique = f"{uuid.uuid4().hex}{f.safe_ext}"
+        f.move_to(trip_dir / unique)
+        photo = Photo(
+            trip_id=trip_id,
+            stored_path=str(pathlib.Path("travel") / str(trip_id) / unique),
+            thumb_path=None,  # filled in by the photo.thumb job
+            original_name=f.filename,
+            mime_type=f.mimetype,
+            size_bytes=f.size
+        )
+        db.session.add(photo)
+        photos.append(photo)
+    storage.record(*(p.stored_path for p in photos))
+    db.session.flush()
+    for photo in photos:
+        jobs.enqueue("photo.thumb", {"photo_id": photo.id}, dedupe_key=f"photo.thumb:{photo.id}")
+    return photos, skipped, duplicates
+
+def _duplicates_note(duplicates) -> str:
+    if not duplicates:
+        return ""
+    verb = "skipped as near-duplicates" if dupes.policy() == "skip" else "look like near-duplicates"
+    return f" {len(duplicates)} {verb}: {', '.join(duplicates[:5])}{' …' if len(duplicates) > 5 else ''}."
+
+def _queue_geocode(trip):
+    jobs.enqueue("trip.geocode", {"trip_id": trip.id, "address": trip.address},
+                 dedupe_key=f"trip.geocode:{trip.id}")
+
+@bp.post("/travel/new")
+@login_required
+@travel_edit_required
+@heavy
+def travel_new():
+    # the photos are streamed to disk here, before any DB write
+    with ingest_request() as ing:
+        return _travel_new(ing.form, ing.files.getlist("photos"))
+
+def _travel_new(form, files):
+    title = (form.get("title") or "").strip()
+    address = (form.get("address") or "").strip()
+    comments = (form.get("comments") or "").strip()
+    lat_in = parse_coord(form.get("lat"))
+    lon_in = parse_coord(form.get("lon"))
+    if not title or not address:
+        flash("Title and Address are required.", "danger")
+        return redirect(url_for("travel.travel"))
+
+    # bytes are already on disk and geocoding/thumbnails run as jobs, so the
+    # write transaction is just these inserts
+    trip = Trip(title=title, address=address, comments=comments)
+    if valid_lat_lon(lat_in, lon_in):
+        trip.lat, trip.lon = lat_in, lon_in
+    db.session.add(trip)
+    db.session.flush()
+    if trip.lat is None:
+        _queue_geocode(trip)
+    photos, skipped, duplicates = _save_photos(trip.id, files)
+    db.session.commit()
+    msg = f"Saved trip '{trip.title}'."
+    if trip.lat is None or trip.lon is None: msg += " (No map pin yet.)"
+    msg += f" Photos: {len(photos)} saved"
+    if skipped: msg += f", {skipped} skipped"
+    flash(msg + "." + _duplicates_note(duplicates), "success")
+    return redirect(url_for("travel.travel"))
+
+@bp.post("/travel/<int:trip_id>/update")
+@login_required
+@travel_edit_required
+@heavy
+def travel_update(trip_id):
+    trip = Trip.query.get_or_404(trip_id)
+    with ingest_request() as ing:
+        return _travel_update(trip, ing.form, ing.files.getlist("photos"))
+
+def _travel_update(trip, form, files):
+    title = (form.get("title") or "").strip()
+    address = (form.get("address") or "").strip()
+    comments = (form.get("comments") or "").strip()
+    lat_in = parse_coord(form.get("lat"))
+    lon_in = parse_coord(form.get("lon"))
+
+    if not title or not address:
+        flash("Title and Address are required.", "danger")
+        return redirect(url_for("travel.travel"))
+
+    address_changed = address != trip.address
+    trip.title, trip.address, trip.comments = title, address, comments
+
+    if valid_lat_lon(lat_in, lon_in):
+        trip.lat, trip.lon = lat_in, lon_in
+    elif address_changed or trip.lat is None:
+        # the old pin belongs to the old address
+        trip.lat, trip.lon = None, None
+        _queue_geocode(trip)
+
+    photos, skipped, duplicates = _save_photos(trip.id, files)
+    db.session.commit()
+    msg = f"Updated trip '{trip.title}'."
+    if photos or skipped or duplicates:
+        msg += f" Photos added: {len(photos)}" + (f", {skipped} skipped" if skipped else "") + "."
+    flash(msg + _duplicates_note(duplicates), "success")
+    return redirect(url_for("travel.travel"))
+
+# ----- Trips from a camera roll (see trip_import.py) -----
+def _own_batch(batch_id: int) -> TripImport:
+    batch = db.session.get(TripImport, batch_id)
+    if batch is None or batch.user_id != session.get("user_id"):
+        abort(404)
+    return batch
+
+@bp.get("/travel/import")
+@login_required
+@travel_edit_required
+@query_budget(3)
+def travel_import():
+    batches = (TripImport.query.filter_by(user_id=session["user_id"])
+               .order_by(TripImport.created_at.desc()).all())
+    return render_template("travel_import.html", batch=None, batches=batches)
+
+@bp.post("/travel/import")
+@login_required
+@travel_edit_required
+@heavy
+def travel_import_upload():
+    with ingest_request() as ing:
+        return _travel_import_upload(ing.form, ing.files.getlist("photos"))
+
+def _travel_import_upload(form, files):
+    batch_id = form.get("batch_id", type=int)
+    if batch_id:
+        batch = _own_batch(batch_id)
+    else:
+        batch = TripImport(user_id=session["user_id"])
+        db.session.add(batch)
+        db.session.flush()
+    added, skipped = trip_import.stage(batch, files)
+    if not added:
+        db.session.rollback()
+        flash("No photos to import." + (f" ({skipped} skipped: not images)" if skipped else ""), "warning")
+        return redirect(url_for("travel.travel_import"))
+    db.session.flush()
+    found = trip_import.recluster(batch)
+    db.session.commit()
+    msg = f"Added {added} photo{'' if added == 1 else 's'}; {found} trip{'' if found == 1 else 's'} found."
+    if skipped:
+        msg += f" {skipped} skipped (not images)."
+    flash(msg, "success")
+    return redirect(url_for("travel.travel_import_review", batch_id=batch.id))
+
+@bp.get("/travel/import/<int:batch_id>")
+@login_required
+@travel_edit_required
+@query_budget(4)
+def travel_import_review(batch_id):
+    batch = _own_batch(batch_id)
+    proposals, unplaced = trip_import.proposals(batch)
+    pins = [{"cluster": p["cluster"], "lat": p["lat"], "lon": p["lon"], "label": p["title"]} for p in proposals]
+    return render_template("travel_import.html", batch=batch, batches=[], proposals=proposals,
+                           unplaced=unplaced, pins=pins)
+
+@bp.post("/travel/import/<int:batch_id>/commit")
+@login_required
+@travel_edit_required
+@heavy
+def travel_import_commit(batch_id):
+    batch = _own_batch(batch_id)
+    chosen = {}
+    for value in request.form.getlist("cluster"):
+        if not value.isdigit():
+            continue
+        title = (request.form.get(f"title_{value}") or "").strip()
+        address = (request.form.get(f"address_{value}") or "").strip()
+        if not title or not address:
+            flash("Each trip you keep needs a title and an address.", "danger")
+            return redirect(url_for("travel.travel_import_review", batch_id=batch.id))
+        chosen[int(value)] = (title[:200], address[:500])
+    if not chosen:
+        flash("Select at least one trip to create.", "warning")
+        return redirect(url_for("travel.travel_import_review", batch_id=batch.id))
+    trips = trip_import.commit(batch, chosen)
+    flash(f"Created {len(trips)} trip{'' if len(trips) == 1 else 's'}.", "success")
+    if db.session.get(TripImport, batch_id) is not None:
+        return redirect(url_for("travel.travel_import_review", batch_id=batch_id))
+    return redirect(url_for("travel.travel"))
+
+@bp.post("/travel/import/<int:batch_id>/discard")
+@login_required
+@travel_edit_required
+def travel_import_discard(batch_id):
+    trip_import.discard(_own_batch(batch_id))
+    db.session.commit()
+    flash("Import discarded.", "success")
+    return redirect(url_for("travel.travel_import"))
+
+# ----- Comments on trips -----
+@bp.post("/travel/<int:trip_id>/comment")
+@login_required
+def travel_comment_add(trip_id):
+    trip = Trip.query.get_or_404(trip_id)
+    uid = session.get("user_id")
+    user = User.query.get(uid)
+    if not user:
+        abort(403)
+    body = (request.form.get("body") or "").strip()
+    if not body:
+        flash("Comment cannot be empty.", "warning")
+        return redirect(url_for("travel.travel") + f"#trip{trip.id}")
+    if len(body) > 2000:
+        flash("Comment too long (max 2000 chars).", "warning")
+        return redirect(url_for("travel.travel") + f"#trip{trip.id}")
+    c = Comment(trip_id=trip.id, user_id=user.id, author=user.username, body=body)
+    db.session.add(c)
+    db.session.commit()
+    flash("Comment added.", "success")
+    return redirect(url_for("travel.travel") + f"#trip{trip.id}")
+
+@bp.post("/travel/comment/<int:comment_id>/delete")
+@login_required
+def travel_comment_delete(comment_id):
+    c = Comment.query.get_or_404(comment_id)
+    user = User.query.get(session.get("user_id"))
+    if not user or (c.user_id != user.id and not user.can_travel_edit):
+        abort(403)
+    trip_id = c.trip_id
+    db.session.delete(c)
+    db.session.commit()
+    flash("Comment deleted.", "success")
+    return redirect(url_for("travel.travel") + f"#trip{trip_id}")
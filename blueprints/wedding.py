@@ -0,0 +1,655 @@
+import json
+from datetime import date
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, session, flash, abort, jsonify
+from sqlalchemy import case, func, insert, or_, select, update
+from sqlalchemy.orm import aliased, lazyload
+
+from admission import heavy
+from helpers import login_required, admin_required
+from metrics import query_budget
+from models import db, WEDDING_BOARDS, WeddingItem, SeatingTable, Guest, BudgetItem, SeatingConstraint
+from ingest import ingest_request
+from uploads import save_wedding_image, store_wedding_batch
+import budget
+import search
+import seating
+import versions
+
+bp = Blueprint("wedding", __name__)
+
+versions.track(WeddingItem, "wedding")
+
+# Dashboard: newest N per kind (None = all; vendors/venues are listed by title)
+DASHBOARD_LIMITS = {"idea": 20, "link": 20, "ring": 24, "cake": 24, "photo": 24, "vendor": None, "venue": None}
+_dashboard_cache = versions.VersionedCache()
+
+def dashboard_items() -> dict:
+    """{kind: [WeddingItem, ...]} for DASHBOARD_LIMITS in one windowed query."""
+    rn = func.row_number().over(partition_by=WeddingItem.kind, order_by=WeddingItem.created_at.desc())
+    ranked = select(WeddingItem, rn.label("rn")).where(WeddingItem.kind.in_(DASHBOARD_LIMITS)).subquery()
+    item = aliased(WeddingItem, ranked)
+    cap = case({k: n for k, n in DASHBOARD_LIMITS.items() if n}, value=ranked.c.kind, else_=-1)
+    rows = (db.session.query(item)
+            .filter(or_(cap < 0, ranked.c.rn <= cap))
+            .order_by(ranked.c.kind, ranked.c.rn)
+            .all())
+    out = {k: [] for k in DASHBOARD_LIMITS}
+    for it in rows:
+        out[it.kind].append(it)
+    return out
+
+
+ORDERED_KINDS = ("ceremony", "reception")
+
+
+def _ordered(kind: str):
+    """Steps of kind in meta order (ix_wedding_item_kind_order), unnumbered ones last."""
+    return WeddingItem.query.filter_by(kind=kind).order_by(WeddingItem.meta_order.nullslast(), WeddingItem.id)
+
+
+def _last_order(kind: str):
+    return db.session.execute(select(func.max(WeddingItem.meta_order)).where(WeddingItem.kind == kind)).scalar()
+
+
+BOARD_PAGE_SIZE = 36
+
+
+def _board_args():
+    sub = request.args.get("sub") or "rings"
+    if sub not in WEDDING_BOARDS:
+        sub = "rings"
+    starred_only = request.args.get("starred") in ("1", "true", "on")
+    before = request.args.get("before", type=int)
+    return sub, starred_only, before
+
+
+def board_page(sub: str, starred_only: bool, before: int | None = None, size: int = BOARD_PAGE_SIZE):
+    """(items, next_before): newest-first page of a board below the id cursor, and the cursor for the next one."""
+    q = WeddingItem.query.filter(WeddingItem.kind == WEDDING_BOARDS[sub][0])
+    if starred_only:
+        q = q.filter(WeddingItem.is_starred.is_(True))   # ix_wedding_item_kind_starred_id
+    if before:
+        q = q.filter(WeddingItem.id < before)            # otherwise ix_wedding_item_kind_id
+    items = q.order_by(WeddingItem.id.desc()).limit(size + 1).all()
+    more = len(items) > size
+    items = items[:size]
+    return items, (items[-1].id if more else None)
+
+
+@bp.get("/wedding")
+@login_required
+@admin_required
+@query_budget(4)
+def wedding_index():
+    # pending flash messages are part of the page, so those renders skip the cache
+    cacheable = not session.get("_flashes")
+    key = session.get("user_id")
+    version = versions.current("wedding")
+    html = _dashboard_cache.get(key, version) if cacheable else None
+    if html is None:
+        by_kind = dashboard_items()
+        vendors = sorted(by_kind["vendor"] + by_kind["venue"], key=lambda w: w.title)
+        html = render_template("wedding/index.html", ideas=by_kind["idea"], links=by_kind["link"],
+                               rings=by_kind["ring"], cakes=by_kind["cake"], photos=by_kind["photo"],
+                               vendors=vendors)
+        if cacheable:
+            _dashboard_cache.put(key, version, html, current_app.config["WEDDING_DASHBOARD_CACHE_SECONDS"])
+    return html
+
+@bp.post("/wedding/idea")
+@login_required
+@admin_required
+def wedding_add_idea():
+    title = (request.form.get("title") or "").strip()
+    notes = (request.form.get("notes") or "").strip()
+    if not title:
+        flash("Idea needs at least a short title.", "warning")
+        return redirect(url_for("wedding.wedding_index"))
+    item = WeddingItem(kind="idea", title=title, notes=notes,
+                       created_by_user_id=session.get("user_id"))
+    db.session.add(item); db.session.commit()
+    flash("Idea saved.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+@bp.get("/wedding/panel")
+@login_required
+@admin_required
+def wedding_panel():
+    kind = (request.args.get("kind") or "").strip().lower()
+    if kind == "ideas":
+        items = WeddingItem.query.filter_by(kind="idea").order_by(WeddingItem.created_at.desc()).limit(50).all()
+        return render_template("wedding/panel_ideas.html", items=items)
+
+    if kind == "links":
+        items = WeddingItem.query.filter_by(kind="link").order_by(WeddingItem.created_at.desc()).limit(50).all()
+        return render_template("wedding/panel_links.html", items=items)
+
+    if kind == "boards":
+        # which sub-board and whether to show only favorites; the first page only, more via board_tiles
+        sub, starred_only, _ = _board_args()
+        items, next_before = board_page(sub, starred_only)
+        return render_template(
+            "wedding/panel_boards.html",
+            sub=sub,
+            items=items,
+            starred=starred_only,
+            next_before=next_before,
+        )
+
+    if kind == "venues":
+        venues = WeddingItem.query.filter_by(kind="venue").order_by(WeddingItem.title.asc()).all()
+        vendors = WeddingItem.query.filter_by(kind="vendor").order_by(WeddingItem.title.asc()).all()
+        return render_template("wedding/panel_venues.html", venues=venues, vendors=vendors)
+
+    if kind == "ceremony":
+        steps = _ordered("ceremony").all()
+        return render_template("wedding/panel_ceremony.html", steps=steps)
+
+    if kind == "reception":
+        events = _ordered("reception").all()
+        return render_template("wedding/panel_reception.html", events=events)
+
+    if kind == "tasks":
+        tasks = WeddingItem.query.filter_by(kind="task").order_by(WeddingItem.meta_due.desc().nullslast()).all()
+        return render_template("wedding/panel_tasks.html", tasks=tasks)
+    
+    if kind == "seating":
+        tables = SeatingTable.query.order_by(SeatingTable.name.asc()).all()
+        # table names come from `tables`, so skip Guest.table's joined load
+        guests = Guest.query.options(lazyload(Guest.table)).order_by(Guest.name.asc()).all()
+        seated = dict(db.session.execute(
+            select(Guest.table_id, func.count()).where(Guest.table_id.is_not(None)).group_by(Guest.table_id)).all())
+        constraints = SeatingConstraint.query.order_by(SeatingConstraint.id.desc()).all()
+        return render_template("wedding/panel_seating.html", tables=tables, guests=guests, seated=seated,
+                               table_names={t.id: t.name for t in tables},
+                               guest_names={g.id: g.name for g in guests}, constraints=constraints)
+
+    if kind == "budget":
+        # totals/subtotals come from one GROUP BY; only the current page of line items is loaded
+        page = request.args.get("page", 1, type=int)
+        items, has_next = budget.line_items(page)
+        return render_template("wedding/panel_budget.html", summary=budget.summary(),
+                               upcoming=budget.upcoming(), items=items, page=max(1, page), has_next=has_next)
+
+    return ("Unknown panel", 400)
+
+@bp.post("/wedding/item/<int:item_id>/title")
+@login_required
+@admin_required
+def wedding_item_title(item_id):
+    it = WeddingItem.query.get_or_404(item_id)
+    title = (request.form.get("title") or "").strip()
+    it.title = title or it.title
+    db.session.commit()
+    return ("", 204)
+
+@bp.post("/wedding/seating/table/add")
+@login_required
+@admin_required
+def seating_table_add():
+    name = (request.form.get("name") or "").strip() or "Table"
+    capacity = int(request.form.get("capacity") or 8)
+    t = SeatingTable(name=name, capacity=capacity)
+    db.session.add(t); db.session.commit()
+    flash("Table added.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+# BOARDS: next page of tiles, appended by wedding.js as the grid scrolls
+@bp.get("/wedding/boards/tiles")
+@login_required
+@admin_required
+@query_budget(1)
+def board_tiles():
+    sub, starred_only, before = _board_args()
+    items, next_before = board_page(sub, starred_only, before)
+    return render_template("wedding/_board_tiles.html", items=items, current=sub,
+                           starred=starred_only, next_before=next_before)
+
+@bp.post("/wedding/item/<int:item_id>/star")
+@login_required
+@admin_required
+def wedding_item_star(item_id):
+    it = WeddingItem.query.get_or_404(item_id)
+    # Toggle unless explicit "on" is provided
+    raw = (request.form.get("on") or request.args.get("on") or "").lower()
+    if raw in ("1","true","on","yes"):
+        it.is_starred = True
+    elif raw in ("0","false","off","no"):
+        it.is_starred = False
+    else:
+        it.is_starred = not bool(it.is_starred)
+    db.session.commit()
+    return jsonify(ok=True, starred=bool(it.is_starred))
+
+@bp.post("/wedding/seating/guest/add")
+@login_required
+@admin_required
+def seating_guest_add():
+    name = (request.form.get("name") or "").strip()
+    side = (request.form.get("side") or "").strip() or None
+    email = (request.form.get("email") or "").strip() or None
+    phone = (request.form.get("phone") or "").strip() or None
+    rsvp = (request.form.get("rsvp") or "unknown").strip()
+    table_id = request.form.get("table_id")
+    g = Guest(name=name, side=side, email=email, phone=phone, rsvp=rsvp,
+              table_id=int(table_id) if table_id else None)
+    db.session.add(g); db.session.commit()
+    flash("Guest added.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+@bp.post("/wedding/seating/guest/assign")
+@login_required
+@admin_required
+def seating_guest_assign():
+    gid = int(request.form["guest_id"])
+    table_id = request.form.get("table_id")
+    g = Guest.query.get_or_404(gid)
+    g.table_id = int(table_id) if table_id else None
+    db.session.commit()
+    return redirect(url_for("wedding.wedding_index"))
+
+GUEST_IMPORT_BATCH = 500
+
+# SEATING: CSV import (name, side, email, phone, rsvp, notes, party); rows sharing a party sit together
+@bp.post("/wedding/seating/import")
+@login_required
+@admin_required
+@heavy
+def seating_import():
+    # normalised contact -> [guest id]; a new row's id is filled in when its batch is inserted
+    emails, phones = {}, {}
+    for gid, email, phone in db.session.execute(select(Guest.id, Guest.email, Guest.phone)):
+        if e := seating.norm_email(email):
+            emails.setdefault(e, [gid])
+        if p := seating.norm_phone(phone):
+            phones.setdefault(p, [gid])
+
+    added = duplicates = 0
+    errors, parties = [], {}
+    batch, refs = [], []
+
+    def flush_batch():
+        ids = db.session.scalars(insert(Guest).returning(Guest.id, sort_by_parameter_order=True), batch).all()
+        for ref, gid in zip(refs, ids):
+            ref[0] = gid
+        batch.clear(); refs.clear()
+
+    with ingest_request() as ing:
+        f = ing.files.get("csv")
+        if f is None:
+            return jsonify(ok=False, error="Choose a CSV file."), 400
+        try:
+            for line_no, row in seating.read_guest_csv(f.open()):
+                if not row["name"]:
+                    errors.append(f"line {line_no}: no name")
+                    continue
+                e, p = row["email"], seating.norm_phone(row["phone"])
+                ref = (e and emails.get(e)) or (p and phones.get(p))
+                if ref:
+                    duplicates += 1
+                else:
+                    ref = [None]
+                    batch.append({k: row[k] for k in ("name", "side", "email", "phone", "rsvp", "notes")})
+                    refs.append(ref)
+                    added += 1
+                    if len(batch) >= GUEST_IMPORT_BATCH:
+                        flush_batch()
+                if e:
+                    emails.setdefault(e, ref)
+                if p:
+                    phones.setdefault(p, ref)
+                if row["party"]:
+                    parties.setdefault(row["party"], []).append(ref)
+        except ValueError as exc:
+            db.session.rollback()
+            return jsonify(ok=False, error=str(exc)), 400
+    if batch:
+        flush_batch()
+
+    pairs = set()
+    for members in parties.values():
+        ids = sorted({ref[0] for ref in members})
+        pairs.update(("together", a, b) for a, b in zip(ids, ids[1:]))
+    if pairs:
+        db.session.execute(insert(SeatingConstraint).prefix_with("OR IGNORE"),
+                           [{"kind": k, "guest_a_id": a, "guest_b_id": b} for k, a, b in sorted(pairs)])
+    db.session.commit()
+    return jsonify(ok=True, added=added, duplicates=duplicates, skipped=len(errors),
+                   together=len(pairs), errors=errors[:20])
+
+@bp.post("/wedding/seating/constraint")
+@login_required
+@admin_required
+def seating_constraint_add():
+    kind = request.form.get("kind")
+    a, b = request.form.get("guest_a", type=int), request.form.get("guest_b", type=int)
+    if kind not in seating.CONSTRAINT_KINDS or not a or not b or a == b:
+        flash("Pick two different guests.", "warning")
+        return redirect(url_for("wedding.wedding_index"))
+    a, b = min(a, b), max(a, b)
+    if not SeatingConstraint.query.filter_by(kind=kind, guest_a_id=a, guest_b_id=b).first():
+        db.session.add(SeatingConstraint(kind=kind, guest_a_id=a, guest_b_id=b))
+        db.session.commit()
+    return redirect(url_for("wedding.wedding_index"))
+
+@bp.post("/wedding/seating/constraint/<int:constraint_id>/delete")
+@login_required
+@admin_required
+def seating_constraint_delete(constraint_id):
+    c = SeatingConstraint.query.get_or_404(constraint_id)
+    db.session.delete(c); db.session.commit()
+    return redirect(url_for("wedding.wedding_index"))
+
+def _seating_inputs():
+    """(guests, tables, constraints) as plain tuples for seating.solve()."""
+    guests = [tuple(r) for r in db.session.execute(select(Guest.id, Guest.side, Guest.rsvp, Guest.table_id))]
+    tables = [tuple(r) for r in db.session.execute(select(SeatingTable.id, SeatingTable.capacity))]
+    constraints = [tuple(r) for r in db.session.execute(
+        select(SeatingConstraint.kind, SeatingConstraint.guest_a_id, SeatingConstraint.guest_b_id))]
+    return guests, tables, constraints
+
+# SEATING: auto-assign. Preview returns the plan (nothing saved); apply saves exactly that plan
+@bp.post("/wedding/seating/auto/preview")
+@login_required
+@admin_required
+def seating_auto_preview():
+    guests, tables, constraints = _seating_inputs()
+    plan = seating.solve(guests, tables, constraints,
+                         keep_existing=bool(request.form.get("keep_existing")),
+                         include_unknown=bool(request.form.get("include_unknown")))
+    current = {g[0]: g[3] for g in guests}
+    changes = sum(1 for gid, tid in plan.assignments.items() if current.get(gid) != tid)
+    names = dict(db.session.execute(select(Guest.id, Guest.name)).all())
+    by_table = {}
+    for gid, tid in plan.assignments.items():
+        if tid is not None:
+            by_table.setdefault(tid, []).append(names[gid])
+    html = render_template(
+        "wedding/_seating_preview.html", plan=plan, changes=changes, names=names, by_table=by_table,
+        tables=SeatingTable.query.order_by(SeatingTable.name.asc()).all(),
+        assignments=json.dumps(plan.assignments), fingerprint=seating.fingerprint(guests, tables, constraints))
+    return jsonify(ok=True, changes=changes, cost=plan.cost, seated=sum(1 for t in plan.assignments.values() if t),
+                   unseated=len(plan.unseated), warnings=plan.warnings, elapsed_ms=plan.elapsed_ms, html=html)
+
+@bp.post("/wedding/seating/auto/apply")
+@login_required
+@admin_required
+def seating_auto_apply():
+    try:
+        assignments = {int(k): (int(v) if v is not None else None)
+                       for k, v in json.loads(request.form.get("assignments") or "{}").items()}
+    except (TypeError, ValueError, AttributeError):
+        return jsonify(ok=False, error="bad plan"), 400
+    guests, tables, constraints = _seating_inputs()
+    if request.form.get("fingerprint") != seating.fingerprint(guests, tables, constraints):
+        return jsonify(ok=False, error="Guests, tables or constraints changed since the preview; preview again."), 409
+    problems = seating.violations(assignments, tables, constraints)
+    if problems:
+        return jsonify(ok=False, error="Plan breaks constraints.", problems=problems[:20]), 422
+    current = {g[0]: g[3] for g in guests}
+    rows = [{"id": gid, "table_id": tid} for gid, tid in assignments.items() if gid in current and current[gid] != tid]
+    if rows:
+        db.session.execute(update(Guest), rows)  # executemany by primary key
+    db.session.commit()
+    return jsonify(ok=True, changed=len(rows))
+
+@bp.post("/wedding/seating/table/photo/<int:table_id>")
+@login_required
+@admin_required
+@heavy
+def seating_table_photo(table_id):
+    table = SeatingTable.query.get_or_404(table_id)
+    with ingest_request() as ing:
+        which = ing.form.get("which")  # 'tiny' or 'rosie'
+        f = ing.files.get("image")
+        if which not in ("tiny", "rosie") or not f:
+            abort(400)
+        rel, thumb = save_wedding_image(f, "tables", table_id)
+    if which == "tiny": table.img_tiny = rel or table.img_tiny
+    else: table.img_rosie = rel or table.img_rosie
+    db.session.commit()
+    flash("Table photo saved.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+# CEREMONY: add step (order defaults to next)
+@bp.post("/wedding/ceremony/step")
+@login_required
+@admin_required
+def wedding_add_ceremony_step():
+    title = (request.form.get("title") or "").strip()
+    notes = (request.form.get("notes") or "").strip()
+    order = request.form.get("order")
+    try:
+        order = int(order) if order is not None and order != "" else None
+    except:
+        order = None
+    if order is None:
+        last = _last_order("ceremony")
+        order = int(last) + 1 if last is not None else 1
+    it = WeddingItem(kind="ceremony", title=title or f"Step {order}", notes=notes,
+                     meta={"order": order}, created_by_user_id=session.get("user_id"))
+    db.session.add(it); db.session.commit()
+    flash("Ceremony step added.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+# RECEPTION: add event (order + type)
+@bp.post("/wedding/reception/event")
+@login_required
+@admin_required
+def wedding_add_reception_event():
+    title = (request.form.get("title") or "").strip()
+    etype = (request.form.get("etype") or "event").strip()   # e.g., 'speech','dance','announcement'
+    order = request.form.get("order")
+    try:
+        order = int(order) if order else None
+    except:
+        order = None
+    if order is None:
+        last = _last_order("reception")
+        order = int(last) + 1 if last is not None else 1
+    it = WeddingItem(kind="reception", title=title or f"Event {order}",
+                     meta={"order": order, "type": etype}, created_by_user_id=session.get("user_id"))
+    db.session.add(it); db.session.commit()
+    flash("Reception event added.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+# TASKS: add task with owner/due/status
+@bp.post("/wedding/tasks/add")
+@login_required
+@admin_required
+def wedding_tasks_add():
+    title = (request.form.get("title") or "").strip()
+    owner = (request.form.get("owner") or "Tiny").strip()
+    due   = (request.form.get("due") or "").strip()
+    status = (request.form.get("status") or "todo").strip()
+    meta = {"owner": owner, "status": status}
+    if due:
+        meta["due"] = due   # ISO yyyy-mm-dd string is fine
+    it = WeddingItem(kind="task", title=title or "Untitled task",
+                     meta=meta, created_by_user_id=session.get("user_id"))
+    db.session.add(it); db.session.commit()
+    flash("Task added.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+@bp.post("/wedding/link")
+@login_required
+@admin_required
+def wedding_add_link():
+    title = (request.form.get("title") or "").strip()
+    url   = (request.form.get("url") or "").strip()
+    ts    = (request.form.get("url_ts") or "").strip()
+    def to_seconds(s):
+        # supports "90", "1:30", "01:02:03"
+        if not s: return None
+        parts = [int(p) for p in s.split(":")]
+        if len(parts) == 1: return parts[0]
+        if len(parts) == 2: return parts[0]*60 + parts[1]
+        if len(parts) == 3: return parts[0]*3600 + parts[1]*60 + parts[2]
+        return None
+    if not title or not url:
+        flash("Link needs a title and a URL.", "warning")
+        return redirect(url_for("wedding.wedding_index"))
+    item = WeddingItem(kind="link", title=title, url=url, url_ts=to_seconds(ts),
+                       created_by_user_id=session.get("user_id"))
+    db.session.add(item); db.session.commit()
+    flash("Link saved.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+@bp.get("/wedding/export/ceremony")
+@login_required
+@admin_required
+def export_ceremony_html():
+    steps = _ordered("ceremony").all()
+    return render_template("wedding/export_ceremony.html", steps=steps)
+
+# CEREMONY / RECEPTION: renumber in one statement; ids come in their new order
+@bp.post("/wedding/<kind>/reorder")
+@login_required
+@admin_required
+def wedding_reorder(kind):
+    if kind not in ORDERED_KINDS:
+        abort(404)
+    raw = (request.get_json(silent=True) or {}).get("ids") if request.is_json else request.form.get("ids")
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw or [] if str(i).strip()))
+    except (TypeError, ValueError):
+        ids = []
+    if not ids:
+        if request.is_json:
+            return jsonify(ok=False, error="ids required"), 400
+        flash("Nothing to reorder.", "warning")
+        return redirect(url_for("wedding.wedding_index"))
+
+    position = case({item_id: n for n, item_id in enumerate(ids, start=1)}, value=WeddingItem.id)
+    res = db.session.execute(
+        update(WeddingItem)
+        .where(WeddingItem.kind == kind, WeddingItem.id.in_(ids))
+        .values(meta=func.json_set(func.coalesce(WeddingItem.meta, "{}"), "$.order", position))
+        .execution_options(synchronize_session=False)
+    )
+    versions.bump("wedding")  # bulk UPDATE skips the flush hook
+    db.session.commit()
+    if request.is_json:
+        return jsonify(ok=True, updated=res.rowcount)
+    return redirect(url_for("wedding.wedding_index"))
+
+@bp.post("/wedding/budget/add")
+@login_required
+@admin_required
+def budget_add():
+    cat = (request.form.get("category") or "General").strip()
+    item = (request.form.get("item") or "Item").strip()
+    est = int(float(request.form.get("estimate") or 0) * 100)  # dollars -> cents
+    act_raw = request.form.get("actual")
+    act = int(float(act_raw) * 100) if act_raw else None
+    paid = bool(request.form.get("paid"))
+    url  = (request.form.get("vendor_url") or "").strip() or None
+    notes = (request.form.get("notes") or "").strip() or None
+    try:
+        due = date.fromisoformat(request.form.get("due_date") or "")
+    except ValueError:
+        due = None
+    bi = BudgetItem(category=cat, item=item, estimate=est, actual=act, paid=paid,
+                    vendor_url=url, notes=notes, due_date=due)
+    db.session.add(bi); db.session.commit()
+    flash("Budget item added.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+# BUDGET: summary for charts (cents)
+@bp.get("/wedding/budget/summary.json")
+@login_required
+@admin_required
+@query_budget(1)
+def budget_summary_json():
+    return jsonify(budget.summary())
+
+@bp.post("/wedding/upload/<bucket>")
+@login_required
+@admin_required
+@heavy
+def wedding_upload(bucket):
+    # allow all Boards buckets
+    if bucket not in WEDDING_BOARDS:
+        abort(400)
+    kind, default_title = WEDDING_BOARDS[bucket]
+
+    # 1) sniff every part (ingest already hashed them) and drop repeats within the batch
+    results, keep, seen = [], [], set()
+    with ingest_request() as ing:
+        title = (ing.form.get("title") or "").strip() or default_title
+        for f in ing.files.getlist("images"):
+            res = {"filename": f.raw_filename, "ok": False}
+            results.append(res)
+            if not f.looks_like_image():
+                res["error"] = "not an image"
+            elif f.sha256 in seen:
+                res["error"] = "duplicate in this upload"
+            else:
+                seen.add(f.sha256)
+                keep.append((res, f))
+
+        # 2) move into place + thumbnail on the pool
+        stored = store_wedding_batch([f for _, f in keep], bucket)
+
+    # 3) one INSERT for the whole batch
+    uid = session.get("user_id")
+    rows, pending = [], []
+    for (res, _), (rel, thumb, error, duplicate_of) in zip(keep, stored):
+        if error:
+            res["error"] = error
+            continue
+        if duplicate_of:
+            res["warning"] = f"looks like a duplicate of {duplicate_of}"
+        rows.append({"kind": kind, "title": title, "image_path": thumb, "created_by_user_id": uid})
+        pending.append(res)
+    if rows:
+        items = db.session.scalars(
+            insert(WeddingItem).returning(WeddingItem, sort_by_parameter_order=True), rows).all()
+        for res, it in zip(pending, items):
+            # rendered before commit expires the returned rows
+            res.update(ok=True, id=it.id, html=render_template("wedding/_board_tile.html", it=it, current=bucket))
+        versions.bump("wedding")  # bulk insert skips the flush hooks
+        search.refresh(WeddingItem, [it.id for it in items])
+        db.session.commit()
+
+    saved = len(rows)
+    return jsonify(ok=bool(saved), saved=saved, failed=len(results) - saved, results=results)
+
+@bp.post("/wedding/item/<int:item_id>/delete")
+@login_required
+@admin_required
+def wedding_item_delete(item_id):
+    it = WeddingItem.query.get_or_404(item_id)
+    db.session.delete(it)
+    db.session.commit()
+    return ("", 204)
+
+@bp.post("/wedding/vendor")
+@login_required
+@admin_required
+def wedding_add_vendor():
+    title = (request.form.get("title") or "").strip()
+    url   = (request.form.get("url") or "").strip() or None
+    notes = (request.form.get("notes") or "").strip() or None
+    kind  = (request.form.get("kind") or "vendor").strip().lower()  # 'vendor' or 'venue'
+    if kind not in ("vendor","venue"): kind = "vendor"
+    if not title:
+        flash("Please give it a name.", "warning")
+        return redirect(url_for("wedding.wedding_index"))
+    item = WeddingItem(kind=kind, title=title, url=url, notes=notes,
+                       created_by_user_id=session.get("user_id"))
+    db.session.add(item); db.session.commit()
+    flash("Saved.", "success")
+    return redirect(url_for("wedding.wedding_index"))
+
+@bp.post("/wedding/<int:item_id>/delete")
+@login_required
+@admin_required
+def wedding_delete(item_id):
+    it = WeddingItem.query.get_or_404(item_id)
+    db.session.delete(it); db.session.commit()
+    flash("Deleted.", "info")
+    return redirect(url_for("wedding.wedding_index"))
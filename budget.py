@@ -0,0 +1,78 @@
+"""
+Wedding budget summary, computed in SQL.
+
+``summary()`` is one GROUP BY category query. Conditional SUMs give each
+category's estimate, actual, paid and outstanding amounts and the unpaid
+amounts by due bucket. ``SUM(...) OVER ()`` on the grouped rows adds the
+grand totals to every row (SQLite has no ROLLUP), so there is no second
+query and no BudgetItem objects are built. All amounts are cents.
+
+An item's amount is its actual cost when known, else its estimate. "paid"
+is the amount of paid items; "outstanding" is everything not yet paid,
+bucketed by due date relative to today.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import case, func, select
+
+from models import db, BudgetItem
+
+PAGE_SIZE = 25
+BUCKETS = ("overdue", "due_30", "due_90", "later", "undated")   # unpaid amounts by due date
+UPCOMING_DAYS = 30
+
+
+def _cents(cond, value):
+    return func.coalesce(func.sum(case((cond, value), else_=0)), 0)
+
+
+def summary(today: date | None = None) -> dict:
+    today = today or date.today()
+    amount = func.coalesce(BudgetItem.actual, BudgetItem.estimate, 0)
+    unpaid = func.coalesce(BudgetItem.paid, False).is_(False)
+    due = BudgetItem.due_date
+    cols = {
+        "count": func.count(),
+        "estimate": func.coalesce(func.sum(BudgetItem.estimate), 0),
+        "actual": func.coalesce(func.sum(BudgetItem.actual), 0),
+        "paid": _cents(~unpaid, amount),
+        "outstanding": _cents(unpaid, amount),
+        "overdue": _cents(unpaid & (due < today), amount),
+        "due_30": _cents(unpaid & due.between(today, today + timedelta(days=30)), amount),
+        "due_90": _cents(unpaid & (due > today + timedelta(days=30)) & (due <= today + timedelta(days=90)), amount),
+        "later": _cents(unpaid & (due > today + timedelta(days=90)), amount),
+        "undated": _cents(unpaid & due.is_(None), amount),
+    }
+    stmt = select(
+        BudgetItem.category,
+        *(c.label(k) for k, c in cols.items()),
+        *(func.sum(c).over().label(f"total_{k}") for k, c in cols.items()),
+    ).group_by(BudgetItem.category).order_by(BudgetItem.category)
+
+    rows = db.session.execute(stmt).mappings().all()
+    categories = [{"category": r["category"], **{k: r[k] for k in cols}} for r in rows]
+    totals = {k: (rows[0][f"total_{k}"] if rows else 0) for k in cols}
+    return {
+        "as_of": today.isoformat(),
+        "categories": categories,
+        "totals": totals,
+        "due": {b: totals[b] for b in BUCKETS},
+    }
+
+
+def upcoming(today: date | None = None, days: int = UPCOMING_DAYS, limit: int = 10):
+    """Unpaid items due in the next `days` days, soonest first (ix_budget_item_due_paid)."""
+    today = today or date.today()
+    return (BudgetItem.query
+            .filter(BudgetItem.due_date.between(today, today + timedelta(days=days)),
+                    func.coalesce(BudgetItem.paid, False).is_(False))
+            .order_by(BudgetItem.due_date, BudgetItem.id)
+            .limit(limit).all())
+
+
+def line_items(page: int = 1, size: int = PAGE_SIZE):
+    """(items, has_next) for one page of the line-item table, ordered by category then item."""
+    page = max(1, page)
+    items = (BudgetItem.query.order_by(BudgetItem.category, BudgetItem.item, BudgetItem.id)
+             .offset((page - 1) * size).limit(size + 1).all())
+    return items[:size], len(items) > size
@@ -0,0 +1,126 @@
+import os
+import pathlib
+from datetime import timedelta
+
+# Base folder of this project (portable across OSes)
+BASE_DIR = pathlib.Path(__file__).resolve().parent
+
+
+# Build a cross-platform SQLite file URI for local dev
+def _local_sqlite_uri(filename: str) -> str:
+    p = (BASE_DIR / filename).resolve()
+    return "sqlite:///" + str(p).replace("\\", "/")
+
+
+def _upload_root() -> str:
+    # Uploads directory (env > /opt/media/uploads > ./uploads)
+    if os.environ.get("UPLOAD_ROOT"):
+        return os.environ["UPLOAD_ROOT"]
+    if os.path.isdir("/opt/media"):
+        return "/opt/media/uploads"
+    return str((BASE_DIR / "uploads").resolve())
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default).lower() not in ("0", "false", "no", "off", "")
+
+
+class Config:
+    # Choose DB URI:
+    # 1) honor env vars (DATABASE_URL or SQLALCHEMY_DATABASE_URI)
+    # 2) else if /opt/media exists, use server DB there
+    # 3) else fall back to local ./media.db
+    SQLALCHEMY_DATABASE_URI = (
+        os.environ.get("DATABASE_URL")
+        or os.environ.get("SQLALCHEMY_DATABASE_URI")
+        or ("sqlite:////opt/media/media.db" if os.path.isdir("/opt/media") else _local_sqlite_uri("media.db"))
+    )
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Sessions / cookies
+    SECRET_KEY = os.environ.get("SECRET_KEY", "dev-change-me")
+    PERMANENT_SESSION_LIFETIME = timedelta(hours=12)
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SECURE = not bool(os.environ.get("COOKIE_INSECURE"))
+    SESSION_COOKIE_SAMESITE = "Lax"
+
+    UPLOAD_ROOT = _upload_root()
+    MAX_CONTENT_LENGTH = 512 * 1024 * 1024  # 512 MB
+
+    # Schema: apply pending migrations on first request (set AUTO_MIGRATE=0 in prod and run `manage.py migrate`)
+    AUTO_MIGRATE = _env_flag("AUTO_MIGRATE", "1")
+
+    # SQLite connection profile (see sqlite_tuning.py); SQLITE_TUNING=0 keeps stock settings
+    SQLITE_PRAGMAS = {
+        "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "15000")),
+        "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, so 64 MB
+        "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+    } if _env_flag("SQLITE_TUNING", "1") else {}
+
+    # /metrics: admins always; scrapers send "Authorization: Bearer $METRICS_TOKEN"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    # shared dir where gunicorn workers drop snapshots so /metrics sees all of them
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+
+    # query_budget() on views: raise instead of log when over budget (None = debug/testing only)
+    QUERY_BUDGET_STRICT = None
+
+    # Background jobs (see jobs.py); JOBS_INLINE=0 once `manage.py worker` is running
+    JOBS_INLINE = _env_flag("JOBS_INLINE", "1")
+    JOBS_MAX_ATTEMPTS = int(os.environ.get("JOBS_MAX_ATTEMPTS", "5"))
+    JOBS_BACKOFF_BASE = float(os.environ.get("JOBS_BACKOFF_BASE", "5"))   # seconds, doubled per attempt
+    JOBS_BACKOFF_MAX = float(os.environ.get("JOBS_BACKOFF_MAX", "900"))
+    JOBS_LEASE_SECONDS = int(os.environ.get("JOBS_LEASE_SECONDS", "600"))  # running longer = worker died
+
+    # Resumable uploads (/api/uploads): largest single file, and when abandoned partials are removed
+    RESUMABLE_MAX_BYTES = int(os.environ.get("RESUMABLE_MAX_MB", "4096")) * 1024 * 1024
+    RESUMABLE_TTL_HOURS = float(os.environ.get("RESUMABLE_TTL_HOURS", "24"))
+
+    # Admission control for upload/thumbnail routes (see admission.py); ADMISSION_PER_PROCESS=0 disables
+    ADMISSION_PER_PROCESS = int(os.environ.get("ADMISSION_PER_PROCESS", "2"))
+    ADMISSION_GLOBAL = int(os.environ.get("ADMISSION_GLOBAL", "4"))         # across workers; 0 = no shared limit
+    ADMISSION_WAIT_SECONDS = float(os.environ.get("ADMISSION_WAIT_SECONDS", "10"))
+    ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "5"))
+    ADMISSION_LOCK_DIR = os.environ.get("ADMISSION_LOCK_DIR")              # default: UPLOAD_ROOT/.locks
+
+    # Rendered /wedding dashboard is reused for this long unless a wedding write bumps its data_version
+    WEDDING_DASHBOARD_CACHE_SECONDS = float(os.environ.get("WEDDING_DASHBOARD_CACHE_SECONDS", "30"))
+
+    # manage.py backup: snapshot dir and grandfather-father-son retention (see backup.py)
+    BACKUP_ROOT = os.environ.get("BACKUP_ROOT") or str(BASE_DIR / "backups")
+    BACKUP_KEEP_DAILY = int(os.environ.get("BACKUP_KEEP_DAILY", "7"))
+    BACKUP_KEEP_WEEKLY = int(os.environ.get("BACKUP_KEEP_WEEKLY", "4"))
+    BACKUP_KEEP_MONTHLY = int(os.environ.get("BACKUP_KEEP_MONTHLY", "6"))
+    BACKUP_PAGES_PER_STEP = int(os.environ.get("BACKUP_PAGES_PER_STEP", "1024"))   # SQLite pages copied per step
+
+    # manage.py gc-uploads: files younger than the grace period are never touched (see upload_gc.py)
+    GC_GRACE_HOURS = float(os.environ.get("GC_GRACE_HOURS", "24"))
+    GC_QUARANTINE_DAYS = float(os.environ.get("GC_QUARANTINE_DAYS", "14"))   # then quarantined files are deleted
+
+    # manage.py storage-reconcile: threads walking the upload tree (see storage.py)
+    STORAGE_RECONCILE_WORKERS = int(os.environ.get("STORAGE_RECONCILE_WORKERS", "4"))
+
+    # /travel/import: photos within this distance and time gap of each other form one proposed trip
+    TRIP_CLUSTER_KM = float(os.environ.get("TRIP_CLUSTER_KM", "50"))
+    TRIP_CLUSTER_GAP_HOURS = float(os.environ.get("TRIP_CLUSTER_GAP_HOURS", "36"))
+    TRIP_CLUSTER_MIN_PHOTOS = int(os.environ.get("TRIP_CLUSTER_MIN_PHOTOS", "3"))
+
+    # Near-duplicate uploads (dHash Hamming distance, see dupes.py): "off", "warn" or "skip"
+    DUPLICATE_POLICY = os.environ.get("DUPLICATE_POLICY", "warn")
+    DUPLICATE_MAX_DISTANCE = int(os.environ.get("DUPLICATE_MAX_DISTANCE", "6"))   # of 64 bits
+
+    # Thumbnails
+    THUMB_MAX_PX = int(os.environ.get("THUMB_MAX_PX", "512"))
+    THUMB_QUALITY = int(os.environ.get("THUMB_QUALITY", "82"))
+    THUMB_WORKERS = int(os.environ.get("THUMB_WORKERS", "4"))   # threads per wedding board upload batch
+
+
+class TestConfig(Config):
+    """In-memory database, no secure cookie; for tests and scratch scripts."""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SESSION_COOKIE_SECURE = False
+    SECRET_KEY = "test"
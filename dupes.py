@@ -0,0 +1,258 @@
+"""
+Near-duplicate detection for uploaded images (trip photos, wedding boards).
+
+The fingerprint is a 64-bit difference hash: the image is shrunk to 9x8
+grey pixels, and each bit says whether a pixel is brighter than its right
+neighbour. Re-encoding, resizing and mild edits move only a few bits, so
+"near-duplicate" means a Hamming distance of at most DUPLICATE_MAX_DISTANCE.
+``uploads.make_thumbnail()`` returns the hash of the image it has already
+decoded and shrunk, so hashing adds no extra decode. Where no thumbnail is
+made in the request (trip photos are thumbnailed by a job), ``hash_file()``
+decodes JPEGs at 1/8 scale to check them.
+
+Hashes are kept in image_hash, keyed by the path their row references.
+Each process holds a BK-tree of them: a metric tree in which a search
+within distance r visits only the few branches whose edge is within r of
+the query's distance to the node. The tree is built once, then tails rows
+by id (one indexed query per check), so new uploads from any process show
+up incrementally. Deleted images can linger in the tree; candidates are
+confirmed against the rows that still reference them before being reported.
+
+``screen()`` is what upload paths call under DUPLICATE_POLICY ("off",
+"warn" or "skip"). ``clusters()`` groups the whole library for
+``manage.py dupes``, after ``backfill()`` has hashed images uploaded before
+this existed.
+"""
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import delete, not_, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, ImageHash, Photo, Trip, WeddingItem
+
+HASH_SIZE = 8            # 8x8 comparisons -> 64 bits
+POLICIES = ("off", "warn", "skip")
+BACKFILL_CHUNK = 500
+IN_THIS_UPLOAD = "another image in this upload"
+
+
+# ---------------- Hashing ----------------
+def dhash(im) -> int:
+    """64-bit difference hash of a PIL image."""
+    from PIL import Image  # deferred: only upload paths pay for Pillow
+    w = HASH_SIZE + 1
+    px = im.convert("L").resize((w, HASH_SIZE), Image.BILINEAR).tobytes()
+    h = 0
+    for y in range(HASH_SIZE):
+        row = px[y * w:(y + 1) * w]
+        for x in range(HASH_SIZE):
+            h = (h << 1) | (row[x] > row[x + 1])
+    return h
+
+
+def hash_file(src) -> int | None:
+    """dHash of an image file or open handle (JPEGs decoded at reduced scale); None if unreadable."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    try:
+        with Image.open(src) as im:
+            im.draft("RGB", (64, 64))
+            return dhash(ImageOps.exif_transpose(im))
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _signed(h: int) -> int:
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def _unsigned(v: int) -> int:
+    return v & 0xFFFFFFFFFFFFFFFF
+
+
+# ---------------- BK-tree ----------------
+class BKTree:
+    """Hamming-distance BK-tree; nodes are [hash, [keys], {edge distance: child}]."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, h: int, key):
+        self.size += 1
+        if self.root is None:
+            self.root = [h, [key], {}]
+            return
+        node = self.root
+        while True:
+            d = distance(h, node[0])
+            if d == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [key], {}]
+                return
+            node = child
+
+    def search(self, h: int, radius: int) -> list[tuple[int, object]]:
+        """[(distance, key), ...] for every key within radius of h."""
+        out, stack = [], [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = distance(h, node[0])
+            if d <= radius:
+                out.extend((d, k) for k in node[1])
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return out
+
+
+class _Index:
+    """The process's tree of image_hash rows, extended from the last id it has seen."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.database = None
+        self.tree = BKTree()
+        self.last_id = 0
+
+    def search(self, hashes, radius: int) -> list[list]:
+        database = str(db.engine.url)
+        with self.lock:
+            if database != self.database:   # another app/database in this process (manage.py, tests)
+                self.database, self.tree, self.last_id = database, BKTree(), 0
+            rows = db.session.execute(
+                select(ImageHash.id, ImageHash.hash, ImageHash.path)
+                .where(ImageHash.id > self.last_id).order_by(ImageHash.id)).all()
+            for id_, h, path in rows:
+                self.tree.add(_unsigned(h), path)
+                self.last_id = id_
+            return [self.tree.search(h, radius) if h is not None else [] for h in hashes]
+
+
+_index = _Index()
+
+
+# ---------------- Library ----------------
+def _referenced():
+    """image_hash rows whose path a Photo or WeddingItem still points at."""
+    return or_(ImageHash.path.in_(select(Photo.stored_path)),
+               ImageHash.path.in_(select(WeddingItem.image_path).where(WeddingItem.image_path.isnot(None))))
+
+
+def record(path: str, h: int | None):
+    """Store the hash of an image at path (relative to UPLOAD_ROOT); no commit."""
+    if h is None:
+        return
+    stmt = sqlite_insert(ImageHash).values(path=str(path), hash=_signed(h))
+    db.session.execute(stmt.on_conflict_do_update(index_elements=[ImageHash.path],
+                                                  set_={"hash": stmt.excluded.hash}))
+
+
+def policy() -> str:
+    value = (current_app.config.get("DUPLICATE_POLICY") or "off").lower()
+    return value if value in POLICIES else "off"
+
+
+def describe(paths) -> dict:
+    """{path: "a photo in trip 'Paris'" / "an image on the rings board"} for messages and reports."""
+    trip_ids = {int(p.split("/")[1]) for p in paths if p.startswith("travel/") and p.split("/")[1].isdigit()}
+    titles = dict(db.session.execute(select(Trip.id, Trip.title).where(Trip.id.in_(trip_ids))).all()) if trip_ids else {}
+    out = {}
+    for p in paths:
+        parts = p.split("/")
+        if parts[0] == "travel" and parts[1].isdigit():
+            out[p] = f"a photo in trip '{titles.get(int(parts[1]), parts[1])}'"
+        elif parts[0] == "wedding" and len(parts) > 2:
+            out[p] = f"an image on the {parts[1]} board"
+        else:
+            out[p] = p
+    return out
+
+
+def screen(hashes) -> list[str | None]:
+    """
+    For each hash (None = not an image), a description of the closest live
+    near-duplicate already in the library, or of an earlier entry in hashes,
+    else None. One tail query, plus one query when there are candidates.
+    """
+    radius = current_app.config["DUPLICATE_MAX_DISTANCE"]
+    hits = _index.search(hashes, radius)
+    candidates = {p for found in hits for _, p in found}
+    live = {}
+    if candidates:
+        live = dict(db.session.execute(
+            select(ImageHash.path, ImageHash.hash).where(ImageHash.path.in_(candidates), _referenced())).all())
+    names = describe(list(live))
+    out, seen = [], BKTree()
+    for h, found in zip(hashes, hits):
+        match = None
+        if h is not None:
+            close = sorted((distance(h, _unsigned(live[p])), p) for _, p in found if p in live)
+            if close and close[0][0] <= radius:
+                match = names[close[0][1]]
+            elif seen.search(h, radius):
+                match = IN_THIS_UPLOAD
+            seen.add(h, None)
+        out.append(match)
+    return out
+
+
+# ---------------- Whole library (manage.py dupes) ----------------
+def prune() -> int:
+    """Drop hashes of images no row references any more; no commit."""
+    return db.session.execute(delete(ImageHash).where(not_(_referenced()))).rowcount
+
+
+def _hashed(path_column):
+    return select(ImageHash.id).where(ImageHash.path == path_column).exists()
+
+
+def backfill(workers: int = 4) -> int:
+    """Hash referenced images that have no image_hash row yet (thumbnails where they exist); no commit."""
+    root = pathlib.Path(current_app.config["UPLOAD_ROOT"])
+    photos = db.session.execute(select(Photo.stored_path, Photo.thumb_path).where(~_hashed(Photo.stored_path))).all()
+    boards = db.session.execute(select(WeddingItem.image_path, WeddingItem.image_path)
+                                .where(WeddingItem.image_path.isnot(None), ~_hashed(WeddingItem.image_path))).all()
+    todo = [(path, root / (source or path)) for path, source in photos + boards]
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:   # Pillow releases the GIL while decoding
+        for i in range(0, len(todo), BACKFILL_CHUNK):
+            chunk = todo[i:i + BACKFILL_CHUNK]
+            for (path, _), h in zip(chunk, pool.map(hash_file, (src for _, src in chunk))):
+                if h is not None:
+                    record(path, h)
+                    done += 1
+    return done
+
+
+def clusters(radius: int) -> list[list[str]]:
+    """Groups of paths linked by near-duplicate pairs, biggest first."""
+    rows = db.session.execute(select(ImageHash.path, ImageHash.hash).order_by(ImageHash.id)).all()
+    tree = BKTree()
+    for i, (_, h) in enumerate(rows):
+        tree.add(_unsigned(h), i)
+    parent = list(range(len(rows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, (_, h) in enumerate(rows):
+        for _, j in tree.search(_unsigned(h), radius):
+            if j > i:
+                parent[find(j)] = find(i)
+    groups = {}
+    for i, (path, _) in enumerate(rows):
+        groups.setdefault(find(i), []).append(path)
+    return sorted((g for g in groups.values() if len(g) > 1), key=lambda g: (-len(g), g[0]))
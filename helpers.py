@@ -0,0 +1,134 @@
+import json
+from functools import wraps
+
+from flask import session, request, redirect, url_for, abort
+from collections import Counter
+
+import metrics
+from models import User, CommentReaction
+
+# ---------------- Auth/perm helpers ----------------
+def login_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not session.get("user_id"):
+            return redirect(url_for("main.login", next=request.path))
+        return fn(*args, **kwargs)
+    return wrapper
+
+def travel_edit_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        uid = session.get("user_id")
+        user = User.query.get(uid) if uid else None
+        if not user or not user.can_travel_edit:
+            abort(403)
+        return fn(*args, **kwargs)
+    return wrapper
+
+def admin_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        uid = session.get("user_id")
+        user = User.query.get(uid) if uid else None
+        if not user or not user.is_admin:
+            abort(403)
+        return fn(*args, **kwargs)
+    return wrapper
+
+def approve_users_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        uid = session.get("user_id")
+        user = User.query.get(uid) if uid else None
+        if not user or not user.can_approve_users:
+            abort(403)
+        return fn(*args, **kwargs)
+    return wrapper
+
+def parse_score(v):
+    if v is None or str(v).strip() == "":
+        return None
+    try:
+        n = int(v)
+        return max(0, min(10, n))
+    except ValueError:
+        return None
+
+def parse_coord(s):
+    try:
+        return float(s)
+    except Exception:
+        return None
+
+def valid_lat_lon(lat, lon):
+    if lat is None or lon is None:
+        return False
+    return -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0
+
+# --- Geocoding ---
+@metrics.timed("geocode")
+def geocode_address(addr: str, raise_errors: bool = False):
+    """(lat, lon) for an address, or (None, None) if not found. Network errors
+    are swallowed unless raise_errors (the background job wants to retry)."""
+    import urllib.parse, urllib.request  # only the travel write paths need this
+    try:
+        url = "https://nominatim.openstreetmap.org/search?" + urllib.parse.urlencode({
+            "format": "json", "q": addr, "limit": 1
+        })
+        req = urllib.request.Request(url, headers={"User-Agent": "TR-TravelLog/1.0"})
+        with urllib.request.urlopen(req, timeout=8) as resp:
+            data = json.loads(resp.read().decode("utf-8"))
+            if isinstance(data, list) and data:
+                return float(data[0]["lat"]), float(data[0]["lon"])
+    except Exception:
+        if raise_errors:
+            raise
+    return None, None
+
+# ---------- Reactions: helpers ----------
+def hydrate_comment_reactions(comments, user_id, kind: str):
+    """Attach likes/dislikes and current user's reaction to each comment."""
+    if not comments:
+        return
+    ids = [c.id for c in comments]
+    # all reactions for these comments
+    all_rows = (CommentReaction.query
+                .filter(CommentReaction.kind == kind,
+                        CommentReaction.comment_id.in_(ids))
+                .all())
+    counts = {}
+    for r in all_rows:
+        likes, dislikes = counts.get(r.comment_id, (0, 0))
+        if r.value == 1: likes += 1
+        elif r.value == -1: dislikes += 1
+        counts[r.comment_id] = (likes, dislikes)
+
+    mine_rows = []
+    if user_id:
+        mine_rows = (CommentReaction.query
+                     .filter(CommentReaction.kind == kind,
+                             CommentReaction.user_id == user_id,
+                             CommentReaction.comment_id.in_(ids))
+                     .all())
+    mine = {r.comment_id: ("like" if r.value == 1 else "dislike") for r in mine_rows}
+
+    for c in comments:
+        c.likes, c.dislikes = counts.get(c.id, (0, 0))
+        c.user_reaction = mine.get(c.id)
+
+def collect_tag_counts(query):
+    """
+    Given a SQLAlchemy query of Item rows, return a dict {tag: count}
+    Tags are read from the comma-separated Item.tags field.
+    """
+    counts = Counter()
+    for it in query:
+        if not it.tags:
+            continue
+        for raw in it.tags.split(','):
+            t = (raw or '').strip().lower()
+            if t:
+                counts[t] += 1
+    # return in alpha order (you can sort by count desc in the view if you prefer)
+    return dict(sorted(counts.items()))
@@ -0,0 +1,163 @@
+"""
+Streaming multipart ingestion for upload routes.
+
+Werkzeug's default form parsing spools every file part to a temp file, the
+save helpers then copy that into UPLOAD_ROOT, and thumbnailing opens the
+copy again. ``ingest_request()`` instead feeds ``request.stream`` through
+Werkzeug's sans-IO ``MultipartDecoder`` in 64 KB pieces and writes each
+file part once, to a staging dir on the same filesystem as UPLOAD_ROOT,
+hashing it (sha256) and keeping its first bytes for the magic-number sniff
+as it goes. Views then ``move_to()`` the parts they keep (a rename, no
+copy) and can hand ``open()`` (the still-open handle) to make_thumbnail.
+
+    with ingest_request() as ing:
+        title = ing.form.get("title")
+        for f in ing.files.getlist("photos"):
+            if f.looks_like_image():
+                f.move_to(dest)
+
+Whatever was not moved is deleted when the block exits. Memory use is one
+buffer plus the small text fields, whatever the size of the batch.
+"""
+import hashlib
+import os
+import pathlib
+import shutil
+import uuid
+
+from flask import current_app, request
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from werkzeug.utils import secure_filename
+
+from uploads import ALLOWED_EXTS, _looks_like_image, _looks_like_pdf
+
+STAGING_DIRNAME = ".staging"
+READ_SIZE = 64 * 1024
+HEAD_BYTES = 16
+MAX_FIELD_BYTES = 500 * 1024  # Werkzeug's default max_form_memory_size
+
+
+class IngestedFile:
+    def __init__(self, name: str, filename: str, mimetype: str, path: pathlib.Path):
+        self.name = name
+        self.raw_filename = filename
+        self.filename = secure_filename(filename or "")
+        self.ext = pathlib.Path(self.filename).suffix.lower()
+        self.mimetype = mimetype or ""
+        self.path = path
+        self.size = 0
+        self.head = b""
+        self._hash = hashlib.sha256()
+        self._fh = open(path, "w+b")
+
+    def _write(self, data: bytes):
+        if len(self.head) < HEAD_BYTES:
+            self.head += data[:HEAD_BYTES - len(self.head)]
+        self._hash.update(data)
+        self._fh.write(data)
+        self.size += len(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def safe_ext(self) -> str:
+        return self.ext if self.ext in ALLOWED_EXTS else ".bin"
+
+    def looks_like_image(self) -> bool:
+        return _looks_like_image(self.head, self.ext)
+
+    def looks_like_pdf(self) -> bool:
+        return _looks_like_pdf(self.head)
+
+    def open(self):
+        """The handle the part was written through, rewound; valid until the ingest closes."""
+        self._fh.flush()
+        self._fh.seek(0)
+        return self._fh
+
+    def move_to(self, dest: pathlib.Path) -> pathlib.Path:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        self._fh.flush()
+        os.replace(self.path, dest)  # same filesystem: a rename, the open handle stays valid
+        self.path = dest
+        return dest
+
+    def close(self):
+        self._fh.close()
+
+
+class Ingest:
+    def __init__(self, staging: pathlib.Path):
+        self.staging = staging
+        self.form = MultiDict()
+        self.files = MultiDict()
+        self._parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for f in self._parts:
+            f.close()
+        shutil.rmtree(self.staging, ignore_errors=True)
+        return False
+
+
+def staging_root() -> pathlib.Path:
+    return pathlib.Path(current_app.config["UPLOAD_ROOT"]) / STAGING_DIRNAME
+
+
+def ingest_request() -> Ingest:
+    """Parse the current multipart request from its raw stream (see module docstring)."""
+    boundary = request.mimetype_params.get("boundary", "").encode("latin-1")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        # nothing to stream (plain form post or JSON): behave like request.form
+        ing = Ingest(staging_root() / uuid.uuid4().hex)
+        ing.form = MultiDict(request.form)
+        return ing
+
+    ing = Ingest(staging_root() / uuid.uuid4().hex)
+    ing.staging.mkdir(parents=True)
+    try:
+        _parse(request.stream, boundary, ing)
+    except BaseException:
+        ing.__exit__(None, None, None)
+        raise
+    return ing
+
+
+def _parse(stream, boundary: bytes, ing: Ingest):
+    decoder = MultipartDecoder(boundary, max_form_memory_size=MAX_FIELD_BYTES,
+                               max_parts=current_app.config.get("MAX_FORM_PARTS") or 1000)
+    part, field_buf = None, None
+    while True:
+        data = stream.read(READ_SIZE)
+        decoder.receive_data(data or None)
+        event = decoder.next_event()
+        while not isinstance(event, (Epilogue, NeedData)):
+            if isinstance(event, Field):
+                part, field_buf = event, bytearray()
+            elif isinstance(event, File):
+                field_buf = None
+                part = IngestedFile(event.name, event.filename, event.headers.get("Content-Type"),
+                                    ing.staging / uuid.uuid4().hex)
+                ing._parts.append(part)
+            elif isinstance(event, Data):
+                if field_buf is not None:
+                    field_buf += event.data
+                    if len(field_buf) > MAX_FIELD_BYTES:
+                        raise RequestEntityTooLarge()
+                    if not event.more_data:
+                        ing.form.add(part.name, field_buf.decode("utf-8", "replace"))
+                else:
+                    part._write(event.data)
+                    if not event.more_data:
+                        if part.raw_filename:  # an empty <input type=file> still sends a part
+                            ing.files.add(part.name, part)
+            event = decoder.next_event()
+        if not data or isinstance(event, Epilogue):
+            return
@@ -0,0 +1,311 @@
+"""
+Durable background jobs on the app's own SQLite database.
+
+Handlers register with ``@handler("kind")`` and receive the JSON payload.
+They run inside an app context, use ``db.session`` like a view would and
+must not commit themselves; the caller (worker or request) commits.
+
+Request code calls ``enqueue(kind, payload, dedupe_key=...)``. The job row
+is written in the request's transaction, so it only exists if the request's
+own writes commit, and records the logged-in user so ``/api/jobs`` can show
+people only their own jobs. With JOBS_INLINE on (the default, for setups without a
+worker) nothing is written: the job is held on the session and, once that
+transaction commits, runs at the end of the request, each job in its own
+short transaction. Slow handlers (geocoding, resizes) therefore never run
+while the request holds the SQLite write lock, and a rolled-back request
+runs none of its jobs.
+
+``manage.py worker`` runs ``Worker``: N threads that each claim one job at a
+time with a single ``UPDATE ... RETURNING`` statement (atomic in SQLite),
+run it, and either mark it done or put it back with exponential backoff
+until ``max_attempts``. Jobs whose lease expired (worker died mid-job) are
+put back on the queue.
+"""
+import json
+import logging
+import os
+import pathlib
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app, has_request_context, session
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+import dupes
+import storage
+from helpers import geocode_address
+from models import db, Job, Photo, Item, Trip
+from uploads import make_thumbnail
+
+log = logging.getLogger("jobs")
+
+HANDLERS = {}
+_installed = False
+
+
+def handler(kind: str):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind: str, payload: dict, dedupe_key: str | None = None,
+            delay: float = 0, max_attempts: int | None = None) -> int | None:
+    """
+    Queue a job (in the current session's transaction) and return its id.
+    An active job with the same dedupe_key is reused instead. In inline mode
+    the job waits for the commit (see run_inline) and None is returned.
+    """
+    if kind not in HANDLERS:
+        raise KeyError(f"no job handler registered for {kind!r}")
+    if current_app.config["JOBS_INLINE"]:
+        pending = db.session.info.setdefault("inline_jobs", {})
+        pending[dedupe_key or (kind, len(pending))] = (kind, payload)
+        return None
+
+    now = datetime.utcnow()
+    res = db.session.execute(text(
+        "INSERT OR IGNORE INTO job (kind, payload, status, attempts, max_attempts, run_after,"
+        " dedupe_key, created_by_user_id, created_at, updated_at)"
+        " VALUES (:kind, :payload, 'queued', 0, :max_attempts, :run_after, :dedupe_key, :user_id, :now, :now)"
+    ), dict(kind=kind, payload=json.dumps(payload), dedupe_key=dedupe_key, now=now,
+            user_id=session.get("user_id") if has_request_context() else None,
+            run_after=now + timedelta(seconds=delay),
+            max_attempts=max_attempts or current_app.config["JOBS_MAX_ATTEMPTS"]))
+    if res.rowcount:
+        return res.lastrowid
+    # an active job with this dedupe key already exists
+    return db.session.execute(text(
+        "SELECT id FROM job WHERE dedupe_key = :k AND status IN ('queued', 'running')"
+    ), {"k": dedupe_key}).scalar()
+
+
+# ---------------- Inline mode ----------------
+def _after_commit(session):
+    # the committed transaction's jobs become runnable; nothing may touch the DB in this hook
+    pending = session.info.pop("inline_jobs", None)
+    if pending:
+        session.info.setdefault("inline_ready", []).extend(pending.values())
+
+
+def _after_rollback(session):
+    session.info.pop("inline_jobs", None)
+
+
+def install():
+    global _installed
+    if not _installed:
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
+        _installed = True
+
+
+def run_inline() -> int:
+    """
+    Run the inline jobs whose transaction has committed, each committed on
+    its own; failures are logged and dropped (the upload itself still
+    counts). create_app() calls this when every request ends.
+    """
+    done = 0
+    while db.session.info.get("inline_ready"):
+        kind, payload = db.session.info["inline_ready"].pop(0)
+        try:
+            HANDLERS[kind](payload)
+            db.session.commit()
+            done += 1
+        except Exception:
+            db.session.rollback()
+            log.exception("inline job %s failed", kind)
+    return done
+
+
+def job_status(ids, user_id: int | None = None) -> list[dict]:
+    """Status dicts for the jobs in ids; with user_id, only the ones that user enqueued."""
+    q = Job.query.filter(Job.id.in_(list(ids)))
+    if user_id is not None:
+        q = q.filter(Job.created_by_user_id == user_id)
+    rows = q.all()
+    return [{
+        "id": j.id, "kind": j.kind, "status": j.status, "attempts": j.attempts,
+        "max_attempts": j.max_attempts,
+        # first line only; the traceback stays in the table for whoever runs the worker
+        "error": (j.last_error or "").splitlines()[0] if j.last_error and j.status != "done" else None,
+        "result": j.result, "updated_at": j.updated_at.isoformat() if j.updated_at else None,
+    } for j in rows]
+
+
+def backoff_seconds(attempts: int, base: float, cap: float) -> float:
+    # exponential with +/-20% jitter so a burst of failures doesn't retry in lockstep
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class Worker:
+    def __init__(self, app, concurrency: int = 2, poll: float = 1.0):
+        self.app = app
+        self.concurrency = max(1, concurrency)
+        self.poll = poll
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop = threading.Event()
+
+    # ---- queue operations (each its own short transaction) ----
+    def claim(self):
+        now = datetime.utcnow()
+        row = db.session.execute(text(
+            "UPDATE job SET status = 'running', attempts = attempts + 1,"
+            " locked_by = :me, locked_at = :now, updated_at = :now"
+            " WHERE id = (SELECT id FROM job WHERE status = 'queued' AND run_after <= :now"
+            "             ORDER BY run_after, id LIMIT 1)"
+            " RETURNING id, kind, payload, attempts, max_attempts"
+        ), {"me": self.name, "now": now}).fetchone()
+        db.session.commit()
+        return row
+
+    def requeue_expired(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config["JOBS_LEASE_SECONDS"])
+        res = db.session.execute(text(
+            "UPDATE job SET status = 'queued', locked_by = NULL, updated_at = :now"
+            " WHERE status = 'running' AND locked_at < :cutoff"
+        ), {"now": datetime.utcnow(), "cutoff": cutoff})
+        db.session.commit()
+        return res.rowcount
+
+    def _finish(self, job_id, status, error=None, result=None, run_after=None):
+        db.session.execute(text(
+            "UPDATE job SET status = :status, last_error = :error, result = :result,"
+            " run_after = COALESCE(:run_after, run_after), locked_by = NULL, updated_at = :now"
+            " WHERE id = :id"
+        ), dict(id=job_id, status=status, error=error, run_after=run_after, now=datetime.utcnow(),
+                result=json.dumps(result) if result is not None else None))
+        db.session.commit()
+
+    def run_one(self) -> bool:
+        """Claim and run a single job. Returns False when the queue is empty."""
+        row = self.claim()
+        if row is None:
+            return False
+        job_id, kind, payload, attempts, max_attempts = row
+        fn = HANDLERS.get(kind)
+        try:
+            if fn is None:
+                raise KeyError(f"no handler for {kind!r}")
+            result = fn(json.loads(payload) if isinstance(payload, str) else payload)
+            db.session.commit()
+            self._finish(job_id, "done", result=result)
+        except Exception as e:
+            db.session.rollback()
+            err = f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}"
+            if attempts >= max_attempts:
+                log.error("job %s (%s) failed permanently: %s", job_id, kind, e)
+                self._finish(job_id, "failed", error=err)
+            else:
+                delay = backoff_seconds(attempts, self.app.config["JOBS_BACKOFF_BASE"],
+                                        self.app.config["JOBS_BACKOFF_MAX"])
+                log.warning("job %s (%s) attempt %s failed, retry in %.0fs: %s", job_id, kind, attempts, delay, e)
+                self._finish(job_id, "queued", error=err,
+                             run_after=datetime.utcnow() + timedelta(seconds=delay))
+        return True
+
+    # ---- loops ----
+    def _loop(self):
+        with self.app.app_context():
+            while not self.stop.is_set():
+                try:
+                    busy = self.run_one()
+                except Exception:
+                    log.exception("worker loop error")
+                    db.session.rollback()
+                    busy = False
+                if not busy:
+                    self.stop.wait(self.poll)
+            db.session.remove()
+
+    def run(self, once: bool = False) -> int:
+        """Process jobs until stopped (or, with once=True, until the queue is empty)."""
+        with self.app.app_context():
+            n = self.requeue_expired()
+            if n:
+                log.info("requeued %s job(s) with expired leases", n)
+            if once:
+                done = 0
+                while self.run_one():
+                    done += 1
+                return done
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: self.stop.set())
+        threads = [threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                   for i in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        last_sweep = time.monotonic()
+        while not self.stop.is_set():
+            self.stop.wait(1.0)
+            if time.monotonic() - last_sweep > 60:
+                with self.app.app_context():
+                    self.requeue_expired()
+                last_sweep = time.monotonic()
+        for t in threads:
+            t.join()
+        return 0
+
+
+# ---------------- Handlers ----------------
+def _thumb(src_rel: str, thumb_rel: str) -> int:
+    root = pathlib.Path(current_app.config["UPLOAD_ROOT"])
+    before = storage.sizes(thumb_rel)  # a re-run or new cover overwrites the old thumb
+    h = make_thumbnail(root / src_rel, root / thumb_rel,
+                       current_app.config["THUMB_MAX_PX"], current_app.config["THUMB_QUALITY"])
+    storage.record(thumb_rel, before=before)
+    return h
+
+
+@handler("photo.thumb")
+def photo_thumb(payload):
+    photo = db.session.get(Photo, payload["photo_id"])
+    if photo is None:
+        return {"skipped": "photo deleted"}
+    src = pathlib.PurePosixPath(photo.stored_path)
+    rel_thumb = str(src.parent / "thumbs" / f"{src.stem}.jpg")
+    try:
+        h = _thumb(photo.stored_path, rel_thumb)
+    except Exception:
+        path = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / photo.stored_path
+        if not path.exists() or dupes.hash_file(path) is not None:
+            raise  # something else went wrong; worth a retry
+        # no attempt will ever thumbnail this file: drop it rather than show a broken image
+        storage.adjust({storage.owner(photo.stored_path): (-1, -path.stat().st_size)})
+        db.session.delete(photo)
+        path.unlink()
+        return {"skipped": "not a readable image"}
+    dupes.record(photo.stored_path, h)
+    photo.thumb_path = rel_thumb
+    return {"thumb_path": rel_thumb}
+
+
+@handler("item.cover_thumb")
+def item_cover_thumb(payload):
+    item = db.session.get(Item, payload["item_id"])
+    if item is None or not item.cover_path:
+        return {"skipped": "no cover"}
+    rel_thumb = str(pathlib.PurePosixPath("tracker") / str(item.id) / "thumbs" / "cover.jpg")
+    _thumb(item.cover_path, rel_thumb)
+    item.cover_thumb_path = rel_thumb
+    return {"thumb_path": rel_thumb}
+
+
+@handler("trip.geocode")
+def trip_geocode(payload):
+    trip = db.session.get(Trip, payload["trip_id"])
+    if trip is None or trip.address != payload["address"]:
+        return {"skipped": "trip deleted or address changed"}
+    lat, lon = geocode_address(trip.address, raise_errors=True)
+    trip.lat, trip.lon = lat, lon
+    return {"lat": lat, "lon": lon}
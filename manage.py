@@ -1,16 +1,45 @@
 #!/usr/bin/env python3
+import pathlib
 import sys
 from getpass import getpass
 from werkzeug.security import generate_password_hash
-from app import app, db, User
+from app import create_app, ensure_schema
+from models import db, User
+import backup
+import dupes
+import ingest
+import jobs
+from blueprints import resumable
+import migrations
+import search
+import sqlite_tuning
+import storage
+import upload_gc
+import workouts
+
+app = create_app()
 
 USAGE = """Usage:
   manage.py create <username>
   manage.py set-password <username>
   manage.py travel_edit <username> on|off
+  manage.py migrate [status]
+  manage.py db-maintenance          (cron: checkpoint WAL + PRAGMA optimize)
+  manage.py cleanup-uploads         (cron: remove abandoned resumable/staged uploads)
+  manage.py worker [--concurrency N] [--once]   (run background jobs; --once drains and exits)
+  manage.py backup [--no-prune]     (cron: online DB copy + incremental uploads snapshot, then rotation)
+  manage.py backup list
+  manage.py backup verify [<snapshot>] [--deep]
+  manage.py restore <snapshot> [--db-only | --uploads-only] --yes   (stop the app first)
+  manage.py gc-uploads [--quarantine] [--grace HOURS]   (report / set aside files no row references)
+  manage.py storage-reconcile [--workers N]   (recount upload disk usage from disk)
+  manage.py fitness-rollups         (recompute workout day/week/month rollups from sessions)
+  manage.py dupes [--distance N] [--workers N]   (report near-duplicate trip photos / board images)
+  manage.py reindex-search          (rebuild the site-wide search index from the tables)
 """
 
 def create_user(username: str) -> int:
+    ensure_schema(app)
     with app.app_context():
         if User.query.filter_by(username=username).first():
             print("User already exists.")
@@ -23,6 +52,7 @@ def create_user(username: str) -> int:
         print(f"Created user '{username}'"); return 0
 
 def set_password(username: str) -> int:
+    ensure_schema(app)
     with app.app_context():
         u = User.query.filter_by(username=username).first()
         if not u: print("User not found."); return 1
@@ -32,6 +62,7 @@ def set_password(username: str) -> int:
         print("Password updated."); return 0
 
 def travel_edit(username: str, onoff: str) -> int:
+    ensure_schema(app)
     with app.app_context():
         u = User.query.filter_by(username=username).first()
         if not u: print("User not found."); return 1
@@ -40,10 +71,228 @@ def travel_edit(username: str, onoff: str) -> int:
         print(f"can_travel_edit for '{username}': {u.can_travel_edit}")
         return 0
 
+def migrate(status_only: bool = False) -> int:
+    with app.app_context():
+        todo = migrations.pending(db.engine)
+        if status_only:
+            print(f"Latest version: {migrations.latest_version()}")
+            for v, desc in todo:
+                print(f"  pending {v}: {desc}")
+            if not todo: print("Schema is up to date.")
+            return 0
+        if not todo:
+            print("Schema is up to date."); return 0
+        applied = migrations.upgrade(db.engine, db.metadata)
+        print(f"Applied {len(applied)} migration(s)."); return 0
+
+def db_maintenance() -> int:
+    with app.app_context():
+        res = sqlite_tuning.maintenance(db.engine)
+        print(f"WAL checkpoint: {res['checkpointed']}/{res['log_frames']} frames"
+              + (" (busy, retry later)" if res["busy"] else "") + "; optimize done.")
+        return 0
+
+def cleanup_uploads() -> int:
+    with app.app_context():
+        ttl = app.config["RESUMABLE_TTL_HOURS"] * 3600
+        removed, freed = resumable.cleanup_expired(resumable._partial_root(), ttl)
+        # staging dirs are normally gone when the request ends; these are from killed workers
+        r2, f2 = resumable.cleanup_expired(ingest.staging_root(), 3600)
+        removed, freed = removed + r2, freed + f2
+    print(f"Removed {removed} abandoned upload(s), {freed / 1e6:.1f} MB."); return 0
+
+def worker(args) -> int:
+    ensure_schema(app)
+    concurrency, once = 2, False
+    while args:
+        a = args.pop(0)
+        if a == "--once":
+            once = True
+        elif a == "--concurrency" and args and args[0].isdigit():
+            concurrency = int(args.pop(0))
+        else:
+            print(USAGE); return 1
+    w = jobs.Worker(app, concurrency=concurrency)
+    if once:
+        print(f"Ran {w.run(once=True)} job(s)."); return 0
+    print(f"Worker {w.name} running with {concurrency} thread(s); Ctrl-C to stop.")
+    return w.run()
+
+def _db_path() -> str:
+    with app.app_context():
+        return db.engine.url.database
+
+def _snapshot(name):
+    snaps = backup.snapshots(app.config["BACKUP_ROOT"])
+    if name is None:
+        return snaps[-1] if snaps else None
+    return next((s for s in snaps if s.name == name), None)
+
+def backup_cmd(args) -> int:
+    root = app.config["BACKUP_ROOT"]
+    if args[:1] == ["list"]:
+        for s in backup.snapshots(root):
+            m = backup.load_manifest(s)
+            up = m["uploads"]
+            print(f"{s.name}  db {m['db']['size'] / 1e6:.1f} MB  uploads {up['files']} files "
+                  f"{up['bytes'] / 1e6:.1f} MB ({up['copied_bytes'] / 1e6:.1f} MB new)  {m['seconds']}s")
+        return 0
+    if args[:1] == ["verify"]:
+        rest = [a for a in args[1:] if a != "--deep"]
+        snap = _snapshot(rest[0] if rest else None)
+        if snap is None:
+            print("No such snapshot."); return 1
+        problems = backup.verify(snap, deep="--deep" in args)
+        for p in problems[:50]:
+            print(f"  {p}")
+        print(f"{snap.name}: " + ("OK" if not problems else f"{len(problems)} problem(s)"))
+        return 1 if problems else 0
+    if args not in ([], ["--no-prune"]):
+        print(USAGE); return 1
+    snap = backup.create(root, _db_path(), app.config["UPLOAD_ROOT"], app.config["BACKUP_PAGES_PER_STEP"])
+    print(f"Snapshot {snap.name} written to {root}.")
+    if not args:
+        backup.prune(root, app.config["BACKUP_KEEP_DAILY"], app.config["BACKUP_KEEP_WEEKLY"],
+                     app.config["BACKUP_KEEP_MONTHLY"])
+    return 0
+
+def restore_cmd(args) -> int:
+    flags = {a for a in args if a.startswith("--")}
+    names = [a for a in args if not a.startswith("--")]
+    if len(names) != 1 or not flags <= {"--db-only", "--uploads-only", "--yes"} or {"--db-only", "--uploads-only"} <= flags:
+        print(USAGE); return 1
+    snap = _snapshot(names[0])
+    if snap is None:
+        print("No such snapshot."); return 1
+    problems = backup.verify(snap)
+    if problems:
+        print(f"{snap.name} failed verification ({problems[0]}); not restoring."); return 1
+    with_db, with_uploads = "--uploads-only" not in flags, "--db-only" not in flags
+    if "--yes" not in flags:
+        print(f"Would restore {'the database' if with_db else ''}{' and ' if with_db and with_uploads else ''}"
+              f"{'uploads' if with_uploads else ''} from {snap.name}. Stop the app, then re-run with --yes.")
+        return 1
+    backup.restore(snap, _db_path(), app.config["UPLOAD_ROOT"], with_db=with_db, with_uploads=with_uploads)
+    return 0
+
+def gc_uploads(args) -> int:
+    quarantine, grace = False, app.config["GC_GRACE_HOURS"]
+    while args:
+        a = args.pop(0)
+        if a == "--quarantine":
+            quarantine = True
+        elif a == "--grace" and args:
+            try:
+                grace = float(args.pop(0))
+            except ValueError:
+                print(USAGE); return 1
+        else:
+            print(USAGE); return 1
+    root = pathlib.Path(app.config["UPLOAD_ROOT"]).resolve()
+    skip = []
+    backup_root = pathlib.Path(app.config["BACKUP_ROOT"]).resolve()
+    if root in backup_root.parents:  # snapshots kept inside the upload tree are not uploads
+        skip.append(backup_root.relative_to(root).as_posix())
+    with app.app_context():
+        res = upload_gc.collect(root, grace, quarantine=quarantine, skip_prefixes=skip)
+        purged = upload_gc.purge_quarantine(root, app.config["GC_QUARANTINE_DAYS"]) if quarantine else (0, 0)
+    for area, (n, size) in sorted(res["areas"].items(), key=lambda kv: -kv[1][1]):
+        print(f"  {area:<30} {n:>7} files {size / 1e6:>10.1f} MB")
+    for rel in res["sample"]:
+        print(f"    {rel}")
+    print(f"{res['orphans']} unreferenced file(s) older than {grace:g}h, {res['bytes'] / 1e6:.1f} MB "
+          f"({res['references']} stored paths checked).")
+    if quarantine:
+        print(f"Moved {res['moved']} file(s) to {res['quarantine']}; reclaimed {res['bytes'] / 1e6:.1f} MB "
+              f"from the live tree (deleted after {app.config['GC_QUARANTINE_DAYS']:g} days).")
+        if purged[0]:
+            print(f"Deleted {purged[0]} old quarantine run(s), {purged[1] / 1e6:.1f} MB freed.")
+    elif res["orphans"]:
+        print("Report only; re-run with --quarantine to move them aside.")
+    return 0
+
+def storage_reconcile(args) -> int:
+    workers = app.config["STORAGE_RECONCILE_WORKERS"]
+    if args[:1] == ["--workers"] and len(args) == 2 and args[1].isdigit():
+        workers = int(args[1])
+    elif args:
+        print(USAGE); return 1
+    ensure_schema(app)
+    with app.app_context():
+        res = storage.reconcile(app.config["UPLOAD_ROOT"], workers)
+    print(f"{res['files']} files, {res['bytes'] / 1e6:.1f} MB in {res['entities']} entries "
+          f"(counters had {res['previous_bytes'] / 1e6:.1f} MB; {res['drifted']} entries corrected).")
+    return 0
+
+def fitness_rollups() -> int:
+    ensure_schema(app)
+    with app.app_context():
+        rows = workouts.rebuild()
+        db.session.commit()
+    print(f"Rebuilt {rows} rollup row(s)."); return 0
+
+def dupes_cmd(args) -> int:
+    radius, workers = app.config["DUPLICATE_MAX_DISTANCE"], app.config["THUMB_WORKERS"]
+    while args:
+        a = args.pop(0)
+        if a in ("--distance", "--workers") and args and args[0].isdigit():
+            n = int(args.pop(0))
+            if a == "--distance": radius = n
+            else: workers = n
+        else:
+            print(USAGE); return 1
+    ensure_schema(app)
+    with app.app_context():
+        pruned = dupes.prune()
+        hashed = dupes.backfill(workers)
+        db.session.commit()
+        groups = dupes.clusters(radius)
+        names = dupes.describe([p for g in groups for p in g])
+    if pruned or hashed:
+        print(f"Hashed {hashed} image(s) uploaded earlier; dropped {pruned} hash(es) of deleted images.")
+    for i, g in enumerate(groups, 1):
+        print(f"#{i}: {len(g)} images")
+        for p in g:
+            print(f"    {p}  ({names[p]})")
+    extra = sum(len(g) - 1 for g in groups)
+    print(f"{len(groups)} group(s) of near-duplicates within distance {radius}; {extra} image(s) could go.")
+    return 0
+
+def reindex_search() -> int:
+    ensure_schema(app)
+    with app.app_context():
+        counts = search.rebuild(db.session.connection())
+        db.session.commit()
+    print("Indexed " + ", ".join(f"{n} {kind}" for kind, n in counts.items()) + "."); return 0
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
+    if len(sys.argv) < 2:
         print(USAGE); sys.exit(1)
     cmd = sys.argv[1]
+    if cmd == "migrate" and len(sys.argv) == 2:
+        sys.exit(migrate())
+    if cmd == "migrate" and len(sys.argv) == 3 and sys.argv[2] == "status":
+        sys.exit(migrate(status_only=True))
+    if cmd == "db-maintenance" and len(sys.argv) == 2:
+        sys.exit(db_maintenance())
+    if cmd == "cleanup-uploads" and len(sys.argv) == 2:
+        sys.exit(cleanup_uploads())
+    if cmd == "worker":
+        sys.exit(worker(sys.argv[2:]))
+    if cmd == "backup":
+        sys.exit(backup_cmd(sys.argv[2:]))
+    if cmd == "restore":
+        sys.exit(restore_cmd(sys.argv[2:]))
+    if cmd == "gc-uploads":
+        sys.exit(gc_uploads(sys.argv[2:]))
+    if cmd == "reindex-search" and len(sys.argv) == 2:
+        sys.exit(reindex_search())
+    if cmd == "dupes":
+        sys.exit(dupes_cmd(sys.argv[2:]))
+    if cmd == "fitness-rollups" and len(sys.argv) == 2:
+        sys.exit(fitness_rollups())
+    if cmd == "storage-reconcile":
+        sys.exit(storage_reconcile(sys.argv[2:]))
     if cmd == "create" and len(sys.argv) == 3:
         sys.exit(create_user(sys.argv[2]))
     if cmd == "set-password" and len(sys.argv) == 3:
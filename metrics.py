@@ -0,0 +1,375 @@
+"""
+Request timing, SQL accounting and Prometheus exposition.
+
+Per request we keep a small RequestStats on ``flask.g``: wall time, number
+of SQL statements and time spent in them (from SQLAlchemy cursor events),
+plus any named sections timed with ``timed("thumbnail")``. When the
+response goes out the numbers are folded into a process-wide Registry:
+
+  app_requests_total{endpoint,method,status}
+  app_request_duration_seconds{endpoint,method}      histogram
+  app_request_sql_queries{endpoint}                  histogram (N+1 shows up here)
+  app_sql_queries_total / app_sql_seconds_total{endpoint}
+  app_response_bytes_total{endpoint}
+  app_section_duration_seconds{section}              histogram
+
+Each gunicorn worker has its own Registry. Set METRICS_DIR to a shared
+directory and workers periodically write a snapshot there; ``/metrics``
+then merges the snapshots of all live workers so one scrape sees them all.
+
+In debug mode every response also carries a ``Server-Timing`` header.
+
+``count_queries()`` and ``query_budget(n)`` count statements on the current
+thread outside of the request bookkeeping; the latter guards views against
+N+1 regressions, and tests/test_query_counts.py pins the former per view.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import ContextDecorator, contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+HISTOGRAMS = {
+    "app_request_duration_seconds": LATENCY_BUCKETS,
+    "app_request_sql_queries": QUERY_BUCKETS,
+    "app_section_duration_seconds": LATENCY_BUCKETS,
+    "app_admission_wait_seconds": LATENCY_BUCKETS,
+}
+
+HELP = {
+    "app_requests_total": ("counter", "Requests handled"),
+    "app_request_duration_seconds": ("histogram", "Request wall time"),
+    "app_request_sql_queries": ("histogram", "SQL statements issued per request"),
+    "app_sql_queries_total": ("counter", "SQL statements issued"),
+    "app_sql_seconds_total": ("counter", "Time spent executing SQL"),
+    "app_response_bytes_total": ("counter", "Response body bytes sent"),
+    "app_section_duration_seconds": ("histogram", "Time spent in instrumented sections"),
+    "app_query_budget_exceeded_total": ("counter", "Requests that ran more SQL than their query_budget"),
+    "app_admission_waiting": ("gauge", "Heavy requests waiting for an admission slot"),
+    "app_admission_inflight": ("gauge", "Heavy requests holding an admission slot"),
+    "app_admission_rejected_total": ("counter", "Heavy requests turned away with 503"),
+    "app_admission_wait_seconds": ("histogram", "Time heavy requests waited for a slot"),
+}
+
+SNAPSHOT_EVERY_S = 5.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}   # (name, labels) -> float
+        self.gauges = {}     # (name, labels) -> float
+        self.hists = {}      # (name, labels) -> [bucket counts..., sum, count]
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def inc(self, name, labels=None, value=1.0):
+        k = self._key(name, labels)
+        with self._lock:
+            self.counters[k] = self.counters.get(k, 0.0) + value
+
+    def set_gauge(self, name, labels=None, value=0.0):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = float(value)
+
+    def add_gauge(self, name, labels=None, delta=1.0):
+        k = self._key(name, labels)
+        with self._lock:
+            self.gauges[k] = self.gauges.get(k, 0.0) + delta
+
+    def observe(self, name, labels=None, value=0.0):
+        buckets = HISTOGRAMS[name]
+        k = self._key(name, labels)
+        with self._lock:
+            h = self.hists.get(k)
+            if h is None:
+                h = self.hists[k] = [0] * len(buckets) + [0.0, 0]
+            for i, upper in enumerate(buckets):
+                if value <= upper:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "gauges": [[n, list(l), v] for (n, l), v in self.gauges.items()],
+                "hists": [[n, list(l), list(h)] for (n, l), h in self.hists.items()],
+            }
+
+
+REGISTRY = Registry()
+
+
+def merge(snapshots) -> dict:
+    counters, gauges, hists = {}, {}, {}
+    for snap in snapshots:
+        for n, l, v in snap["counters"]:
+            k = (n, tuple(map(tuple, l)))
+            counters[k] = counters.get(k, 0.0) + v
+        for n, l, v in snap["gauges"]:
+            k = (n, tuple(map(tuple, l)))
+            gauges[k] = gauges.get(k, 0.0) + v
+        for n, l, h in snap["hists"]:
+            k = (n, tuple(map(tuple, l)))
+            cur = hists.get(k)
+            hists[k] = list(h) if cur is None else [a + b for a, b in zip(cur, h)]
+    return {"counters": counters, "gauges": gauges, "hists": hists}
+
+
+def _fmt_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def render(merged) -> str:
+    """Prometheus text exposition format 0.0.4."""
+    out, seen = [], set()
+
+    def header(name, fallback_type):
+        if name in seen:
+            return
+        seen.add(name)
+        kind, text = HELP.get(name, (fallback_type, name))
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), v in sorted(merged["counters"].items()):
+        header(name, "counter")
+        out.append(f"{name}{_fmt_labels(labels)} {v:g}")
+    for (name, labels), v in sorted(merged["gauges"].items()):
+        header(name, "gauge")
+        out.append(f"{name}{_fmt_labels(labels)} {v:g}")
+    for (name, labels), h in sorted(merged["hists"].items()):
+        header(name, "histogram")
+        for upper, n in zip(HISTOGRAMS[name], h):
+            out.append(f"{name}_bucket{_fmt_labels(labels, ('le', f'{upper:g}'))} {n}")
+        out.append(f"{name}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {h[-1]}")
+        out.append(f"{name}_sum{_fmt_labels(labels)} {h[-2]:g}")
+        out.append(f"{name}_count{_fmt_labels(labels)} {h[-1]}")
+    return "\n".join(out) + "\n"
+
+
+# ---------------- Per-request stats ----------------
+class RequestStats:
+    __slots__ = ("started", "queries", "sql_seconds", "sections")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.sections = {}   # name -> seconds
+
+
+def current_stats():
+    return getattr(g, "_metrics", None) if has_request_context() else None
+
+
+def _record_section(section: str, seconds: float):
+    REGISTRY.observe("app_section_duration_seconds", {"section": section}, seconds)
+    st = current_stats()
+    if st is not None:
+        st.sections[section] = st.sections.get(section, 0.0) + seconds
+
+
+@contextmanager
+def timed_block(section: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_section(section, time.perf_counter() - t0)
+
+
+def timed(section: str):
+    """Decorator: time every call of the function under ``section``."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed_block(section):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---------------- Query counting / budgets ----------------
+_local = threading.local()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+
+def _active_counters():
+    stack = getattr(_local, "counters", None)
+    if stack is None:
+        stack = _local.counters = []
+    return stack
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed on this thread inside the block."""
+    counter = QueryCounter()
+    stack = _active_counters()
+    stack.append(counter)
+    try:
+        yield counter
+    finally:
+        stack.remove(counter)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget(ContextDecorator):
+    """
+    Context manager / decorator that fails when more than ``max_queries``
+    statements run inside it. On views it raises when QUERY_BUDGET_STRICT
+    is on (debug/testing by default) and otherwise logs and counts the
+    overrun in app_query_budget_exceeded_total.
+    """
+
+    def __init__(self, max_queries: int, name: str | None = None):
+        self.max_queries = max_queries
+        self.name = name
+        self._tls = threading.local()   # one instance decorates a view used by many threads
+
+    def __enter__(self):
+        cm = count_queries()
+        stack = self._tls.__dict__.setdefault("stack", [])
+        stack.append((cm, cm.__enter__()))
+        return stack[-1][1]
+
+    def __exit__(self, exc_type, exc, tb):
+        cm, counter = self._tls.stack.pop()
+        cm.__exit__(exc_type, exc, tb)
+        if exc_type is not None or counter.count <= self.max_queries:
+            return False
+        where = self.name or (request.endpoint if has_request_context() else "block")
+        msg = (f"{where} ran {counter.count} SQL statements (budget {self.max_queries}):\n  "
+               + "\n  ".join(counter.statements))
+        strict = True
+        if has_app_context():
+            cfg = current_app.config
+            strict = cfg.get("QUERY_BUDGET_STRICT")
+            if strict is None:
+                strict = bool(current_app.debug or cfg.get("TESTING"))
+        if strict:
+            raise QueryBudgetExceeded(msg)
+        REGISTRY.inc("app_query_budget_exceeded_total", {"endpoint": where})
+        current_app.logger.warning(msg)
+        return False
+
+
+# ---------------- Wiring ----------------
+def install_sql_events(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("_metrics_t0")
+        elapsed = time.perf_counter() - stack.pop() if stack else 0.0
+        st = current_stats()
+        if st is not None:
+            st.queries += 1
+            st.sql_seconds += elapsed
+        for counter in getattr(_local, "counters", ()):
+            counter.count += 1
+            counter.statements.append(" ".join(statement.split())[:200])
+
+
+class _Snapshotter:
+    def __init__(self, directory):
+        self.directory = directory
+        self.last = 0.0
+
+    def maybe_write(self, force=False):
+        now = time.monotonic()
+        if not self.directory or (not force and now - self.last < SNAPSHOT_EVERY_S):
+            return
+        self.last = now
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(REGISTRY.snapshot(), f)
+        os.replace(tmp, path)
+
+    def collect(self):
+        if not self.directory:
+            return merge([REGISTRY.snapshot()])
+        self.maybe_write(force=True)
+        snaps = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                pid = int(entry.name[:-5])
+                os.kill(pid, 0)
+            except (ValueError, ProcessLookupError, PermissionError):
+                # worker is gone; its counters restarted with its replacement
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(entry.path) as f:
+                    snaps.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return merge(snaps)
+
+
+def init_app(app, engine):
+    install_sql_events(engine)
+    snapshotter = _Snapshotter(app.config.get("METRICS_DIR"))
+    app.extensions["metrics"] = snapshotter
+
+    @app.before_request
+    def _start():
+        g._metrics = RequestStats()
+
+    @app.after_request
+    def _finish(resp):
+        st = getattr(g, "_metrics", None)
+        if st is None:
+            return resp
+        endpoint = request.endpoint or "unmatched"
+        elapsed = time.perf_counter() - st.started
+        REGISTRY.inc("app_requests_total", {"endpoint": endpoint, "method": request.method,
+                                            "status": str(resp.status_code)})
+        REGISTRY.observe("app_request_duration_seconds", {"endpoint": endpoint, "method": request.method}, elapsed)
+        REGISTRY.observe("app_request_sql_queries", {"endpoint": endpoint}, st.queries)
+        REGISTRY.inc("app_sql_queries_total", {"endpoint": endpoint}, st.queries)
+        REGISTRY.inc("app_sql_seconds_total", {"endpoint": endpoint}, st.sql_seconds)
+        if resp.content_length is not None:
+            REGISTRY.inc("app_response_bytes_total", {"endpoint": endpoint}, resp.content_length)
+
+        if app.debug:
+            parts = [f'app;dur={elapsed * 1000:.1f}',
+                     f'db;dur={st.sql_seconds * 1000:.1f};desc="{st.queries} queries"']
+            parts += [f"{name};dur={secs * 1000:.1f}" for name, secs in st.sections.items()]
+            resp.headers["Server-Timing"] = ", ".join(parts)
+
+        snapshotter.maybe_write()
+        return resp
@@ -0,0 +1,269 @@
+"""
+Versioned schema migrations.
+
+Every database carries a ``schema_version`` table with one row per applied
+step. App startup only reads ``MAX(version)`` from it; the actual DDL runs
+from ``manage.py migrate`` (or on first boot when AUTO_MIGRATE is on).
+
+Steps are applied inside a single ``BEGIN IMMEDIATE`` transaction, so when
+several gunicorn workers boot against a fresh database only one of them
+does the work and the others wait on the SQLite write lock, then see the
+new version and skip.
+
+Adding a step: append a function decorated with ``@migration(N, "...")``
+where N is the next integer. Steps must be idempotent (check before
+ALTER/CREATE) because pre-versioning databases start at version 0 with
+most of the schema already present.
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+MIGRATIONS = []  # [(version, description, fn)], kept sorted by version
+
+# Tables that existed before versioning; step 1 creates whichever are missing.
+BASELINE_TABLES = [
+    "user", "home_card", "item", "item_chapter", "trip", "wedding_item", "photo",
+    "seating_table", "guest", "budget_item", "comment", "item_comment",
+    "comment_reaction", "registration_request",
+]
+
+
+def migration(version: int, description: str):
+    def register(fn):
+        if any(v == version for v, _, _ in MIGRATIONS):
+            raise ValueError(f"duplicate migration version {version}")
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# ---------------- Helpers for steps ----------------
+def column_names(conn, table: str) -> list[str]:
+    # table_xinfo also lists generated columns, which table_info hides
+    return [r[1] for r in conn.execute(text(f"PRAGMA table_xinfo({table})")).fetchall()]
+
+
+def add_column(conn, table: str, name: str, ddl: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN unless it already exists. Returns True if added."""
+    cols = column_names(conn, table)
+    if not cols or name in cols:
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+    return True
+
+
+def create_tables(conn, metadata, names):
+    metadata.create_all(bind=conn, tables=[metadata.tables[n] for n in names], checkfirst=True)
+
+
+# ---------------- Steps ----------------
+@migration(1, "baseline tables and legacy columns")
+def _baseline(conn, metadata):
+    create_tables(conn, metadata, BASELINE_TABLES)
+
+    add_column(conn, "wedding_item", "meta", "TEXT DEFAULT '{}'")
+    add_column(conn, "wedding_item", "is_starred", "INTEGER NOT NULL DEFAULT 0")
+
+    add_column(conn, "user", "can_travel_edit", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "user", "can_approve_users", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "user", "is_admin", "INTEGER NOT NULL DEFAULT 0")
+
+    add_column(conn, "trip", "lat", "REAL")
+    add_column(conn, "trip", "lon", "REAL")
+
+    add_column(conn, "photo", "thumb_path", "TEXT")
+
+    for name, ddl in [
+        ("chapter_current", "INTEGER"),
+        ("chapter_total", "INTEGER"),
+        ("seasons", "INTEGER"),
+        ("release_status", "TEXT"),
+        ("year", "INTEGER"),
+        ("runtime_mins", "INTEGER"),
+        ("platforms", "TEXT"),
+        ("cover_path", "TEXT"),
+        ("cover_thumb_path", "TEXT"),
+        ("status", "TEXT DEFAULT 'info'"),
+        ("score", "INTEGER"),
+        ("added_at", "DATETIME"),
+        ("source_path", "TEXT"),
+    ]:
+        add_column(conn, "item", name, ddl)
+
+    add_column(conn, "registration_request", "decided_at", "DATETIME")
+    add_column(conn, "registration_request", "decided_by_user_id", "INTEGER")
+
+
+@migration(2, "seed home cards")
+def _seed_home_cards(conn, metadata):
+    cards = [
+        ("travel", "T&R Travel Log",
+         "Map our adventures, add photos, and notes.", "/travel", 10),
+        ("tracker", "Media Tracker",
+         "Track books, manga/manhwa, movies, shows, and more.", "/tracker", 20),
+        ("fitness", "Fitness",
+         "Section for keeping track of and looking at trends for personal fitness", "/fitness", 30),
+        ("wedding", "Wedding",
+         "Plan + brainstorm, all in one place (admins only).", "/wedding", 40),
+    ]
+    for key, title, description, url, sort_order in cards:
+        conn.execute(text(
+            "INSERT INTO home_card (key, title, description, url, sort_order) "
+            "SELECT :key, :title, :description, :url, :sort_order "
+            "WHERE NOT EXISTS (SELECT 1 FROM home_card WHERE key = :key)"
+        ), dict(key=key, title=title, description=description, url=url, sort_order=sort_order))
+
+
+@migration(3, "background job queue")
+def _job_queue(conn, metadata):
+    create_tables(conn, metadata, ["job"])
+
+
+@migration(4, "wedding_item kind indexes and data_version counters")
+def _wedding_indexes(conn, metadata):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_wedding_item_kind_created ON wedding_item (kind, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_wedding_item_kind_starred_id ON wedding_item (kind, is_starred, id)"))
+    create_tables(conn, metadata, ["data_version"])
+
+
+@migration(5, "indexed virtual columns for wedding_item meta order/due/status")
+def _wedding_meta_columns(conn, metadata):
+    for name, ddl in [
+        ("meta_order", "INTEGER GENERATED ALWAYS AS (json_extract(meta, '$.order')) VIRTUAL"),
+        ("meta_due", "VARCHAR(20) GENERATED ALWAYS AS (json_extract(meta, '$.due')) VIRTUAL"),
+        ("meta_status", "VARCHAR(20) GENERATED ALWAYS AS (json_extract(meta, '$.status')) VIRTUAL"),
+    ]:
+        add_column(conn, "wedding_item", name, ddl)
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_wedding_item_kind_order ON wedding_item (kind, meta_order)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_wedding_item_kind_due ON wedding_item (kind, meta_due)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_wedding_item_kind_status_due "
+                      "ON wedding_item (kind, meta_status, meta_due)"))
+
+
+@migration(6, "wedding_item (kind, id) index for board pagination")
+def _wedding_board_index(conn, metadata):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_wedding_item_kind_id ON wedding_item (kind, id)"))
+
+
+@migration(7, "seating_constraint table")
+def _seating_constraints(conn, metadata):
+    create_tables(conn, metadata, ["seating_constraint"])
+
+
+@migration(8, "budget_item indexes for the budget summary")
+def _budget_indexes(conn, metadata):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_budget_item_category ON budget_item (category)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_budget_item_due_paid ON budget_item (due_date, paid)"))
+
+
+
+@migration(9, "storage_usage table")
+def _storage_usage(conn, metadata):
+    create_tables(conn, metadata, ["storage_usage"])
+
+
+@migration(10, "fitness: workout_session, workout_series and workout_rollup tables")
+def _workouts(conn, metadata):
+    create_tables(conn, metadata, ["workout_session", "workout_series", "workout_rollup"])
+
+
+@migration(11, "fitness: GPX/TCX import columns and workout_route table")
+def _workout_routes(conn, metadata):
+    add_column(conn, "workout_session", "source_ref", "VARCHAR(64)")
+    add_column(conn, "workout_session", "elevation_gain_m", "FLOAT")
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_workout_session_user_source_ref "
+                      "ON workout_session (user_id, source_ref)"))
+    create_tables(conn, metadata, ["workout_route"])
+
+
+@migration(12, "trip_import and trip_import_photo tables")
+def _trip_imports(conn, metadata):
+    create_tables(conn, metadata, ["trip_import", "trip_import_photo"])
+
+
+@migration(13, "image_hash table for near-duplicate detection")
+def _image_hashes(conn, metadata):
+    create_tables(conn, metadata, ["image_hash"])
+
+
+@migration(14, "search_index full-text table, filled from existing rows")
+def _search_index(conn, metadata):
+    import search  # the index definition lives with the code that maintains it
+    search.rebuild(conn)
+
+
+@migration(15, "job.created_by_user_id so job status is only shown to its owner")
+def _job_owner(conn, metadata):
+    add_column(conn, "job", "created_by_user_id", "INTEGER")
+
+# ---------------- Runner ----------------
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY,"
+        " description TEXT,"
+        " applied_at DATETIME NOT NULL)"
+    ))
+
+
+def current_version(conn) -> int:
+    """Highest applied version, 0 for a database that predates versioning."""
+    try:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except OperationalError:
+        return 0
+
+
+def pending(engine) -> list[tuple[int, str]]:
+    with engine.connect() as conn:
+        have = current_version(conn)
+    return [(v, d) for v, d, _ in MIGRATIONS if v > have]
+
+
+def upgrade(engine, metadata, log=print) -> list[int]:
+    """Apply all pending steps in one write transaction. Returns applied versions."""
+    applied = []
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # take the write lock up front so concurrent boots serialize here
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        _ensure_version_table(conn)
+        have = current_version(conn)
+        for version, description, fn in MIGRATIONS:
+            if version <= have:
+                continue
+            fn(conn, metadata)
+            conn.execute(text(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"
+            ), dict(v=version, d=description, t=datetime.utcnow()))
+            applied.append(version)
+            if log:
+                log(f"applied migration {version}: {description}")
+        conn.commit()
+    return applied
+
+
+def ensure_current(engine, metadata, auto: bool, logger=None) -> int:
+    """
+    Cheap startup check: one SELECT when the schema is up to date.
+    When behind, upgrade if ``auto`` else warn and carry on (the deploy is
+    expected to run ``manage.py migrate``).
+    """
+    with engine.connect() as conn:
+        have = current_version(conn)
+    if have >= latest_version():
+        return have
+    if auto:
+        upgrade(engine, metadata, log=logger.info if logger else None)
+        return latest_version()
+    if logger:
+        logger.warning("database schema is at version %s, code expects %s; run `manage.py migrate`",
+                       have, latest_version())
+    return have
@@ -0,0 +1,350 @@
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+MEDIA_TYPES = ["book", "movie", "show", "anime", "manga", "manhwa", "game", "other"]
+
+DEFAULT_STATUSES = ["current", "waiting", "finished"]  # legacy (UI no longer uses)
+SERIAL_TYPES = ["manga", "manhwa"]                     # legacy (UI no longer uses)
+SERIAL_STATUSES = ["ongoing", "completed", "hiatus", "canceled"]  # legacy
+
+# Wedding image boards: upload bucket -> (WeddingItem.kind, default title)
+WEDDING_BOARDS = {
+    "rings": ("ring", "Ring"),
+    "cakes": ("cake", "Cake"),
+    "photos": ("photo", "Photo"),
+    "bridesmaids": ("bridesmaid", "Bridesmaid fit"),
+    "groomsmen": ("groomsman", "Groomsman fit"),
+    "aesthetic": ("aesthetic", "Aesthetic"),
+}
+
+# ---------------- Models ----------------
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False, index=True)
+    password_hash = db.Column(db.String(256), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    can_travel_edit = db.Column(db.Boolean, nullable=False, default=False)
+    can_approve_users = db.Column(db.Boolean, nullable=False, default=False)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False)
+
+class HomeCard(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(50), unique=True, index=True)  # "travel", "tracker", etc.
+    title = db.Column(db.String(120), nullable=False)
+    description = db.Column(db.Text)
+    image_path = db.Column(db.String(600))  # relative path served via /u/<path>
+    url = db.Column(db.String(200), nullable=False)
+    sort_order = db.Column(db.Integer, default=0)
+
+class Chapter(db.Model):
+    __tablename__ = "item_chapter"
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey("item.id", ondelete="CASCADE"), index=True, nullable=False)
+    number = db.Column(db.Integer, nullable=False)  # 1-based chapter number
+    title = db.Column(db.String(200))
+    source_path = db.Column(db.String(600), nullable=False)  # relative path under UPLOAD_ROOT
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint("item_id", "number", name="uq_item_chapter_number"),)
+
+class Item(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False, index=True)
+    media_type = db.Column(db.String(20), nullable=False, index=True)
+
+    # legacy columns kept for compatibility (not shown in UI now)
+    status = db.Column(db.String(20), nullable=False, index=True, default="info")
+    score = db.Column(db.Integer)
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    tags = db.Column(db.String(200))
+    notes = db.Column(db.Text)
+
+    chapter_current = db.Column(db.Integer)
+    chapter_total   = db.Column(db.Integer)
+
+    # new/non-personalized fields for display
+    seasons = db.Column(db.Integer)              # shows/anime
+    release_status = db.Column(db.String(20))    # Ongoing/Completed/Hiatus/Canceled
+    year = db.Column(db.Integer)                 # movies/games optional
+    runtime_mins = db.Column(db.Integer)         # movies optional
+    platforms = db.Column(db.String(200))        # games optional
+
+    # cover image
+    cover_path = db.Column(db.String(600))       # original uploaded image path under /u
+    cover_thumb_path = db.Column(db.String(600)) # jpg thumbnail for display
+
+    source_path = db.Column(db.String(600))
+    chapters = db.relationship(
+        "Chapter",
+        backref="item",
+        lazy="joined",           
+        order_by="Chapter.number",
+        cascade="all, delete-orphan",
+    )
+    comments = db.relationship("ItemComment", backref="item", lazy=True, cascade="all, delete-orphan")
+
+class Trip(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False, index=True)
+    address = db.Column(db.String(500), nullable=False)
+    comments = db.Column(db.Text)
+    lat = db.Column(db.Float)
+    lon = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    photos = db.relationship("Photo", backref="trip", lazy=True, cascade="all, delete-orphan")
+    user_comments = db.relationship("Comment", backref="trip", lazy=True, cascade="all, delete-orphan")
+
+# A camera-roll upload waiting for review: photos staged under travel/imports/<id>/, grouped into proposed trips.
+class TripImport(db.Model):
+    __tablename__ = "trip_import"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TripImportPhoto(db.Model):
+    __tablename__ = "trip_import_photo"
+    id = db.Column(db.Integer, primary_key=True)
+    import_id = db.Column(db.Integer, db.ForeignKey("trip_import.id"), nullable=False, index=True)
+    stored_path = db.Column(db.String(600), nullable=False)
+    original_name = db.Column(db.String(300))
+    mime_type = db.Column(db.String(100))
+    size_bytes = db.Column(db.Integer)
+    taken_at = db.Column(db.DateTime)           # EXIF DateTimeOriginal (camera local time)
+    lat = db.Column(db.Float)                   # EXIF GPS
+    lon = db.Column(db.Float)
+    cluster = db.Column(db.Integer)             # proposed trip number within the batch; NULL = not placed
+
+class WeddingItem(db.Model):
+    __tablename__ = "wedding_item"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)   # idea, link, ring, cake, photo, vendor, venue, task, ceremony, reception
+    title = db.Column(db.String(255), nullable=False)
+    notes = db.Column(db.Text)
+    url = db.Column(db.String(1024))
+    url_ts = db.Column(db.Integer)
+    image_path = db.Column(db.String(1024))
+    tags = db.Column(db.String(255))
+    meta = db.Column(db.JSON, default=dict)           
+    created_by_user_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_starred = db.Column(db.Boolean, nullable=False, default=False)
+
+    # read-only mirrors of meta fields (SQLite virtual columns) so they can be indexed
+    meta_order = db.Column(db.Integer, db.Computed("json_extract(meta, '$.order')", persisted=False))
+    meta_due = db.Column(db.String(20), db.Computed("json_extract(meta, '$.due')", persisted=False))
+    meta_status = db.Column(db.String(20), db.Computed("json_extract(meta, '$.status')", persisted=False))
+
+    __table_args__ = (
+        db.Index("ix_wedding_item_kind_created", "kind", "created_at"),
+        db.Index("ix_wedding_item_kind_starred_id", "kind", "is_starred", "id"),
+        db.Index("ix_wedding_item_kind_id", "kind", "id"),
+        db.Index("ix_wedding_item_kind_order", "kind", "meta_order"),
+        db.Index("ix_wedding_item_kind_due", "kind", "meta_due"),
+        db.Index("ix_wedding_item_kind_status_due", "kind", "meta_status", "meta_due"),
+    )
+
+class Photo(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    trip_id = db.Column(db.Integer, db.ForeignKey("trip.id"), nullable=False, index=True)
+    stored_path = db.Column(db.String(600), nullable=False)
+    thumb_path = db.Column(db.String(600))
+    original_name = db.Column(db.String(300))
+    mime_type = db.Column(db.String(100))
+    size_bytes = db.Column(db.Integer)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SeatingTable(db.Model):
+    __tablename__ = "seating_table"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)     # e.g., "Table 5"
+    capacity = db.Column(db.Integer, default=8)
+    img_tiny = db.Column(db.String(300))               # baby photo (Tiny)
+    img_rosie = db.Column(db.String(300))              # baby photo (Rosie)
+
+class Guest(db.Model):
+    __tablename__ = "guest"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    side = db.Column(db.String(20))                    # 'Tiny' | 'Rosie' | 'Both' | None
+    email = db.Column(db.String(200))
+    phone = db.Column(db.String(50))
+    rsvp = db.Column(db.String(20), default="unknown") # 'yes' | 'no' | 'unknown'
+    notes = db.Column(db.Text)
+    table_id = db.Column(db.Integer, db.ForeignKey("seating_table.id"))
+    table = db.relationship("SeatingTable", lazy="joined")
+
+class SeatingConstraint(db.Model):
+    """Two guests who must share a table ("together") or must not ("apart"); stored with guest_a_id < guest_b_id."""
+    __tablename__ = "seating_constraint"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)     # 'together' | 'apart'
+    guest_a_id = db.Column(db.Integer, db.ForeignKey("guest.id", ondelete="CASCADE"), nullable=False)
+    guest_b_id = db.Column(db.Integer, db.ForeignKey("guest.id", ondelete="CASCADE"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint("kind", "guest_a_id", "guest_b_id", name="uq_seating_constraint_pair"),)
+
+class BudgetItem(db.Model):
+    __tablename__ = "budget_item"
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(80), nullable=False) # e.g., 'Venue', 'Catering', 'Rings'
+    item = db.Column(db.String(200), nullable=False)    # e.g., 'Deposit', 'Cake'
+    estimate = db.Column(db.Integer, default=0)         # store cents to avoid float drift (later)
+    actual = db.Column(db.Integer)                      # cents; nullable
+    due_date = db.Column(db.Date)
+    paid = db.Column(db.Boolean, default=False)
+    vendor_url = db.Column(db.String(600))
+    notes = db.Column(db.Text)
+    __table_args__ = (
+        db.Index("ix_budget_item_category", "category"),
+        db.Index("ix_budget_item_due_paid", "due_date", "paid"),
+    )
+
+class Comment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    trip_id = db.Column(db.Integer, db.ForeignKey("trip.id"), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    author = db.Column(db.String(80), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ItemComment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey("item.id"), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    author = db.Column(db.String(80), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Reactions for comments across both features.
+# 'kind' is 'trip' or 'item' to avoid id collision between tables.
+class CommentReaction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False, index=True)       # 'trip' | 'item'
+    comment_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    value = db.Column(db.Integer, nullable=False)                     # 1=like, -1=dislike
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint("kind", "comment_id", "user_id", name="uq_reaction_one_per_user"),
+    )
+
+class RegistrationRequest(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), nullable=False, index=True)
+    password_hash = db.Column(db.String(256), nullable=False)
+    reason = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default="pending", index=True)  # pending/approved/denied
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    decided_at = db.Column(db.DateTime)
+    decided_by_user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+
+# Durable background jobs (see jobs.py). One active row per dedupe_key.
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, default=dict)
+    status = db.Column(db.String(10), nullable=False, default="queued")  # queued/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    dedupe_key = db.Column(db.String(200))
+    last_error = db.Column(db.Text)
+    result = db.Column(db.JSON)
+    created_by_user_id = db.Column(db.Integer)  # who enqueued it; /api/jobs only shows a user their own
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index("ix_job_status_run_after", "status", "run_after"),
+        db.Index("uq_job_dedupe_active", "dedupe_key", unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'running')")),
+    )
+
+# Fitness log (see workouts.py). started_at is the wall-clock time the workout began.
+class WorkoutSession(db.Model):
+    __tablename__ = "workout_session"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    activity = db.Column(db.String(20), nullable=False)     # run, ride, walk, ... (workouts.ACTIVITIES)
+    title = db.Column(db.String(200))
+    started_at = db.Column(db.DateTime, nullable=False)
+    duration_s = db.Column(db.Integer, nullable=False, default=0)
+    distance_m = db.Column(db.Float)
+    calories = db.Column(db.Integer)
+    avg_hr = db.Column(db.Float)
+    max_hr = db.Column(db.Float)
+    notes = db.Column(db.Text)
+    source = db.Column(db.String(20), nullable=False, default="manual")   # manual, api, gpx, tcx
+    source_ref = db.Column(db.String(64))                   # sha256 of an imported file, to skip re-imports
+    elevation_gain_m = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index("ix_workout_session_user_started", "user_id", "started_at"),
+        db.Index("ix_workout_session_user_source_ref", "user_id", "source_ref"),
+    )
+
+# One packed array per (session, metric); metric "t" holds the shared second offsets.
+class WorkoutSeries(db.Model):
+    __tablename__ = "workout_series"
+    session_id = db.Column(db.Integer, db.ForeignKey("workout_session.id", ondelete="CASCADE"), primary_key=True)
+    metric = db.Column(db.String(20), primary_key=True)
+    n = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)        # little-endian array('I') for "t", array('f') otherwise
+    v_min = db.Column(db.Float)
+    v_max = db.Column(db.Float)
+    v_avg = db.Column(db.Float)
+
+# Simplified map route of an imported session, one Google encoded polyline per tolerance; see tracks.py.
+class WorkoutRoute(db.Model):
+    __tablename__ = "workout_route"
+    session_id = db.Column(db.Integer, db.ForeignKey("workout_session.id", ondelete="CASCADE"), primary_key=True)
+    tolerance_m = db.Column(db.Integer, primary_key=True)
+    n = db.Column(db.Integer, nullable=False)
+    polyline = db.Column(db.Text, nullable=False)
+
+# Per user/activity totals by day, ISO week (Monday) and month; kept current on every session write.
+class WorkoutRollup(db.Model):
+    __tablename__ = "workout_rollup"
+    user_id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(5), primary_key=True)      # day | week | month
+    period_start = db.Column(db.Date, primary_key=True)
+    activity = db.Column(db.String(20), primary_key=True)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    duration_s = db.Column(db.Integer, nullable=False, default=0)
+    distance_m = db.Column(db.Float, nullable=False, default=0)
+    calories = db.Column(db.Integer, nullable=False, default=0)
+    hr_sum = db.Column(db.Float, nullable=False, default=0)        # avg_hr x duration_s, for a weighted mean
+    hr_seconds = db.Column(db.Integer, nullable=False, default=0)
+    max_hr = db.Column(db.Float)
+
+# Bytes on disk under UPLOAD_ROOT per section (top-level dir) and entity (trip/item id, board bucket); see storage.py.
+class StorageUsage(db.Model):
+    __tablename__ = "storage_usage"
+    section = db.Column(db.String(20), primary_key=True)    # travel, tracker, wedding, homecards, ...
+    entity = db.Column(db.String(64), primary_key=True)     # "" for files directly in the section
+    files = db.Column(db.Integer, nullable=False, default=0)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index("ix_storage_usage_section_bytes", "section", "bytes"),
+    )
+
+# 64-bit dHash of an uploaded image, keyed by the path its row references (Photo.stored_path,
+# WeddingItem.image_path); see dupes.py.
+class ImageHash(db.Model):
+    __tablename__ = "image_hash"
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(600), nullable=False, unique=True)
+    hash = db.Column(db.BigInteger, nullable=False)         # signed 64-bit (SQLite INTEGER)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Change counters for caches (see versions.py): one row per cached area, bumped on writes.
+class DataVersion(db.Model):
+    __tablename__ = "data_version"
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,199 @@
+"""
+Site-wide full-text search over trips, trip comments, tracker items, item
+comments and wedding items.
+
+Everything searchable lives in one SQLite FTS5 table, ``search_index``
+(created by migration 14), with a ``title`` and a ``body`` column plus two
+unindexed ones: ``kind`` and ``parent`` (the trip/item a comment belongs to,
+the board kind of a wedding item). A row's rowid is ``id * 8 + code``, so
+the row for any source row is found without a lookup.
+
+The index follows writes through the ORM: an ``after_flush`` hook (like the
+one in versions.py) rewrites the rows of every new, deleted or changed
+instance of a source model in the same transaction, straight from the
+source tables with ``INSERT ... SELECT``. Instances whose indexed columns
+did not change are left alone. Bulk statements bypass the hook and must
+call ``refresh()``; ``rebuild()`` (``manage.py reindex-search``) rewrites
+the whole index.
+
+Queries are ranked by bm25 with title matches weighted above body matches;
+every word is matched as a prefix, so "pari" finds "Paris".
+"""
+import re
+from collections import defaultdict
+
+from markupsafe import Markup, escape
+from sqlalchemy import Column, Integer, MetaData, Table, Text, bindparam, event, func, insert, inspect, literal, null, select, text
+from sqlalchemy.orm import Session
+
+from models import db, Comment, Item, ItemComment, Trip, WeddingItem
+
+PAGE_SIZE = 20
+TITLE_WEIGHT = 8.0
+SNIPPET_WORDS = 16
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"   # snippet() markers, turned into <mark> after escaping
+
+DDL = ("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+       "title, body, kind UNINDEXED, parent UNINDEXED, "
+       "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+
+# Not part of db.metadata: create_all() must never try to make this a plain table.
+index_table = Table("search_index", MetaData(),
+                    Column("rowid", Integer, primary_key=True), Column("title", Text), Column("body", Text),
+                    Column("kind", Text), Column("parent", Text))
+
+# Sections users filter by, and the kinds in each; wedding is admin-only like the wedding pages.
+SECTIONS = {"travel": ("trip", "trip_comment"), "tracker": ("item", "item_comment"), "wedding": ("wedding",)}
+ADMIN_SECTIONS = ("wedding",)
+
+
+def _text(*columns):
+    """Columns joined with newlines, NULLs as empty (concat_ws needs SQLite 3.44)."""
+    out = func.coalesce(columns[0], "")
+    for c in columns[1:]:
+        out = out + "\n" + func.coalesce(c, "")
+    return out
+
+
+class _Source:
+    def __init__(self, kind: str, code: int, model, fields, title, body, parent):
+        self.kind, self.code, self.model, self.fields = kind, code, model, fields
+        self.title, self.body, self.parent = title, body, parent
+
+    def rowid(self, id_: int) -> int:
+        return id_ * 8 + self.code
+
+    def select(self, ids=None):
+        m = self.model
+        q = select(m.id * 8 + self.code, self.title, self.body, literal(self.kind), self.parent)
+        return q.where(m.id.in_(ids)) if ids is not None else q
+
+
+SOURCES = {s.model: s for s in (
+    _Source("trip", 1, Trip, ("title", "address", "comments"),
+            Trip.title, _text(Trip.address, Trip.comments), null()),
+    _Source("trip_comment", 2, Comment, ("author", "body"),
+            Comment.author, Comment.body, Comment.trip_id),
+    _Source("item", 3, Item, ("title", "tags", "notes", "platforms"),
+            Item.title, _text(Item.tags, Item.notes, Item.platforms), null()),
+    _Source("item_comment", 4, ItemComment, ("author", "body"),
+            ItemComment.author, ItemComment.body, ItemComment.item_id),
+    _Source("wedding", 5, WeddingItem, ("title", "notes", "tags", "kind"),
+            WeddingItem.title, _text(WeddingItem.notes, WeddingItem.tags), WeddingItem.kind),
+)}
+_installed = False
+
+
+# ---------------- Maintenance ----------------
+def _write(conn, stale: dict, fresh: dict):
+    """Drop the index rows of stale {source: ids}, then (re)insert fresh {source: ids} from their tables."""
+    rowids = [s.rowid(i) for s, ids in stale.items() for i in ids]
+    if rowids:
+        conn.execute(text("DELETE FROM search_index WHERE rowid IN :ids")
+                     .bindparams(bindparam("ids", expanding=True)), {"ids": rowids})
+    cols = [c.name for c in index_table.columns]
+    for source, ids in fresh.items():
+        if ids:
+            conn.execute(insert(index_table).from_select(cols, source.select(sorted(ids))))
+
+
+def refresh(model, ids, session=None):
+    """Re-index rows of model after a bulk INSERT/UPDATE the flush hook did not see."""
+    source, ids = SOURCES[model], set(ids)
+    _write((session or db.session).connection(), {source: ids}, {source: ids})
+
+
+def _changed(obj, fields) -> bool:
+    attrs = inspect(obj).attrs
+    return any(attrs[f].history.has_changes() for f in fields)
+
+
+def _after_flush(session, flush_context):
+    stale, fresh = defaultdict(set), defaultdict(set)
+    for obj in session.new:
+        source = SOURCES.get(type(obj))
+        if source:
+            fresh[source].add(obj.id)
+    for obj in session.dirty:
+        source = SOURCES.get(type(obj))
+        if source and _changed(obj, source.fields):
+            stale[source].add(obj.id)
+            fresh[source].add(obj.id)
+    for obj in session.deleted:
+        source = SOURCES.get(type(obj))
+        if source:
+            stale[source].add(obj.id)
+    if stale or fresh:
+        _write(session.connection(), stale, fresh)
+
+
+def install():
+    global _installed
+    if not _installed:
+        event.listen(Session, "after_flush", _after_flush)
+        _installed = True
+
+
+def rebuild(conn) -> dict:
+    """Rewrite the whole index from the source tables; {kind: rows}. Runs in the caller's transaction."""
+    conn.execute(text(DDL))
+    conn.execute(text("DELETE FROM search_index"))
+    cols = [c.name for c in index_table.columns]
+    counts = {}
+    for source in SOURCES.values():
+        counts[source.kind] = conn.execute(insert(index_table).from_select(cols, source.select())).rowcount
+    conn.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+    return counts
+
+
+# ---------------- Queries ----------------
+def match_expression(q: str) -> str | None:
+    """FTS5 query for user input: every word quoted and prefix-matched, all required. None if no words."""
+    words = re.findall(r"\w+", q or "")
+    return " ".join(f'"{w}"*' for w in words[:16]) or None
+
+
+def _highlight(snippet: str) -> Markup:
+    return Markup(str(escape(snippet)).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>"))
+
+
+def query(q: str, sections=None, page: int = 1, size: int = PAGE_SIZE):
+    """
+    (hits, has_next) for q within sections (None = all), best first. Each
+    hit is a dict with kind, id, parent, title, snippet (HTML, matches in
+    <mark>) and score. Callers drop admin-only sections for other users.
+
+    Kinds are filtered on the rowid code (reading ``kind`` would load every
+    matching row), and snippets are only built for the page being returned.
+    """
+    expr = match_expression(q)
+    kinds = {k for name in (SECTIONS if sections is None else sections) for k in SECTIONS.get(name, ())}
+    codes = [s.code for s in SOURCES.values() if s.kind in kinds]
+    if not expr or not codes:
+        return [], False
+    page = max(1, page)
+    rows = db.session.execute(text(
+        "WITH top AS (SELECT rowid AS id, bm25(search_index, :title_weight, 1.0) AS score FROM search_index"
+        "  WHERE search_index MATCH :expr AND rowid % 8 IN :codes ORDER BY score LIMIT :limit OFFSET :offset)"
+        " SELECT top.id, kind, parent, title, top.score,"
+        "  snippet(search_index, -1, :open, :close, '…', :words) AS snippet"
+        " FROM top JOIN search_index ON search_index.rowid = top.id"
+        " WHERE search_index MATCH :expr ORDER BY top.score"
+    ).bindparams(bindparam("codes", expanding=True)), {
+        "open": _MARK_OPEN, "close": _MARK_CLOSE, "words": SNIPPET_WORDS, "title_weight": TITLE_WEIGHT,
+        "expr": expr, "codes": codes, "limit": size + 1, "offset": (page - 1) * size,
+    }).all()
+    hits = [{"kind": r.kind, "id": r.id // 8, "parent": r.parent, "title": r.title,
+             "snippet": _highlight(r.snippet), "score": round(-r.score, 3)} for r in rows[:size]]
+    return hits, len(rows) > size
+
+
+def parent_titles(hits) -> dict:
+    """{(kind, id): title} of the trips and items that comment hits belong to; one query per kind."""
+    out = {}
+    for kind, model in (("trip_comment", Trip), ("item_comment", Item)):
+        ids = {int(h["parent"]) for h in hits if h["kind"] == kind and h["parent"] is not None}
+        if ids:
+            out.update({(kind, id_): title for id_, title in
+                        db.session.execute(select(model.id, model.title).where(model.id.in_(ids))).all()})
+    return out
@@ -0,0 +1,52 @@
+"""
+SQLite production profile.
+
+The PRAGMAs in ``SQLITE_PRAGMAS`` are applied to every new DBAPI connection
+through an engine "connect" hook, so each pooled connection in each
+gunicorn worker gets the same settings:
+
+- journal_mode=WAL      readers no longer block on a writer (and vice versa)
+- busy_timeout          wait for the write lock instead of failing with
+                        "database is locked"
+- synchronous=NORMAL    safe with WAL; fsync at checkpoints, not every commit
+- mmap_size/cache_size  keep hot pages in memory
+- temp_store=MEMORY     sorts and temp b-trees stay off disk
+
+WAL files grow until checkpointed; ``manage.py db-maintenance`` runs a
+truncating checkpoint plus ``PRAGMA optimize`` and is meant for cron.
+"""
+from sqlalchemy import event
+
+# applied in this order; journal_mode first so the rest see the final mode
+PRAGMA_ORDER = ("journal_mode", "busy_timeout", "synchronous", "mmap_size", "cache_size", "temp_store")
+
+
+def apply_pragmas(dbapi_conn, pragmas: dict):
+    cur = dbapi_conn.cursor()
+    try:
+        for name in PRAGMA_ORDER:
+            value = pragmas.get(name)
+            if value is None or value == "":
+                continue
+            cur.execute(f"PRAGMA {name}={value}")
+    finally:
+        cur.close()
+
+
+def install(engine, pragmas: dict):
+    """Register the connect hook on a SQLite engine (no-op for other backends)."""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        apply_pragmas(dbapi_conn, pragmas)
+
+
+def maintenance(engine) -> dict:
+    """Checkpoint and truncate the WAL, then let SQLite refresh planner stats."""
+    with engine.connect() as conn:
+        busy, log_frames, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        conn.exec_driver_sql("PRAGMA optimize")
+        conn.commit()
+    return {"busy": busy, "log_frames": log_frames, "checkpointed": checkpointed}
@@ -263,3 +263,114 @@
   // enhance each modal the moment it opens
   document.addEventListener('shown.bs.modal', (e) => enhanceWithin(e.target));
 })();
+
+/* =========================================================
+   Resumable chunked uploads (/api/uploads)
+   - window.resumableUpload(file, fields, {onProgress}) -> Promise<result>
+   - <input type="file" data-resumable="travel" data-resumable-trip-id="7">
+     or data-resumable="chapter" data-resumable-item-id="3": when the
+     selected files are large, the form sends them in chunks first and
+     then submits the rest of the form without them.
+   ========================================================= */
+(function resumableUploads() {
+  'use strict';
+
+  const CHUNK = 8 * 1024 * 1024;
+  const THRESHOLD = 32 * 1024 * 1024;   // smaller batches go through the normal form post
+  const HASH_MAX = 256 * 1024 * 1024;   // hashing needs the whole file in memory
+  const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+
+  async function sha256Hex(file) {
+    if (!window.crypto || !crypto.subtle || file.size > HASH_MAX) return null;
+    const buf = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(buf)).map((b) => b.toString(16).padStart(2, '0')).join('');
+  }
+
+  async function serverOffset(url) {
+    const r = await fetch(url, { method: 'HEAD', credentials: 'same-origin' });
+    if (!r.ok) throw new Error('upload expired');
+    return parseInt(r.headers.get('Upload-Offset') || '0', 10);
+  }
+
+  async function resumableUpload(file, fields, opts = {}) {
+    const sha256 = await sha256Hex(file);
+    const created = await fetch('/api/uploads', {
+      method: 'POST', credentials: 'same-origin',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(Object.assign({}, fields, {
+        filename: file.name, size: file.size, mime_type: file.type, sha256: sha256
+      }))
+    });
+    const meta = await created.json();
+    if (!created.ok) throw new Error(meta.error || 'could not start upload');
+
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+      try {
+        const r = await fetch(meta.url, {
+          method: 'PATCH', credentials: 'same-origin',
+          headers: { 'Upload-Offset': String(offset), 'Content-Type': 'application/offset+octet-stream' },
+          body: file.slice(offset, offset + CHUNK)
+        });
+        if (!r.ok) throw new Error('chunk rejected: ' + r.status);
+        offset = parseInt(r.headers.get('Upload-Offset'), 10);
+        failures = 0;
+        if (opts.onProgress) opts.onProgress(offset, file.size);
+      } catch (err) {
+        // retry just this chunk from wherever the server says we are
+        if (++failures > 5) throw err;
+        await sleep(500 * 2 ** failures);
+        offset = await serverOffset(meta.url);
+      }
+    }
+
+    const done = await fetch(meta.url + '/finalize', {
+      method: 'POST', credentials: 'same-origin',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ sha256: sha256 })
+    });
+    const result = await done.json();
+    if (!done.ok) throw new Error(result.error || 'finalize failed');
+    return result;
+  }
+  window.resumableUpload = resumableUpload;
+
+  function fieldsFor(input) {
+    const d = input.dataset;
+    if (d.resumable === 'travel') return { target: 'travel', trip_id: d.resumableTripId };
+    if (d.resumable === 'chapter') return { target: 'chapter', item_id: d.resumableItemId };
+    if (d.resumable === 'wedding') return { target: 'wedding', bucket: d.resumableBucket };
+    return null;
+  }
+
+  document.addEventListener('submit', async (e) => {
+    const form = e.target;
+    const inputs = Array.from(form.querySelectorAll('input[type="file"][data-resumable]'))
+      .filter((i) => i.files && i.files.length);
+    const total = inputs.reduce((n, i) => n + Array.from(i.files).reduce((m, f) => m + f.size, 0), 0);
+    if (!inputs.length || total < THRESHOLD) return;
+
+    e.preventDefault();
+    e.stopImmediatePropagation();
+    const btn = form.querySelector('[type="submit"]');
+    const label = btn ? btn.textContent : '';
+    if (btn) btn.disabled = true;
+    let sent = 0;
+    try {
+      for (const input of inputs) {
+        for (const file of Array.from(input.files)) {
+          await resumableUpload(file, fieldsFor(input), {
+            onProgress: (n) => { if (btn) btn.textContent = `Uploading ${Math.floor((sent + n) * 100 / total)}%`; }
+          });
+          sent += file.size;
+        }
+        input.value = '';
+      }
+      form.submit();
+    } catch (err) {
+      if (btn) { btn.disabled = false; btn.textContent = label; }
+      alert('Upload failed: ' + err.message + '. Files already sent were kept; try again for the rest.');
+    }
+  }, true);
+})();
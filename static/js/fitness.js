@@ -0,0 +1,142 @@
+// static/js/fitness.js — trend chart for /fitness (bars drawn as inline SVG from /fitness/trends.json)
+// and route maps for imported sessions (encoded polylines from /fitness/session/<id>/route.json)
+(function () {
+  'use strict';
+
+  const box = document.querySelector('[data-fitness-trends]');
+  if (!box) return;
+  const chart = box.querySelector('[data-trend-chart]');
+  const pick = (name) => box.querySelector(`[data-trend="${name}"]`);
+  const NS = 'http://www.w3.org/2000/svg';
+
+  const FORMAT = {
+    duration_s: (v) => v >= 3600 ? `${(v / 3600).toFixed(1)} h` : `${Math.round(v / 60)} min`,
+    distance_m: (v) => `${(v / 1000).toFixed(1)} km`,
+    sessions: (v) => `${v}`,
+    calories: (v) => `${Math.round(v)} kcal`,
+    avg_hr: (v) => `${Math.round(v)} bpm`
+  };
+
+  function label(start, period) {
+    const d = new Date(start + 'T00:00:00');
+    if (period === 'month') return d.toLocaleDateString(undefined, { month: 'short', year: '2-digit' });
+    return d.toLocaleDateString(undefined, { month: 'short', day: 'numeric' });
+  }
+
+  function el(tag, attrs, text) {
+    const n = document.createElementNS(NS, tag);
+    for (const [k, v] of Object.entries(attrs)) n.setAttribute(k, v);
+    if (text != null) n.textContent = text;
+    return n;
+  }
+
+  function draw(series, period, metric) {
+    const W = 720, H = 220, padL = 8, padB = 22, padT = 16;
+    const values = series.map((p) => p[metric] || 0);
+    const max = Math.max(...values, 0);
+    const svg = el('svg', { viewBox: `0 0 ${W} ${H}`, width: '100%', role: 'img', 'aria-label': 'Trend chart' });
+    const slot = (W - padL) / series.length;
+    const every = Math.ceil(series.length / 8);
+    series.forEach((p, i) => {
+      const v = values[i];
+      const h = max ? (v / max) * (H - padB - padT) : 0;
+      const x = padL + i * slot;
+      const bar = el('rect', { x: x + slot * 0.15, y: H - padB - h, width: slot * 0.7, height: Math.max(h, v ? 1 : 0),
+        rx: 2, class: 'fitness-bar' });
+      bar.appendChild(el('title', {}, `${label(p.start, period)}: ${FORMAT[metric](v)}`));
+      svg.appendChild(bar);
+      if (i % every === 0) {
+        svg.appendChild(el('text', { x: x + slot / 2, y: H - 6, 'text-anchor': 'middle', class: 'fitness-axis' },
+          label(p.start, period)));
+      }
+    });
+    svg.appendChild(el('text', { x: W - 4, y: 12, 'text-anchor': 'end', class: 'fitness-axis' },
+      max ? `max ${FORMAT[metric](max)}` : 'no workouts in this range'));
+    chart.replaceChildren(svg);
+  }
+
+  async function load() {
+    const params = new URLSearchParams({ period: pick('period').value });
+    if (pick('activity').value) params.set('activity', pick('activity').value);
+    try {
+      const res = await fetch(`${box.dataset.url}?${params}`, { credentials: 'same-origin' });
+      if (!res.ok) throw new Error(res.status);
+      const data = await res.json();
+      draw(data.series, data.period, pick('metric').value);
+    } catch (e) {
+      chart.textContent = 'Could not load trends.';
+    }
+  }
+
+  box.querySelectorAll('[data-trend]').forEach((s) => s.addEventListener('change', load));
+  load();
+})();
+
+(function () {
+  'use strict';
+
+  if (typeof L === 'undefined') return;
+
+  // Google encoded polyline (precision 5) -> [[lat, lon], ...]
+  function decode(str) {
+    const points = [];
+    let i = 0, lat = 0, lon = 0;
+    while (i < str.length) {
+      for (const axis of [0, 1]) {
+        let shift = 0, result = 0, b;
+        do {
+          b = str.charCodeAt(i++) - 63;
+          result |= (b & 0x1f) << shift;
+          shift += 5;
+        } while (b >= 0x20);
+        const delta = (result & 1) ? ~(result >> 1) : (result >> 1);
+        if (axis === 0) lat += delta; else lon += delta;
+      }
+      points.push([lat / 1e5, lon / 1e5]);
+    }
+    return points;
+  }
+
+  // coarser stored routes when zoomed out; the server picks the nearest level it has
+  const tolerance = (zoom) => zoom >= 15 ? 5 : zoom >= 12 ? 25 : 100;
+
+  function open(el) {
+    const map = L.map(el, { scrollWheelZoom: true });
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+      maxZoom: 19,
+      attribution: '&copy; OpenStreetMap contributors'
+    }).addTo(map);
+    const cache = {};
+    let line = null, first = true;
+
+    async function show(tol) {
+      try {
+        if (!cache[tol]) {
+          const res = await fetch(`${el.dataset.url}?tolerance=${tol}`, { credentials: 'same-origin' });
+          if (!res.ok) throw new Error(res.status);
+          cache[tol] = decode((await res.json()).polyline);
+        }
+        if (line) line.remove();
+        line = L.polyline(cache[tol], { color: '#d63384', weight: 4 }).addTo(map);
+        if (first) {
+          first = false;
+          map.fitBounds(line.getBounds(), { padding: [16, 16] });
+        }
+      } catch (e) {
+        el.textContent = 'Could not load the route.';
+      }
+    }
+
+    map.on('zoomend', () => show(tolerance(map.getZoom())));
+    show(25);
+  }
+
+  document.querySelectorAll('[data-route-map]').forEach((el) => {
+    el.closest('.collapse').addEventListener('shown.bs.collapse', () => {
+      if (!el.dataset.ready) {
+        el.dataset.ready = '1';
+        open(el);
+      }
+    }, { once: true });
+  });
+})();
@@ -404,6 +404,65 @@
   renderActiveTags();
 })();
 
+// ===== Suggestions for the filter box and tag inputs (<datalist> fed by /tracker/suggest) =====
+(function () {
+  const inputs = [
+    ...document.querySelectorAll('#filterForm input[name="q"]'),
+    ...document.querySelectorAll('input[name="tags"]'),
+  ];
+  if (!inputs.length) return;
+
+  const cache = new Map();   // query string -> suggestions
+  let seq = 0;
+
+  async function fetchSuggestions(params) {
+    const key = params.toString();
+    if (!cache.has(key)) {
+      const res = await fetch(`/tracker/suggest?${key}`, { headers: { 'X-Requested-With': 'fetch' } });
+      cache.set(key, res.ok ? (await res.json()).suggestions : []);
+    }
+    return cache.get(key);
+  }
+
+  inputs.forEach((inp, i) => {
+    const isTags = inp.name === 'tags';
+    const list = document.createElement('datalist');
+    list.id = `trackerSuggest${i}`;
+    inp.after(list);
+    inp.setAttribute('list', list.id);
+    inp.setAttribute('autocomplete', 'off');
+
+    let timer = null;
+    inp.addEventListener('input', () => {
+      clearTimeout(timer);
+      timer = setTimeout(async () => {
+        // tags are comma-separated: complete the last one, keep the rest as typed
+        const value = inp.value;
+        const cut = isTags ? value.lastIndexOf(',') + 1 : 0;
+        const head = value.slice(0, cut) + (cut && !/\s$/.test(value.slice(0, cut)) ? ' ' : '');
+        const prefix = value.slice(cut).trim();
+        if (!prefix) { list.innerHTML = ''; return; }
+
+        const params = new URLSearchParams({ prefix });
+        if (isTags) {
+          params.set('kind', 'tag');
+        } else {
+          params.set('type', inp.form.querySelector('input[name="type"]')?.value || '');
+        }
+        const mine = ++seq;
+        const found = await fetchSuggestions(params);
+        if (mine !== seq) return;   // a newer keystroke already answered
+        list.replaceChildren(...found.map(s => {
+          const opt = document.createElement('option');
+          opt.value = head + s.text;
+          opt.label = `${s.kind} · ${s.count}`;
+          return opt;
+        }));
+      }, 120);
+    });
+  });
+})();
+
 // --- Compact-on-scroll for the Panel Menu ---
 (function () {
   const menuBar = document.getElementById('panel-menu');
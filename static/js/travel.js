@@ -19,6 +19,30 @@
     }
   })();
 
+  // ---------- Open the trip named in the URL (#trip12, as linked from search results) ----------
+  (function openTripFromHash() {
+    const m = /^#(trip\d+)$/.exec(location.hash);
+    const el = m && document.getElementById(m[1]);
+    if (el && window.bootstrap) {
+      bootstrap.Modal.getOrCreateInstance(el).show();
+    }
+  })();
+
+  // ---------- Camera-roll import review: one pin per proposed trip (safe no-op if absent) ----------
+  (function importMap() {
+    const el = document.getElementById('importMap');
+    if (!el || typeof L === 'undefined') return;
+    const points = JSON.parse(el.dataset.points || '[]');
+    const m = L.map(el, { scrollWheelZoom: true, worldCopyJump: true }).setView([20, 0], 2);
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+      maxZoom: 19,
+      attribution: '&copy; OpenStreetMap contributors'
+    }).addTo(m);
+    const pins = points.map((p) => L.marker([p.lat, p.lon]).addTo(m)
+      .bindPopup(`<a href="#proposal-${p.cluster}">${escapeHtml(p.label)}</a>`));
+    if (pins.length) m.fitBounds(L.featureGroup(pins).getBounds().pad(0.2), { maxZoom: 12 });
+  })();
+
   // ---------- Main Leaflet map ----------
   const mapEl = document.getElementById('map');
   if (!mapEl || typeof L === 'undefined') return;
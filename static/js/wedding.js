@@ -57,6 +57,98 @@
   }, true); // capture phase
 
 
+  // Boards upload: the server answers with per-file results and tile HTML; new tiles go on top of the grid
+  document.addEventListener('submit', async (e) => {
+    const form = e.target;
+    if (!form.matches('form[data-board-upload]')) return;
+
+    e.preventDefault(); e.stopPropagation(); if (e.stopImmediatePropagation) e.stopImmediatePropagation();
+
+    const panel = form.closest('.w-panel');
+    const side = panel && panel.classList.contains('right') ? 'right' : 'left';
+    const content = form.closest('.board-content');
+    const status = content?.querySelector('.board-upload-status');
+    const btn = form.querySelector('button[type="submit"],button:not([type])');
+    if (btn) btn.disabled = true;
+    if (status) status.textContent = 'Uploading…';
+
+    try {
+      const r = await fetch(form.action, { method: 'POST', body: new FormData(form), credentials: 'same-origin' });
+      if (!r.ok) { if (status) status.textContent = r.status === 503 ? 'Server busy, try again in a moment.' : 'Upload failed.'; return; }
+      const data = await r.json();
+
+      // a fresh upload is never starred, so it has no place in a "Starred only" grid
+      const starredOnly = panel?.querySelector('.board-tabs')?.dataset.starred === '1';
+      const grid = content?.querySelector('.masonry');
+      if (grid && !starredOnly) {
+        const tmp = document.createElement('div');
+        tmp.innerHTML = data.results.filter(x => x.ok).map(x => x.html).join('');
+        const tiles = Array.from(tmp.querySelectorAll('.m-item'));
+        if (tiles.length) grid.querySelectorAll(':scope > .text-muted').forEach(el => el.remove());
+        tiles.forEach(el => { grid.prepend(el); wireEditableTitles(el); });  // last file ends on top, as ids sort
+      }
+
+      const failed = data.results.filter(x => !x.ok);
+      const warned = data.results.filter(x => x.ok && x.warning);
+      if (status) {
+        status.textContent = `Uploaded ${data.saved}` +
+          (failed.length ? ` — skipped ${failed.map(x => `${x.filename} (${x.error})`).join(', ')}` : '') +
+          (warned.length ? ` — check ${warned.map(x => `${x.filename} (${x.warning})`).join(', ')}` : '');
+      }
+      form.reset();
+      if (data.saved) flashPanelCheck(side);
+    } finally { if (btn) btn.disabled = false; }
+  }, true);
+
+
+  // Seating tools: JSON answers are shown in the panel's [data-seating-result] box
+  document.addEventListener('submit', async (e) => {
+    const form = e.target;
+    if (!form.matches('form[data-seating-json]')) return;
+
+    e.preventDefault(); e.stopPropagation(); if (e.stopImmediatePropagation) e.stopImmediatePropagation();
+
+    const panel = form.closest('.w-panel');
+    const side = panel && panel.classList.contains('right') ? 'right' : 'left';
+    const btn = form.querySelector('button[type="submit"],button:not([type])');
+    if (btn) btn.disabled = true;
+
+    try {
+      const r = await fetch(form.action, { method: 'POST', body: new FormData(form), credentials: 'same-origin' });
+      const data = await r.json().catch(() => ({ ok: false, error: `Request failed (${r.status})` }));
+
+      let message = data.error || '';
+      if (data.ok && 'added' in data) {
+        message = `Imported ${data.added} guests, ${data.duplicates} duplicates skipped` +
+          (data.skipped ? `, ${data.skipped} bad rows` : '') + (data.together ? `, ${data.together} together rules` : '');
+      } else if (data.ok && 'changed' in data) {
+        message = `Seating applied: ${data.changed} guests moved.`;
+      }
+      if (data.problems) message += ' ' + data.problems.join('; ');
+
+      if (data.ok && form.hasAttribute('data-reload-on-success')) {
+        await loadPanel(side, panel?.dataset.kind || 'seating');
+        flashPanelCheck(side);
+      }
+      const box = panel?.querySelector('[data-seating-result]');
+      if (box) {
+        if (data.html) { box.innerHTML = data.html; } else { box.textContent = message; }
+      }
+    } finally { if (btn && btn.isConnected) btn.disabled = false; }
+  }, true);
+
+
+  // Buttons that reload their panel with other query params (e.g. budget paging)
+  document.addEventListener('click', (e) => {
+    const btn = e.target.closest('[data-panel-params]');
+    if (!btn) return;
+    const panel = btn.closest('.w-panel'); if (!panel) return;
+    e.preventDefault();
+    const side = panel.classList.contains('right') ? 'right' : 'left';
+    loadPanel(side, panel.dataset.kind, Object.fromEntries(new URLSearchParams(btn.dataset.panelParams)));
+  });
+
+
   // Graceful AJAX delete for forms marked with data-ajax-delete
   document.addEventListener('submit', async (e) => {
     const form = e.target;
@@ -135,6 +227,7 @@
     if (kind === 'boards') {
       wireBoardTabs(E.body);
       wireEditableTitles(E.body);
+      wireBoardPaging(E.body);
       enableRipples(E.body);
     }
     enableRipples(E.body);
@@ -224,6 +317,7 @@ function wireBoardTabs(scope) {
 
       // features inside swapped content:
       wireEditableTitles(content);
+      wireBoardPaging(content);
       bindStarFilter(content, bar);
       enableRipples(content);
     }, { passive: false });
@@ -312,11 +406,43 @@ function bindStarFilter(content, bar) {
     // re-bind inside swapped content
     bindStarToggles(region);
     wireEditableTitles(region); // still need rename hooks
+    wireBoardPaging(region);
     bindStarFilter(region, bar);
     enableRipples(region);
   }, { passive: true });
 }
 
+// Boards: append the next page of tiles when the "load more" marker scrolls into view
+function wireBoardPaging(scope) {
+  const more = scope.querySelector('.board-more');
+  const grid = scope.querySelector('.masonry');
+  if (!more || !grid || more.dataset.wired) return;
+  more.dataset.wired = '1';
+
+  let busy = false;
+  const io = new IntersectionObserver((entries) => {
+    if (entries.some(en => en.isIntersecting)) load();
+  }, { rootMargin: '400px 0px' });
+
+  async function load() {
+    if (busy || !more.isConnected) { if (!more.isConnected) io.disconnect(); return; }
+    busy = true;
+    try {
+      const res = await fetch(more.dataset.moreUrl, { credentials: 'same-origin' });
+      if (!res.ok) return;
+      const tmp = document.createElement('div'); tmp.innerHTML = await res.text();
+      tmp.querySelectorAll('.m-item').forEach(el => { grid.appendChild(el); wireEditableTitles(el); });
+
+      io.disconnect();
+      const next = tmp.querySelector('.board-more');
+      if (next) { more.replaceWith(next); wireBoardPaging(scope); } else { more.remove(); }
+    } finally { busy = false; }
+  }
+
+  io.observe(more);
+  more.querySelector('button')?.addEventListener('click', load);
+}
+
 function slideSwap(container, newInnerHTML, dir) {
   const h = container.clientHeight;
   const slider = document.createElement('div'); slider.style.position = 'relative'; slider.style.overflow = 'hidden'; slider.style.height = h + 'px';
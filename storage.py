@@ -0,0 +1,165 @@
+"""
+Disk usage under UPLOAD_ROOT, kept in the storage_usage table.
+
+A file belongs to a section (its top-level dir: travel, tracker, wedding,
+homecards) and an entity (the next dir: trip id, item id, board bucket,
+card id), so "travel/12/thumbs/ab.jpg" counts towards ("travel", "12").
+
+Save paths call ``record(rel, ...)`` right after writing originals or
+derivatives. It stats the files and adds them with one upsert in the current
+session, so the counters commit (or roll back) with the rows that reference
+the files. A file overwritten in place (chapter PDFs, covers, cover thumbs)
+is counted once: take ``sizes()`` before writing and pass it as ``before``.
+
+Counters drift when files are removed outside the app or a request fails
+after writing; ``reconcile()`` recomputes every total from disk, walking the
+entity dirs on a thread pool (os.scandir/stat release the GIL), and replaces
+the table in one transaction.
+"""
+import os
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import repeat
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import uploads
+from models import db, StorageUsage
+
+
+def owner(rel) -> tuple[str, str]:
+    parts = str(rel).replace("\\", "/").strip("/").split("/")
+    if len(parts) == 1:
+        return "other", ""
+    if len(parts) == 2:
+        return parts[0], ""
+    return parts[0], parts[1]
+
+
+def sizes(*rels) -> dict:
+    """{rel: size} for the rels that already exist (call before overwriting them)."""
+    root = pathlib.Path(current_app.config["UPLOAD_ROOT"])
+    out = {}
+    for rel in rels:
+        if rel:
+            try:
+                out[str(rel)] = (root / rel).stat().st_size
+            except FileNotFoundError:
+                pass
+    return out
+
+
+def record(*rels, before: dict | None = None):
+    """Add just-written files (paths relative to UPLOAD_ROOT) to the counters; no commit."""
+    before = before or {}
+    root = pathlib.Path(current_app.config["UPLOAD_ROOT"])
+    deltas = {}
+    for rel in rels:
+        if not rel:
+            continue
+        try:
+            size = (root / rel).stat().st_size
+        except FileNotFoundError:
+            continue
+        old = before.get(str(rel))
+        key = owner(rel)
+        files, nbytes = deltas.get(key, (0, 0))
+        deltas[key] = (files + (old is None), nbytes + size - (old or 0))
+    adjust(deltas)
+
+
+def adjust(deltas: dict):
+    """Apply {(section, entity): (files, bytes)} changes with one upsert; no commit."""
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    stmt = sqlite_insert(StorageUsage).values([
+        {"section": s, "entity": e, "files": f, "bytes": b, "updated_at": now}
+        for (s, e), (f, b) in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StorageUsage.section, StorageUsage.entity],
+        set_={"files": StorageUsage.files + stmt.excluded.files,
+              "bytes": StorageUsage.bytes + stmt.excluded.bytes,
+              "updated_at": stmt.excluded.updated_at},
+    )
+    db.session.execute(stmt)
+
+
+# ---------------- Reading ----------------
+def sections() -> list:
+    """(section, entities, files, bytes) per section, biggest first."""
+    return db.session.execute(
+        select(StorageUsage.section, func.count(), func.sum(StorageUsage.files), func.sum(StorageUsage.bytes))
+        .group_by(StorageUsage.section).order_by(func.sum(StorageUsage.bytes).desc())
+    ).all()
+
+
+def largest(section: str, limit: int = 20) -> list:
+    """The section's biggest entities (ix_storage_usage_section_bytes)."""
+    return (StorageUsage.query.filter(StorageUsage.section == section, StorageUsage.bytes > 0)
+            .order_by(StorageUsage.bytes.desc()).limit(limit).all())
+
+
+# ---------------- Reconcile ----------------
+def _walk(root: str, rel_dir: str) -> tuple[int, int]:
+    files = nbytes = 0
+    for _, entry in uploads.iter_upload_files(os.path.join(root, rel_dir)):
+        files += 1
+        nbytes += entry.stat(follow_symlinks=False).st_size
+    return files, nbytes
+
+
+def _top_entries(root: str):
+    """Files in the top two levels and the entity dirs below them (dot dirs skipped)."""
+    with os.scandir(root) as top:
+        for sec in top:
+            if sec.name.startswith("."):
+                continue
+            if not sec.is_dir(follow_symlinks=False):
+                if sec.is_file(follow_symlinks=False):
+                    yield sec.name, sec
+                continue
+            with os.scandir(sec.path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False) or entry.is_file(follow_symlinks=False):
+                        yield f"{sec.name}/{entry.name}", entry
+
+
+def scan(root, workers: int = 4) -> dict:
+    """{(section, entity): (files, bytes)} computed from disk."""
+    root = str(root)
+    totals, subdirs = {}, []
+    for rel, entry in _top_entries(root):
+        if entry.is_dir(follow_symlinks=False):
+            subdirs.append((tuple(rel.split("/")), rel))  # section/entity dir
+        else:
+            key = owner(rel)
+            files, nbytes = totals.get(key, (0, 0))
+            totals[key] = (files + 1, nbytes + entry.stat(follow_symlinks=False).st_size)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        counted = pool.map(_walk, repeat(root), [rel for _, rel in subdirs])
+        for (key, _), (files, nbytes) in zip(subdirs, counted):
+            f0, b0 = totals.get(key, (0, 0))
+            totals[key] = (f0 + files, b0 + nbytes)
+    return totals
+
+
+def reconcile(root, workers: int = 4) -> dict:
+    """Replace storage_usage with totals from disk and commit; returns drift stats."""
+    totals = scan(root, workers)
+    old = {(u.section, u.entity): (u.files, u.bytes) for u in StorageUsage.query.all()}
+    drift = sum(1 for k in set(old) | set(totals) if old.get(k, (0, 0)) != totals.get(k, (0, 0)))
+    now = datetime.utcnow()
+    db.session.execute(delete(StorageUsage))
+    if totals:
+        db.session.execute(insert(StorageUsage), [
+            {"section": s, "entity": e, "files": f, "bytes": b, "updated_at": now}
+            for (s, e), (f, b) in totals.items()])
+    db.session.commit()
+    return {"entities": len(totals), "drifted": drift,
+            "files": sum(f for f, _ in totals.values()), "bytes": sum(b for _, b in totals.values()),
+            "previous_bytes": sum(b for _, b in old.values())}
@@ -0,0 +1,144 @@
+"""
+Tag and title autocomplete for the tracker.
+
+Each process keeps a prefix index of tracker tags and titles. It is a
+sorted array of lower-cased keys searched with bisect: the entries starting
+with a prefix are one contiguous slice, and the best suggestions are the
+heaviest entries in it. A tag weighs the number of items carrying it, a
+title the number of items with that title. Every word start of an entry
+is a key, so "sto" finds "Kyoto Stories". Short prefixes can cover much
+of the array, so the answers for every prefix matching more than
+SCAN_LIMIT keys are worked out once at build time instead of being
+scanned per keystroke.
+
+There is one index for all items and one per media type, per kind. The
+weights come from a single query, reloaded when the "tracker"
+data_version moves (see versions.py); each index is built from them the
+first time it is asked for. An unchanged library costs one primary-key
+lookup per request, then a bisect.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from sqlalchemy import select
+
+from models import db, Item
+import versions
+
+MAX_RESULTS = 20
+SCAN_LIMIT = 256        # prefixes matching more keys than this get their top entries precomputed
+KINDS = ("tag", "title")
+_TOP = "\U0010ffff"     # sorts after any character: keys starting with p lie in [p, p + _TOP)
+
+
+def _norm(s: str) -> str:
+    return " ".join(s.casefold().split())
+
+
+def _keys(text: str) -> list[str]:
+    """Normalised text from every word start ("kyoto stories", "stories")."""
+    norm = _norm(text)
+    keys, i = [norm], norm.find(" ")
+    while i != -1:
+        keys.append(norm[i + 1:])
+        i = norm.find(" ", i + 1)
+    return keys
+
+
+def split_tags(raw: str | None) -> list[str]:
+    """Item.tags is comma-separated and stored as typed; tags compare lower-cased."""
+    return [t for t in (part.strip().lower() for part in (raw or "").split(",")) if t]
+
+
+class PrefixIndex:
+    """
+    Sorted keys, each with the rank of its text (0 = heaviest, ties
+    alphabetical), so the best texts for a prefix are the smallest ranks
+    in its slice. Slices longer than SCAN_LIMIT have their answer stored
+    in ``top``; every longer slice's prefix is reached from a shorter one,
+    so only short slices are ever scanned per request.
+    """
+
+    def __init__(self, weights: dict):
+        self.texts = sorted(weights, key=lambda t: (-weights[t], t.casefold()))
+        self.counts = [weights[t] for t in self.texts]
+        entries = sorted((key, rank) for rank, text in enumerate(self.texts) for key in _keys(text) if key)
+        self.keys = [k for k, _ in entries]
+        self.ranks = [r for _, r in entries]
+        self.top = {}
+        stack = [(0, len(self.keys), 0)]    # slices whose keys share their first `depth` characters
+        while stack:
+            lo, hi, depth = stack.pop()
+            i = lo
+            while i < hi:
+                if len(self.keys[i]) <= depth:
+                    i += 1
+                    continue
+                head = self.keys[i][:depth + 1]
+                j = bisect_left(self.keys, head + _TOP, i, hi)
+                if j - i > SCAN_LIMIT:
+                    self.top[head] = self._best(i, j, MAX_RESULTS)
+                    stack.append((i, j, depth + 1))
+                i = j
+
+    def _best(self, lo: int, hi: int, limit: int) -> list[int]:
+        # a text can sit under several of its word starts
+        return sorted(set(self.ranks[lo:hi]))[:limit]
+
+    def search(self, prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+        prefix = _norm(prefix)
+        if not prefix:
+            return []
+        best = self.top.get(prefix)
+        if best is None:
+            lo = bisect_left(self.keys, prefix)
+            best = self._best(lo, bisect_left(self.keys, prefix + _TOP, lo), limit)
+        return [(self.texts[r], self.counts[r]) for r in best[:limit]]
+
+
+class _Suggestions:
+    """
+    The process's tag and title weights, {(media type or "", kind): Counter},
+    reloaded when the data version moves; each scope's PrefixIndex is built
+    the first time it is asked for.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key = None           # (database, version) the weights were loaded at
+        self.weights = {}
+        self.indexes = {}
+
+    def _load(self):
+        weights = defaultdict(Counter)
+        for media_type, title, tags in db.session.execute(select(Item.media_type, Item.title, Item.tags)):
+            for scope in ("", media_type):
+                weights[scope, "title"][title.strip()] += 1
+                weights[scope, "tag"].update(split_tags(tags))
+        return weights
+
+    def indexes_for(self, scopes) -> list:
+        """PrefixIndex per (media type, kind) scope, after one data_version check."""
+        key = (str(db.engine.url), versions.current("tracker"))
+        with self.lock:
+            if key != self.key:
+                self.weights, self.indexes, self.key = self._load(), {}, key
+            for scope in scopes:
+                if scope not in self.indexes:
+                    self.indexes[scope] = PrefixIndex(self.weights.get(scope, {}))
+            return [self.indexes[scope] for scope in scopes]
+
+    def search(self, prefix: str, media_type: str = "", kinds=KINDS, limit: int = 10) -> list[dict]:
+        indexes = self.indexes_for([(media_type, kind) for kind in kinds])
+        found = [(text, n, kind) for kind, index in zip(kinds, indexes) for text, n in index.search(prefix, limit)]
+        found.sort(key=lambda f: (-f[1], f[0].casefold()))
+        return [{"text": text, "kind": kind, "count": n} for text, n, kind in found[:limit]]
+
+
+_suggestions = _Suggestions()
+
+
+def suggest(prefix: str, media_type: str = "", kinds=KINDS, limit: int = 10) -> list[dict]:
+    """[{"text", "kind": "tag"|"title", "count"}, ...], heaviest first, for a typed prefix."""
+    return _suggestions.search(prefix, media_type, kinds, min(limit, MAX_RESULTS))
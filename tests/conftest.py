@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, ensure_schema  # noqa: E402
+from config import TestConfig  # noqa: E402
+from models import (  # noqa: E402
+    db, User, Item, Chapter, ItemComment, Trip, Photo, Comment, CommentReaction, WeddingItem,
+)
+
+# Two data sizes: a view whose statement count differs between them has an N+1.
+SIZES = (3, 30)
+
+
+def seed(n: int):
+    """n books (chapter, comments, reactions), n trips (photos, comments, reactions), n of each wedding kind."""
+    admin = User(username="admin", password_hash=generate_password_hash("pw", method="pbkdf2:sha256:1"),
+                 is_admin=True, can_travel_edit=True, can_approve_users=True)
+    db.session.add(admin)
+    db.session.flush()
+    for i in range(n):
+        it = Item(title=f"Book {i:04d}", media_type="book", tags=f"tag{i % 7}, shared", notes="n")
+        db.session.add(it)
+        db.session.flush()
+        db.session.add(Chapter(item_id=it.id, number=1, source_path=f"tracker/{it.id}/chapters/ch-001.pdf"))
+        for j in range(2):
+            ic = ItemComment(item_id=it.id, user_id=admin.id, author="admin", body=f"c{j}")
+            db.session.add(ic)
+            db.session.flush()
+            db.session.add(CommentReaction(kind="item", comment_id=ic.id, user_id=admin.id, value=1))
+
+        trip = Trip(title=f"Trip {i}", address="somewhere", lat=10 + i * 0.01, lon=20.0)
+        db.session.add(trip)
+        db.session.flush()
+        for j in range(2):
+            db.session.add(Photo(trip_id=trip.id, stored_path=f"travel/{trip.id}/{j}.jpg",
+                                 thumb_path=f"travel/{trip.id}/thumbs/{j}.jpg"))
+            c = Comment(trip_id=trip.id, user_id=admin.id, author="admin", body=f"c{j}")
+            db.session.add(c)
+            db.session.flush()
+            db.session.add(CommentReaction(kind="trip", comment_id=c.id, user_id=admin.id, value=-1))
+
+        for kind in ("idea", "link", "ring", "cake", "photo", "vendor", "venue"):
+            db.session.add(WeddingItem(kind=kind, title=f"{kind} {i}", url="https://example.com",
+                                       image_path=f"wedding/x/{i}.jpg"))
+    db.session.commit()
+
+
+@pytest.fixture(scope="session", params=SIZES, ids=lambda n: f"n={n}")
+def seeded_client(request, tmp_path_factory):
+    """A logged-in admin client on an in-memory app seeded at each of SIZES."""
+    app = create_app({**{k: getattr(TestConfig, k) for k in dir(TestConfig) if k.isupper()},
+                      "UPLOAD_ROOT": str(tmp_path_factory.mktemp("uploads"))})
+    ensure_schema(app)
+    with app.app_context():
+        seed(request.param)
+    client = app.test_client()
+    client.post("/login", data={"username": "admin", "password": "pw"})
+    yield client
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
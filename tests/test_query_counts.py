@@ -0,0 +1,25 @@
+"""
+N+1 guard: each view runs the same number of SQL statements whatever the
+data size (see conftest.SIZES). When a view legitimately gains or loses a
+query, update its count here and its @query_budget together.
+"""
+import pytest
+
+from metrics import count_queries
+
+QUERY_COUNTS = {
+    "/tracker?type=book": 6,
+    "/tracker/rows?type=book": 2,
+    "/travel": 6,
+    "/api/trips": 1,
+    "/wedding": 3,
+    "/tracker/tags": 3,
+}
+
+
+@pytest.mark.parametrize("url, expected", QUERY_COUNTS.items(), ids=list(QUERY_COUNTS))
+def test_query_count(seeded_client, url, expected):
+    with count_queries() as counter:
+        resp = seeded_client.get(url)
+    assert resp.status_code == 200
+    assert counter.count == expected, "\n".join(counter.statements)
@@ -0,0 +1,338 @@
+"""
+GPX/TCX activity import for the fitness log.
+
+Parsing streams: ElementTree.iterparse reads the file in chunks and each
+trackpoint is dropped from its parent as soon as it has been read, so memory
+holds only the packed output arrays (about 20 bytes a point), never the XML
+tree. Points go straight into array('i') microdegrees, array('I') second
+offsets and array('f') elevation/heart rate/cadence/power, with NaN for
+missing readings. Points without a position (TCX pause markers) are skipped.
+
+Distance is haversine between consecutive points, in one pass over the
+arrays. Where every TCX point has the device's DistanceMeters, that is used
+instead. Speed is distance over a SPEED_WINDOW_S sliding window. Elevation
+gain only counts climbs bigger than ELEVATION_NOISE_M, so GPS jitter doesn't
+add up. The time series go to workouts.add_session() as samples.
+
+The map route is stored pre-simplified as Google encoded polylines, one per
+tolerance in ROUTE_TOLERANCES_M (fine for zoomed-in views, coarse for the
+overview). Each level is a radial-distance prefilter plus iterative
+Douglas-Peucker on a local equirectangular projection, run on the previous
+level's output. Maps fetch a few hundred to a few thousand points, never the
+raw track.
+"""
+import gzip
+import math
+from array import array
+from datetime import datetime
+from xml.etree.ElementTree import ParseError, iterparse
+
+from sqlalchemy import case, func
+
+import workouts
+from models import db, WorkoutRoute, WorkoutSession
+
+EARTH_RADIUS_M = 6371008.8
+ROUTE_TOLERANCES_M = (5, 25, 100)
+SPEED_WINDOW_S = 10
+ELEVATION_NOISE_M = 3.0
+MAX_POINTS = workouts.MAX_SAMPLES
+NAN = float("nan")
+
+# sport / <type> keywords -> workouts.ACTIVITIES
+SPORTS = {"run": "run", "running": "run", "jog": "run", "bike": "ride", "biking": "ride", "cycling": "ride",
+          "ride": "ride", "walk": "walk", "walking": "walk", "hike": "hike", "hiking": "hike",
+          "swim": "swim", "swimming": "swim"}
+
+
+class Track:
+    def __init__(self):
+        self.lat = array("i")     # microdegrees
+        self.lon = array("i")
+        self.t = array("I")       # seconds since the first point (empty unless every point has a time)
+        self.ele = array("f")
+        self.hr = array("f")
+        self.cad = array("f")
+        self.power = array("f")
+        self.device_dist = array("f")
+        self.started_at = None
+        self.untimed = False
+        self.sport = None
+        self.name = None
+
+    def __len__(self):
+        return len(self.lat)
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _time(text):
+    try:
+        return datetime.fromisoformat(text.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _open(fh):
+    head = fh.read(2)
+    fh.seek(0)
+    return gzip.GzipFile(fileobj=fh) if head == b"\x1f\x8b" else fh
+
+
+def parse(fh) -> Track:
+    """Read a GPX or TCX file (optionally gzipped) from a binary handle. Raises ValueError."""
+    tr = Track()
+    stack, point, names = [], None, {}
+    try:
+        for event, el in iterparse(_open(fh), events=("start", "end")):
+            tag = names.get(el.tag) or names.setdefault(el.tag, _local(el.tag))
+            if event == "start":
+                stack.append(el)
+                if tag in ("trkpt", "Trackpoint"):
+                    point = {"lat": el.get("lat"), "lon": el.get("lon")}
+                elif tag == "Activity" and el.get("Sport"):
+                    tr.sport = el.get("Sport")
+                continue
+            stack.pop()
+            if point is not None:
+                if tag in ("trkpt", "Trackpoint"):
+                    _add_point(tr, point)
+                    point = None
+                    if stack:
+                        del stack[-1][-1]   # drop the finished point from its parent: constant memory
+                    if len(tr) > MAX_POINTS:
+                        raise ValueError(f"more than {MAX_POINTS} trackpoints")
+                elif tag in ("LatitudeDegrees", "LongitudeDegrees"):
+                    point["lat" if tag[1] == "a" else "lon"] = el.text
+                elif tag in ("ele", "AltitudeMeters"):
+                    point["ele"] = el.text
+                elif tag in ("time", "Time"):
+                    point["time"] = el.text
+                elif tag == "hr" or (tag == "Value" and names[stack[-1].tag] == "HeartRateBpm"):
+                    point["hr"] = el.text
+                elif tag in ("cad", "Cadence", "RunCadence"):
+                    point["cad"] = el.text
+                elif tag in ("power", "Watts"):
+                    point["power"] = el.text
+                elif tag == "DistanceMeters":
+                    point["dist"] = el.text
+            elif tag == "type" and tr.sport is None:
+                tr.sport = (el.text or "").strip()
+            elif tag == "name" and el.text and (tr.name is None or names[stack[-1].tag] == "trk"):
+                tr.name = el.text.strip()[:200]     # the track's own name wins over the file's metadata
+    except (ParseError, EOFError, OSError) as e:
+        raise ValueError(f"not a readable GPX/TCX file ({e})") from None
+    if len(tr) < 2:
+        raise ValueError("no track points with positions found")
+    if tr.untimed:
+        tr.t = array("I")
+    return tr
+
+
+def _add_point(tr: Track, p: dict):
+    lat, lon = _float(p.get("lat")), _float(p.get("lon"))
+    if math.isnan(lat) or math.isnan(lon) or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return
+    when = _time(p.get("time"))
+    if when is None or (tr.started_at is None and len(tr)):
+        tr.untimed = True       # any point without a time: the file gets no time axis
+    elif not tr.untimed:
+        tr.started_at = tr.started_at or when
+        offset = max(0, round((when - tr.started_at).total_seconds()))
+        tr.t.append(max(offset, tr.t[-1]) if tr.t else offset)   # clock stepping back keeps the axis ascending
+    tr.lat.append(round(lat * 1e6))
+    tr.lon.append(round(lon * 1e6))
+    tr.ele.append(_float(p.get("ele")))
+    tr.hr.append(_float(p.get("hr")))
+    tr.cad.append(_float(p.get("cad")))
+    tr.power.append(_float(p.get("power")))
+    tr.device_dist.append(_float(p.get("dist")))
+
+
+# ---------------- Metrics ----------------
+def cumulative_distance(lat_e6, lon_e6) -> array:
+    """Running haversine distance in metres, one value per point."""
+    out = array("f", [0.0])
+    total = 0.0
+    to_rad = math.pi / 180e6
+    sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+    prev_lat, prev_lon = lat_e6[0] * to_rad, lon_e6[0] * to_rad
+    prev_cos = cos(prev_lat)
+    for la, lo in zip(lat_e6[1:], lon_e6[1:]):
+        la, lo = la * to_rad, lo * to_rad
+        c = cos(la)
+        a = sin((la - prev_lat) / 2) ** 2 + prev_cos * c * sin((lo - prev_lon) / 2) ** 2
+        total += 2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(a)))
+        out.append(total)
+        prev_lat, prev_lon, prev_cos = la, lo, c
+    return out
+
+
+def speeds(t, dist, window: int = SPEED_WINDOW_S) -> array:
+    """m/s at each point: distance covered over the surrounding `window` seconds."""
+    out = array("f")
+    n, lo, hi = len(t), 0, 0
+    half = window / 2
+    for i in range(n):
+        while t[lo] < t[i] - half:
+            lo += 1
+        while hi + 1 < n and t[hi + 1] <= t[i] + half:
+            hi += 1
+        dt = t[hi] - t[lo]
+        out.append((dist[hi] - dist[lo]) / dt if dt > 0 else NAN)
+    return out
+
+
+def elevation_gain(ele, noise: float = ELEVATION_NOISE_M) -> float | None:
+    gain, ref = 0.0, None
+    for e in ele:
+        if math.isnan(e):
+            continue
+        if ref is None or e < ref:
+            ref = e
+        elif e - ref >= noise:
+            gain += e - ref
+            ref = e
+    return round(gain, 1) if ref is not None else None
+
+
+# ---------------- Simplification ----------------
+def _project(lat_e6, lon_e6):
+    """Local equirectangular metres around the track's mean latitude (fine at activity scale)."""
+    mean_lat = sum(lat_e6) / len(lat_e6) / 1e6
+    k = math.pi / 180e6 * EARTH_RADIUS_M
+    kx = k * math.cos(math.radians(mean_lat))
+    return [lo * kx for lo in lon_e6], [la * k for la in lat_e6]
+
+
+def _radial(idx, xs, ys, tol):
+    """Drop points closer than tol to the last kept one (cheap pre-pass for DP)."""
+    t2 = tol * tol
+    keep = [idx[0]]
+    px, py = xs[idx[0]], ys[idx[0]]
+    for i in idx[1:-1]:
+        dx, dy = xs[i] - px, ys[i] - py
+        if dx * dx + dy * dy > t2:
+            keep.append(i)
+            px, py = xs[i], ys[i]
+    keep.append(idx[-1])
+    return keep
+
+
+def douglas_peucker(idx, xs, ys, tol):
+    """Indices (a subset of idx, in order) kept by Douglas-Peucker; iterative, no recursion limit."""
+    if len(idx) < 3:
+        return list(idx)
+    keep = bytearray(len(idx))
+    keep[0] = keep[-1] = 1
+    t2 = tol * tol
+    stack = [(0, len(idx) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[idx[first]], ys[idx[first]]
+        dx, dy = xs[idx[last]] - ax, ys[idx[last]] - ay
+        seg2 = dx * dx + dy * dy
+        worst, worst_d2 = None, t2
+        for j in range(first + 1, last):
+            px, py = xs[idx[j]] - ax, ys[idx[j]] - ay
+            if seg2:
+                u = (px * dx + py * dy) / seg2
+                u = 0.0 if u < 0 else 1.0 if u > 1 else u
+                ex, ey = px - u * dx, py - u * dy
+            else:
+                ex, ey = px, py
+            d2 = ex * ex + ey * ey
+            if d2 > worst_d2:
+                worst, worst_d2 = j, d2
+        if worst is not None:
+            keep[worst] = 1
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return [i for i, k in zip(idx, keep) if k]
+
+
+def encode_polyline(lat_e6, lon_e6, idx) -> str:
+    """Google encoded polyline (precision 5) of the points at idx."""
+    out, prev_lat, prev_lon = [], 0, 0
+    for i in idx:
+        la, lo = round(lat_e6[i] / 10), round(lon_e6[i] / 10)
+        for delta in (la - prev_lat, lo - prev_lon):
+            v = ~(delta << 1) if delta < 0 else delta << 1
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1f)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lon = la, lo
+    return "".join(out)
+
+
+def simplify(tr: Track, tolerances=ROUTE_TOLERANCES_M) -> list[tuple[int, list]]:
+    """[(tolerance_m, indices), ...], finest first; each level simplifies the previous one."""
+    xs, ys = _project(tr.lat, tr.lon)
+    idx = list(range(len(tr)))
+    levels = []
+    for tol in sorted(tolerances):
+        idx = douglas_peucker(_radial(idx, xs, ys, tol), xs, ys, tol)
+        levels.append((tol, idx))
+    return levels
+
+
+# ---------------- Import ----------------
+def activity_for(tr: Track, fallback: str = "other") -> str:
+    sport = (tr.sport or "").strip().lower()
+    for word, activity in SPORTS.items():
+        if word in sport:
+            return activity
+    return fallback
+
+
+def import_track(user_id: int, fh, activity: str | None = None, title: str | None = None,
+                 source: str = "gpx", source_ref: str | None = None):
+    """
+    Parse fh and add the session, its samples and its routes; no commit.
+    activity=None takes it from the file. Raises ValueError.
+    """
+    tr = parse(fh)
+    dist = cumulative_distance(tr.lat, tr.lon)
+    if not any(math.isnan(d) for d in tr.device_dist):
+        dist = tr.device_dist
+    timed = len(tr.t) == len(tr)
+    samples = None
+    if timed:
+        samples = {"t": tr.t, "distance": dist, "speed": speeds(tr.t, dist), "elevation": tr.ele,
+                   "heart_rate": tr.hr, "cadence": tr.cad, "power": tr.power}
+        samples = {name: values.tolist() for name, values in samples.items()
+                   if name == "t" or not all(math.isnan(v) for v in values)}
+
+    ws = workouts.add_session(
+        user_id, activity or activity_for(tr), tr.started_at or datetime.now(),
+        duration_s=tr.t[-1] if timed else 0, distance_m=round(float(dist[-1]), 1),
+        title=title or tr.name, source=source, source_ref=source_ref,
+        elevation_gain_m=elevation_gain(tr.ele), samples=samples)
+
+    for tol, idx in simplify(tr):
+        db.session.add(WorkoutRoute(session_id=ws.id, tolerance_m=tol, n=len(idx),
+                                    polyline=encode_polyline(tr.lat, tr.lon, idx)))
+    return ws, len(tr)
+
+
+def already_imported(user_id: int, source_ref: str) -> WorkoutSession | None:
+    return WorkoutSession.query.filter_by(user_id=user_id, source_ref=source_ref).first()
+
+
+def route(session_id: int, tolerance_m: int | None = None) -> WorkoutRoute | None:
+    """The stored route closest to tolerance_m without being finer (else the coarsest); default the finest."""
+    q = WorkoutRoute.query.filter_by(session_id=session_id)
+    if tolerance_m is None:
+        return q.order_by(WorkoutRoute.tolerance_m).first()
+    return q.order_by(case((WorkoutRoute.tolerance_m >= tolerance_m, 0), else_=1),
+                      func.abs(WorkoutRoute.tolerance_m - tolerance_m)).first()
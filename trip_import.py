@@ -0,0 +1,337 @@
+"""
+Trips proposed from a camera-roll upload.
+
+``stage()`` moves an ingested batch under travel/imports/<batch id>/ and
+reads each photo's EXIF DateTimeOriginal and GPS position. Pillow parses only
+the header for this, never the pixels, so thousands of photos take seconds.
+``recluster()`` then groups the batch into proposed trips. No geocoding is
+involved: a proposal's pin is the centroid of its photos.
+
+Clustering is single linkage in space and time. Two photos are neighbours
+when they are within TRIP_CLUSTER_KM of each other and TRIP_CLUSTER_GAP_HOURS
+apart, and a trip is a connected group of neighbours. Photos go into a grid
+of cells small enough that any two photos in one cell are within the
+distance, each cell holding its photos sorted by time. Inside a cell,
+linking time-consecutive photos is enough. Across cells, a photo only looks
+at the 5x5 block around it, inside its time window (bisect), and stops at
+the first match per cell. A batch never compares every pair.
+
+Photos with a position but no time join the nearest trip within
+TRIP_CLUSTER_KM. Photos with a time but no position join the trip whose time
+span (plus the gap) covers them. Trips with fewer than
+TRIP_CLUSTER_MIN_PHOTOS located photos, and anything else, are left "not
+placed".
+
+``commit()`` turns the chosen proposals into Trip rows with lat/lon set and
+moves their photos into travel/<trip id>/ exactly like a normal upload. Photos
+not committed stay in the batch until it is discarded.
+"""
+import math
+import os
+import pathlib
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, update
+
+import jobs
+import storage
+from models import db, Photo, Trip, TripImport, TripImportPhoto
+
+EARTH_RADIUS_KM = 6371.0088
+PREVIEW_PHOTOS = 8
+
+# EXIF tags
+_EXIF_IFD, _GPS_IFD = 0x8769, 0x8825
+_DATETIME_ORIGINAL, _DATETIME = 36867, 306
+_GPS_LAT_REF, _GPS_LAT, _GPS_LON_REF, _GPS_LON = 1, 2, 3, 4
+
+
+def _batch_dir(batch_id: int) -> str:
+    return f"travel/imports/{batch_id}"
+
+
+# ---------------- EXIF ----------------
+def _degrees(dms, ref) -> float | None:
+    try:
+        d, m, s = (float(x) for x in dms)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    value = d + m / 60 + s / 3600
+    if not math.isfinite(value):
+        return None
+    return -value if str(ref).strip().upper() in ("S", "W") else value
+
+
+def read_exif(fh) -> tuple[datetime | None, float | None, float | None]:
+    """(taken_at, lat, lon) from a photo's EXIF header; None for anything missing or unreadable."""
+    from PIL import Image, UnidentifiedImageError  # deferred: only upload paths pay for Pillow
+    try:
+        with Image.open(fh) as im:
+            exif = im.getexif()
+            when = exif.get_ifd(_EXIF_IFD).get(_DATETIME_ORIGINAL) or exif.get(_DATETIME)
+            gps = exif.get_ifd(_GPS_IFD)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None, None, None
+    taken_at = None
+    if isinstance(when, str):
+        try:
+            taken_at = datetime.strptime(when.strip()[:19], "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            pass
+    lat = _degrees(gps.get(_GPS_LAT), gps.get(_GPS_LAT_REF, "N"))
+    lon = _degrees(gps.get(_GPS_LON), gps.get(_GPS_LON_REF, "E"))
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        lat = lon = None   # 0,0 is what many cameras write without a fix
+    return taken_at, lat, lon
+
+
+# ---------------- Clustering ----------------
+def _km(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell(lat, lon, size) -> tuple[int, int]:
+    y = math.radians(lat) * EARTH_RADIUS_KM
+    x = math.radians(lon) * EARTH_RADIUS_KM * math.cos(math.radians(lat))
+    return math.floor(x / size), math.floor(y / size)
+
+
+def cluster(points, km: float, gap_hours: float, min_photos: int = 1) -> list:
+    """
+    points: [(taken_at | None, lat | None, lon | None), ...]. Returns one label
+    per point: 0, 1, ... numbered by start time, or None for not placed.
+    """
+    n = len(points)
+    gap = gap_hours * 3600
+    size = km / math.sqrt(2)    # any two photos in one cell are within km; a neighbour is at most 2 cells away
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    located = [i for i, (t, la, lo) in enumerate(points) if la is not None]
+    timed_located = sorted((i for i in located if points[i][0] is not None), key=lambda i: points[i][0])
+    cells = {}     # (cx, cy) -> ([seconds...], [index...]), both in time order
+    for i in timed_located:
+        t, la, lo = points[i]
+        ts, idx = cells.setdefault(_cell(la, lo, size), ([], []))
+        ts.append(t.timestamp())
+        idx.append(i)
+
+    # within a cell: consecutive photos no more than the gap apart
+    for ts, idx in cells.values():
+        for k in range(1, len(ts)):
+            if ts[k] - ts[k - 1] <= gap:
+                parent[find(idx[k])] = find(idx[k - 1])
+
+    # across cells: photos in another cell's [t, t + gap] window are already one chain there,
+    # so the first one within km is enough
+    for (cx, cy), (ts, idx) in cells.items():
+        for t, i in zip(ts, idx):
+            la, lo = points[i][1], points[i][2]
+            for dx in range(-2, 3):
+                for dy in range(-2, 3):
+                    other = cells.get((cx + dx, cy + dy)) if dx or dy else None
+                    if other is None:
+                        continue
+                    ots, oidx = other
+                    for k in range(bisect_left(ots, t), bisect_right(ots, t + gap)):
+                        j = oidx[k]
+                        if find(i) == find(j):
+                            break
+                        if _km(la, lo, points[j][1], points[j][2]) <= km:
+                            parent[find(j)] = find(i)
+                            break
+
+    groups = {}
+    for i in timed_located:
+        groups.setdefault(find(i), []).append(i)
+    groups = sorted((g for g in groups.values() if len(g) >= min_photos), key=lambda g: points[g[0]][0])
+    labels = [None] * n
+    for label, g in enumerate(groups):
+        for i in g:
+            labels[i] = label
+
+    # located but untimed: the nearest placed photo within km
+    anchors = {}
+    for i in timed_located:
+        if labels[i] is not None:
+            anchors.setdefault(_cell(points[i][1], points[i][2], size), []).append(i)
+    for i in located:
+        if points[i][0] is not None:
+            continue
+        la, lo = points[i][1], points[i][2]
+        cx, cy = _cell(la, lo, size)
+        best, best_km = None, km
+        for dx in range(-2, 3):
+            for dy in range(-2, 3):
+                for j in anchors.get((cx + dx, cy + dy), ()):
+                    d = _km(la, lo, points[j][1], points[j][2])
+                    if d <= best_km:
+                        best, best_km = j, d
+        if best is not None:
+            labels[i] = labels[best]
+
+    # timed but unlocated: the trip whose span (plus the gap) covers the time, nearest middle first
+    spans = [(points[g[0]][0].timestamp() - gap, points[g[-1]][0].timestamp() + gap) for g in groups]
+    for i, (t, la, lo) in enumerate(points):
+        if la is not None or t is None:
+            continue
+        ts = t.timestamp()
+        covering = [(abs(ts - (a + b) / 2), label) for label, (a, b) in enumerate(spans) if a <= ts <= b]
+        if covering:
+            labels[i] = min(covering)[1]
+    return labels
+
+
+def centroid(coords) -> tuple[float, float]:
+    """Mean position of (lat, lon) pairs on the sphere (fine across the antimeridian)."""
+    x = y = z = 0.0
+    for la, lo in coords:
+        p, l = math.radians(la), math.radians(lo)
+        x += math.cos(p) * math.cos(l)
+        y += math.cos(p) * math.sin(l)
+        z += math.sin(p)
+    return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))
+
+
+# ---------------- Batches ----------------
+def stage(batch: TripImport, files) -> tuple[int, int]:
+    """Move ingested photos into the batch dir and add their rows with EXIF data; no commit. Returns (added, skipped)."""
+    root = pathlib.Path(current_app.config["UPLOAD_ROOT"])
+    rows, skipped = [], 0
+    for f in files:
+        if not f.looks_like_image():
+            skipped += 1
+            continue
+        taken_at, lat, lon = read_exif(f.open())
+        rel = f"{_batch_dir(batch.id)}/{uuid.uuid4().hex}{f.safe_ext}"
+        f.move_to(root / rel)
+        rows.append(TripImportPhoto(import_id=batch.id, stored_path=rel, original_name=f.filename,
+                                    mime_type=f.mimetype, size_bytes=f.size,
+                                    taken_at=taken_at, lat=lat, lon=lon))
+    db.session.add_all(rows)
+    storage.record(*(r.stored_path for r in rows))
+    return len(rows), skipped
+
+
+def recluster(batch: TripImport) -> int:
+    """Assign every photo in the batch to a proposal (or none); no commit. Returns the number of proposals."""
+    rows = db.session.execute(
+        db.select(TripImportPhoto.id, TripImportPhoto.taken_at, TripImportPhoto.lat, TripImportPhoto.lon)
+        .where(TripImportPhoto.import_id == batch.id)
+    ).all()
+    cfg = current_app.config
+    labels = cluster([(r.taken_at, r.lat, r.lon) for r in rows], cfg["TRIP_CLUSTER_KM"],
+                     cfg["TRIP_CLUSTER_GAP_HOURS"], cfg["TRIP_CLUSTER_MIN_PHOTOS"])
+    if rows:
+        db.session.execute(update(TripImportPhoto),
+                           [{"id": r.id, "cluster": label} for r, label in zip(rows, labels)])
+    return len({label for label in labels if label is not None})
+
+
+def _date_range(start: datetime | None, end: datetime | None) -> str:
+    if start is None:
+        return "Undated"
+    if start.date() == end.date():
+        return f"{start:%b} {start.day}, {start.year}"
+    if start.year != end.year:
+        return f"{start:%b} {start.day}, {start.year} – {end:%b} {end.day}, {end.year}"
+    if start.month != end.month:
+        return f"{start:%b} {start.day} – {end:%b} {end.day}, {end.year}"
+    return f"{start:%b} {start.day}–{end.day}, {end.year}"
+
+
+def proposals(batch: TripImport) -> tuple[list[dict], list]:
+    """(proposals in time order, photos not placed) for the review page."""
+    photos = (TripImportPhoto.query.filter_by(import_id=batch.id)
+              .order_by(TripImportPhoto.cluster, TripImportPhoto.taken_at, TripImportPhoto.id).all())
+    groups, unplaced = {}, []
+    for p in photos:
+        (unplaced if p.cluster is None else groups.setdefault(p.cluster, [])).append(p)
+    out = []
+    for label, members in sorted(groups.items()):
+        times = [p.taken_at for p in members if p.taken_at]
+        lat, lon = centroid([(p.lat, p.lon) for p in members if p.lat is not None])
+        start, end = (min(times), max(times)) if times else (None, None)
+        out.append({
+            "cluster": label, "count": len(members), "start": start, "end": end,
+            "lat": round(lat, 6), "lon": round(lon, 6),
+            "title": f"Trip, {_date_range(start, end)}", "address": f"{lat:.4f}, {lon:.4f}",
+            "preview": members[:PREVIEW_PHOTOS],
+        })
+    return out, unplaced
+
+
+def commit(batch: TripImport, chosen: dict) -> list[Trip]:
+    """
+    Create a Trip for each {cluster: (title, address)} in chosen, commit, and
+    only then move its photos into travel/<trip id>/, so a failed commit
+    leaves the staged files where the batch expects them. Returns the trips.
+    """
+    root = pathlib.Path(current_app.config["UPLOAD_ROOT"])
+    trips, moves = [], []
+    for label, (title, address) in sorted(chosen.items()):
+        members = (TripImportPhoto.query.filter_by(import_id=batch.id, cluster=label)
+                   .order_by(TripImportPhoto.taken_at, TripImportPhoto.id).all())
+        coords = [(p.lat, p.lon) for p in members if p.lat is not None]
+        if not coords:
+            continue
+        lat, lon = centroid(coords)
+        trip = Trip(title=title, address=address, lat=round(lat, 6), lon=round(lon, 6))
+        db.session.add(trip)
+        db.session.flush()
+        photos, deltas = [], {}
+        for p in members:
+            rel = f"travel/{trip.id}/{pathlib.PurePosixPath(p.stored_path).name}"
+            moves.append((root / p.stored_path, root / rel))
+            for key, sign in ((storage.owner(p.stored_path), -1), (storage.owner(rel), 1)):
+                files, nbytes = deltas.get(key, (0, 0))
+                deltas[key] = (files + sign, nbytes + sign * (p.size_bytes or 0))
+            photos.append(Photo(trip_id=trip.id, stored_path=rel, thumb_path=None, original_name=p.original_name,
+                                mime_type=p.mime_type, size_bytes=p.size_bytes))
+        db.session.add_all(photos)
+        storage.adjust(deltas)
+        db.session.execute(delete(TripImportPhoto).where(TripImportPhoto.id.in_([p.id for p in members])))
+        db.session.flush()
+        for photo in photos:
+            jobs.enqueue("photo.thumb", {"photo_id": photo.id}, dedupe_key=f"photo.thumb:{photo.id}")
+        trips.append(trip)
+    if not TripImportPhoto.query.filter_by(import_id=batch.id).first():
+        db.session.delete(batch)
+    db.session.commit()
+    for src, dest in moves:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, dest)
+    return trips
+
+
+def discard(batch: TripImport):
+    """Delete the batch with its staged files; no commit."""
+    root = pathlib.Path(current_app.config["UPLOAD_ROOT"])
+    rels = db.session.execute(
+        db.select(TripImportPhoto.stored_path).where(TripImportPhoto.import_id == batch.id)).scalars().all()
+    deltas = {}
+    for rel in rels:
+        try:
+            size = (root / rel).stat().st_size
+            os.remove(root / rel)
+        except FileNotFoundError:
+            continue
+        files, nbytes = deltas.get(storage.owner(rel), (0, 0))
+        deltas[storage.owner(rel)] = (files - 1, nbytes - size)
+    storage.adjust(deltas)
+    db.session.execute(delete(TripImportPhoto).where(TripImportPhoto.import_id == batch.id))
+    db.session.delete(batch)
+    try:
+        os.rmdir(root / _batch_dir(batch.id))
+    except OSError:
+        pass
@@ -0,0 +1,165 @@
+"""
+Find (and optionally quarantine) files under UPLOAD_ROOT that no row
+references any more: images of deleted board items, replaced chapter PDFs,
+old home card previews, and so on.
+
+The referenced set is built on one connection in a TEMP table, filled from
+every column in PATH_COLUMNS in CHUNK-row batches, so memory stays flat however
+many rows there are. The upload tree is then walked with
+uploads.iter_upload_files (os.scandir, no list of the whole tree), and each
+CHUNK of candidate files is looked up in the temp table with one IN query.
+
+Files are matched by "family": an original and its thumbs/<stem>.jpg share a
+key (dir without a trailing "thumbs", plus the file stem). A row may store
+either one (boards keep the thumbnail, seating tables the original, trips
+both), so whichever is referenced keeps the other. Files younger than the
+grace period are never touched; they may belong to an upload that hasn't
+committed yet or a thumbnail job still queued.
+
+Quarantine moves files to UPLOAD_ROOT/.quarantine/<run>/<rel path> (dot dirs
+are skipped by the walk) so a mistake can be undone by moving them back;
+quarantine runs older than GC_QUARANTINE_DAYS are deleted. Moved files are
+taken off the storage_usage counters (see storage.py).
+"""
+import os
+import pathlib
+import shutil
+import time
+from datetime import datetime
+
+from sqlalchemy import select, text
+
+import storage
+from models import db, Chapter, HomeCard, Item, Photo, SeatingTable, TripImportPhoto, WeddingItem
+from uploads import iter_upload_files
+
+QUARANTINE_DIR = ".quarantine"
+CHUNK = 500
+
+# Every column that holds a path relative to UPLOAD_ROOT. Add new ones here.
+PATH_COLUMNS = (
+    HomeCard.image_path,
+    Chapter.source_path,
+    Item.cover_path, Item.cover_thumb_path, Item.source_path,
+    WeddingItem.image_path,
+    Photo.stored_path, Photo.thumb_path,
+    TripImportPhoto.stored_path,
+    SeatingTable.img_tiny, SeatingTable.img_rosie,
+)
+
+
+def family_key(rel: str) -> str:
+    """'wedding/photos/b1/thumbs/ab.jpg' and 'wedding/photos/b1/ab.png' -> 'wedding/photos/b1/ab'."""
+    rel = rel.replace("\\", "/").lstrip("/")
+    parent, _, name = rel.rpartition("/")
+    if parent == "thumbs" or parent.endswith("/thumbs"):
+        parent = parent[:-len("thumbs")].rstrip("/")
+    stem = name.rsplit(".", 1)[0] if "." in name else name
+    return f"{parent}/{stem}" if parent else stem
+
+
+def _load_references(conn) -> int:
+    conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS gc_ref (key TEXT PRIMARY KEY) WITHOUT ROWID")
+    conn.exec_driver_sql("DELETE FROM gc_ref")
+    insert = text("INSERT OR IGNORE INTO gc_ref (key) VALUES (:key)")
+    rows = 0
+    for col in PATH_COLUMNS:
+        result = conn.execution_options(yield_per=CHUNK).execute(select(col).where(col.isnot(None), col != ""))
+        for part in result.partitions():
+            conn.execute(insert, [{"key": family_key(p)} for (p,) in part])
+            rows += len(part)
+    return rows
+
+
+def _orphans(conn, root, cutoff: float, skip_prefixes):
+    """Yield (rel, size) for unreferenced files last modified before cutoff."""
+    batch = []
+
+    def flush():
+        keys = list({family_key(rel) for rel, _ in batch})
+        names = ", ".join(f":k{i}" for i in range(len(keys)))
+        found = set(conn.execute(text(f"SELECT key FROM gc_ref WHERE key IN ({names})"),
+                                 {f"k{i}": k for i, k in enumerate(keys)}).scalars())
+        out = [(rel, size) for rel, size in batch if family_key(rel) not in found]
+        batch.clear()
+        return out
+
+    for rel, entry in iter_upload_files(root):
+        if any(rel == p or rel.startswith(p + "/") for p in skip_prefixes):
+            continue
+        st = entry.stat(follow_symlinks=False)
+        if st.st_mtime >= cutoff:
+            continue
+        batch.append((rel, st.st_size))
+        if len(batch) >= CHUNK:
+            yield from flush()
+    if batch:
+        yield from flush()
+
+
+def _prune_empty_dirs(path: pathlib.Path, root: pathlib.Path):
+    while path != root and root in path.parents:
+        try:
+            path.rmdir()
+        except OSError:
+            return
+        path = path.parent
+
+
+def purge_quarantine(root, days: float, log=print) -> tuple[int, int]:
+    """Delete quarantine runs older than `days`; returns (runs, bytes)."""
+    qroot = pathlib.Path(root) / QUARANTINE_DIR
+    cutoff = time.time() - days * 86400
+    runs = freed = 0
+    if not qroot.is_dir():
+        return 0, 0
+    for run in qroot.iterdir():
+        if run.is_dir() and run.stat().st_mtime < cutoff:
+            freed += sum(e.stat(follow_symlinks=False).st_size for _, e in iter_upload_files(run))
+            shutil.rmtree(run, ignore_errors=True)
+            runs += 1
+            log(f"purged quarantine {run.name}")
+    return runs, freed
+
+
+def collect(root, grace_hours: float, quarantine: bool = False, skip_prefixes=(), log=print) -> dict:
+    """
+    Report unreferenced uploads older than grace_hours; with quarantine=True
+    also move them into UPLOAD_ROOT/.quarantine/<run>/. Must run inside an
+    app context. Returns counts, bytes and a per-area breakdown.
+    """
+    root = pathlib.Path(root)
+    cutoff = time.time() - grace_hours * 3600
+    run_dir = root / QUARANTINE_DIR / datetime.now().strftime("%Y%m%d-%H%M%S")
+    moved = {}
+    out = {"references": 0, "orphans": 0, "bytes": 0, "moved": 0, "areas": {}, "sample": [],
+           "quarantine": str(run_dir) if quarantine else None}
+
+    with db.engine.connect() as conn:
+        out["references"] = _load_references(conn)
+        for rel, size in _orphans(conn, root, cutoff, skip_prefixes):
+            out["orphans"] += 1
+            out["bytes"] += size
+            area = "/".join(rel.split("/")[:2]) if rel.count("/") > 1 else rel.split("/")[0]
+            n, b = out["areas"].get(area, (0, 0))
+            out["areas"][area] = (n + 1, b + size)
+            if len(out["sample"]) < 20:
+                out["sample"].append(rel)
+            if quarantine:
+                src = root / rel
+                dest = run_dir / rel
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.replace(src, dest)
+                except FileNotFoundError:
+                    continue  # removed meanwhile
+                out["moved"] += 1
+                key = storage.owner(rel)
+                files, nbytes = moved.get(key, (0, 0))
+                moved[key] = (files - 1, nbytes - size)
+                _prune_empty_dirs(src.parent, root)
+        conn.exec_driver_sql("DROP TABLE IF EXISTS gc_ref")
+    if moved:
+        storage.adjust(moved)
+        db.session.commit()
+    return out
@@ -0,0 +1,220 @@
+import os
+import pathlib
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import dupes
+import metrics
+import storage
+
+ALLOWED_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+def _looks_like_image(first_bytes: bytes, ext: str) -> bool:
+    if ext not in ALLOWED_EXTS:
+        return False
+    b = first_bytes
+    if b[:3] == b"\xFF\xD8\xFF": return True   # JPEG
+    if b[:8] == b"\x89PNG\r\n\x1a\n": return True
+    if b[:6] in (b"GIF87a", b"GIF89a"): return True
+    if len(b) >= 12 and b[:4] == b"RIFF" and b[8:12] == b"WEBP": return True
+    return False
+
+def _decodes_as_image(src) -> bool:
+    """Whether Pillow can parse src (path or open handle); verify() walks the file without decoding pixels."""
+    from PIL import Image, UnidentifiedImageError  # deferred: only upload paths pay for Pillow
+    try:
+        with Image.open(src) as im:
+            im.verify()
+        return True
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return False
+
+def _looks_like_pdf(first_bytes: bytes) -> bool:
+    # Most PDFs start with %PDF-
+    return first_bytes.startswith(b"%PDF-")
+
+# --- Upload tree ---
+def iter_upload_files(root):
+    """
+    Yield (rel_path, os.DirEntry) for every regular file under UPLOAD_ROOT,
+    streaming with os.scandir. Top-level dot dirs (.staging, .partial,
+    .locks, ...) hold work files, not uploads, and are skipped.
+    """
+    root = str(root)
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel_dir) if rel_dir else root)
+        except FileNotFoundError:
+            continue
+        with it:
+            for entry in it:
+                if not rel_dir and entry.name.startswith("."):
+                    continue
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(rel)
+                elif entry.is_file(follow_symlinks=False):
+                    yield rel, entry
+
+# --- Thumbnails ---
+@metrics.timed("thumbnail")
+def make_thumbnail(src_path, thumb_path: pathlib.Path, max_px: int, quality: int) -> int:
+    """
+    src_path may also be an open binary file (see ingest.IngestedFile.open).
+    Returns the image's dHash, taken from the already shrunk image (see dupes.py).
+    """
+    from PIL import Image, ImageOps  # deferred: only upload paths pay for Pillow
+    thumb_path.parent.mkdir(parents=True, exist_ok=True)
+    with Image.open(src_path) as im:
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((max_px, max_px), Image.LANCZOS)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGB")
+        elif im.mode == "RGBA":
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.split()[3])
+            im = bg
+        im.save(thumb_path, "JPEG", quality=quality, optimize=True, progressive=True)
+        return dupes.dhash(im)
+
+def save_item_cover(part, item_id, thumbnail: bool = True) -> tuple[str, str] | tuple[None, None]:
+    """
+    Store an ingested cover (see ingest.py) + a jpeg thumb, return (rel_original, rel_thumb) or (None,None).
+    With thumbnail=False only the original is moved into place; the caller queues the
+    thumb (see jobs.item_cover_thumb) and rel_thumb is where it will land.
+    """
+    if not part or not part.looks_like_image():
+        return None, None
+
+    base_dir = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / "tracker" / str(item_id)
+    thumbs_dir = base_dir / "thumbs"
+
+    uniq = f"cover{part.safe_ext}"
+    thumb_name = "cover.jpg"
+    rel_original = str(pathlib.Path("tracker") / str(item_id) / uniq)
+    rel_thumb = str(pathlib.Path("tracker") / str(item_id) / "thumbs" / thumb_name)
+    before = storage.sizes(rel_original, rel_thumb)
+
+    part.move_to(base_dir / uniq)
+    if thumbnail:
+        make_thumbnail(part.open(), thumbs_dir / thumb_name, current_app.config["THUMB_MAX_PX"], current_app.config["THUMB_QUALITY"])
+    storage.record(rel_original, rel_thumb if thumbnail else None, before=before)
+    return rel_original, rel_thumb
+
+def save_item_source(part, item_id) -> str | None:
+    """Store an ingested 'source' file (PDF for now). Returns relative path or None."""
+    if not part or (part.ext != ".pdf" and not part.looks_like_pdf()):
+        return None
+
+    # keep it predictable so re-uploads overwrite instead of piling up
+    dest = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / "tracker" / str(item_id) / "source" / "source.pdf"
+    rel = str(pathlib.Path("tracker") / str(item_id) / "source" / "source.pdf")
+    before = storage.sizes(rel)
+    part.move_to(dest)
+    storage.record(rel, before=before)
+    return rel
+
+CHAPTER_DIRNAME = "chapters"
+
+def _infer_chapter_number(filename: str) -> int | None:
+    """
+    Try to pull a chapter number from a filename:
+    Picks the last integer group (e.g., 'MySeries_ch_012_extra.pdf' -> 12)
+    """
+    base = os.path.splitext(os.path.basename(filename))[0].lower()
+    nums = re.findall(r"(\d+)", base)
+    if not nums:
+        return None
+    return int(nums[-1])
+
+def save_chapter_pdf(part, item_id: int, chap_num: int) -> str:
+    """
+    Store an ingested chapter PDF at UPLOAD_ROOT/tracker/<item_id>/chapters/ch-XXX.pdf
+    Returns a relative path like 'tracker/42/chapters/ch-001.pdf'
+    """
+    # verify it's a PDF by extension or header
+    if not (part.ext == ".pdf" or part.looks_like_pdf()):
+        raise ValueError("Not a PDF")
+    dest = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / "tracker" / str(item_id) / CHAPTER_DIRNAME / f"ch-{chap_num:03d}.pdf"
+    rel = str(pathlib.Path("tracker") / str(item_id) / CHAPTER_DIRNAME / dest.name)
+    before = storage.sizes(rel)
+    part.move_to(dest)
+    storage.record(rel, before=before)
+    return rel
+
+
+def save_wedding_image(part, bucket: str, item_id: int):
+    """
+    part: from ingest.ingest_request(); bucket: one of 'rings','cakes','photos'
+    returns (rel_original, rel_thumb) or (None, None)
+    """
+    if not part or not part.looks_like_image():
+        return None, None
+
+    base_dir = pathlib.Path(current_app.config["UPLOAD_ROOT"]) / "wedding" / bucket / str(item_id)
+    unique = f"{uuid.uuid4().hex}{part.safe_ext}"
+    part.move_to(base_dir / unique)
+
+    thumb_name = f"{pathlib.Path(unique).stem}.jpg"
+    make_thumbnail(part.open(), base_dir / "thumbs" / thumb_name, current_app.config["THUMB_MAX_PX"], current_app.config["THUMB_QUALITY"])
+
+    rel_original = str(pathlib.Path("wedding") / bucket / str(item_id) / unique)
+    rel_thumb = str(pathlib.Path("wedding") / bucket / str(item_id) / "thumbs" / thumb_name)
+    storage.record(rel_original, rel_thumb)
+    return rel_original, rel_thumb
+
+
+def store_wedding_batch(parts, bucket: str) -> list[tuple]:
+    """
+    Store a batch of parts from ingest.ingest_request() for wedding_upload().
+    They are renamed into one wedding/<bucket>/<batch>/ dir (so no item id is
+    needed up front) and thumbnailed on THUMB_WORKERS threads; Pillow releases the
+    GIL while decoding and resampling. Returns (rel_original, rel_thumb, error,
+    duplicate_of) per part, in order; a part that can't be thumbnailed is
+    removed again, and so is a near-duplicate when DUPLICATE_POLICY is "skip".
+    """
+    if not parts:
+        return []
+    cfg = current_app.config
+    root = pathlib.Path(cfg["UPLOAD_ROOT"])
+    rel_dir = pathlib.Path("wedding") / bucket / f"b{uuid.uuid4().hex[:12]}"
+    logger = current_app.logger  # the pool threads have no app context
+
+    planned = []
+    for part in parts:
+        unique = f"{uuid.uuid4().hex}{part.safe_ext}"
+        part.move_to(root / rel_dir / unique)
+        planned.append((part, rel_dir / unique, rel_dir / "thumbs" / f"{pathlib.Path(unique).stem}.jpg"))
+
+    def thumb(job):
+        part, rel, rel_thumb = job
+        try:
+            h = make_thumbnail(part.open(), root / rel_thumb, cfg["THUMB_MAX_PX"], cfg["THUMB_QUALITY"])
+        except Exception:
+            logger.warning("wedding upload: cannot thumbnail %s", part.filename, exc_info=True)
+            (root / rel).unlink(missing_ok=True)
+            return None, None, "not a readable image", None
+        return str(rel), str(rel_thumb), None, h
+
+    with ThreadPoolExecutor(max_workers=max(1, min(cfg["THUMB_WORKERS"], len(planned)))) as pool:
+        stored = list(pool.map(thumb, planned))
+    policy = dupes.policy()
+    matches = dupes.screen([h for *_, h in stored]) if policy != "off" else [None] * len(stored)
+    out = []
+    for (rel, rel_thumb, error, h), match in zip(stored, matches):
+        if match and policy == "skip":
+            (root / rel).unlink(missing_ok=True)
+            (root / rel_thumb).unlink(missing_ok=True)
+            out.append((None, None, f"near-duplicate of {match}", match))
+            continue
+        if not error:
+            dupes.record(rel_thumb, h)   # boards reference the thumbnail
+        out.append((rel, rel_thumb, error, match))
+    storage.record(*(p for rel, rel_thumb, error, _ in out if not error for p in (rel, rel_thumb)))
+    return out
+
@@ -0,0 +1,75 @@
+"""
+Change counters for cross-process cache invalidation.
+
+Each cached area ("wedding", ...) has a row in ``data_version``. Any ORM
+flush that adds, changes or deletes an instance of a tracked model bumps
+that row inside the same transaction, so the counter moves exactly when
+the data does, whichever gunicorn worker (or the job worker) wrote it.
+Raw ``UPDATE`` statements bypass the ORM and must call ``bump()``.
+
+Readers compare ``current(name)`` (one primary-key lookup) with the
+version their cached value was built at; ``VersionedCache`` does that
+plus a TTL.
+"""
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import db
+
+TRACKED = {}   # model class -> counter name
+_installed = False
+
+
+def track(model, name: str):
+    TRACKED[model] = name
+
+
+def bump(name: str, session=None):
+    (session or db.session).connection().execute(text(
+        "INSERT INTO data_version (name, version) VALUES (:n, 1)"
+        " ON CONFLICT(name) DO UPDATE SET version = version + 1"
+    ), {"n": name})
+
+
+def current(name: str) -> int:
+    return db.session.execute(text("SELECT version FROM data_version WHERE name = :n"), {"n": name}).scalar() or 0
+
+
+def _after_flush(session, flush_context):
+    names = {TRACKED[type(obj)] for objs in (session.new, session.dirty, session.deleted)
+             for obj in objs if type(obj) in TRACKED}
+    for name in sorted(names):
+        bump(name, session)
+
+
+def install():
+    global _installed
+    if not _installed:
+        event.listen(Session, "after_flush", _after_flush)
+        _installed = True
+
+
+class VersionedCache:
+    """Small per-process cache whose entries die when their data_version moves or after ttl seconds."""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = {}   # key -> (version, expires, value)
+
+    def get(self, key, version: int):
+        with self._lock:
+            hit = self._data.get(key)
+        if hit and hit[0] == version and hit[1] > time.monotonic():
+            return hit[2]
+        return None
+
+    def put(self, key, version: int, value, ttl: float):
+        with self._lock:
+            if len(self._data) >= self.max_entries and key not in self._data:
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = (version, time.monotonic() + ttl, value)
+        return value
@@ -0,0 +1,333 @@
+"""
+Fitness log: workout sessions, their samples, and trend rollups.
+
+Samples are stored one row per (session, metric) in workout_series, as a
+packed little-endian array: metric "t" is the shared axis of second offsets
+from started_at (array('I')), every other metric is an array('f') aligned
+to it, with NaN where a reading is missing. An hour at 1 Hz with heart rate,
+cadence and power is about 58 kB in four rows instead of 14,400 rows.
+min/max/avg are kept beside each array so lists never unpack them.
+
+workout_rollup holds per user/activity totals by day, ISO week (starting
+Monday) and month. ``add_session()`` adds to the three buckets with an
+upsert in the same transaction; deleting or editing a session recomputes
+just the buckets it touched from workout_session. A trend chart over years
+reads at most a few hundred rollup rows and never touches samples.
+``rebuild()`` recomputes every bucket (manage.py fitness-rollups).
+"""
+import math
+import sys
+from array import array
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, case, delete, func, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, WorkoutRollup, WorkoutRoute, WorkoutSeries, WorkoutSession
+
+ACTIVITIES = ("run", "ride", "walk", "hike", "swim", "strength", "yoga", "other")
+METRICS = {"heart_rate": "bpm", "speed": "m/s", "cadence": "rpm", "power": "W",
+           "elevation": "m", "distance": "m"}
+PERIODS = ("day", "week", "month")
+MAX_SAMPLES = 200_000      # per metric; a day at 1 Hz is 86,400
+PAGE_SIZE = 20
+
+
+# ---------------- Packing ----------------
+def pack(values, typecode: str = "f") -> bytes:
+    arr = array(typecode, values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def unpack(blob: bytes, typecode: str = "f") -> array:
+    arr = array(typecode)
+    arr.frombytes(blob)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def _clean(values) -> list:
+    return [float("nan") if v is None else float(v) for v in values]
+
+
+def _series(session_id: int, metric: str, values) -> WorkoutSeries:
+    if metric == "t":
+        return WorkoutSeries(session_id=session_id, metric="t", n=len(values), data=pack(values, "I"))
+    present = [v for v in values if not math.isnan(v)]
+    return WorkoutSeries(
+        session_id=session_id, metric=metric, n=len(values), data=pack(values),
+        v_min=min(present) if present else None, v_max=max(present) if present else None,
+        v_avg=sum(present) / len(present) if present else None)
+
+
+def check_samples(samples: dict) -> tuple[list, dict]:
+    """
+    Validate {"t": [seconds...], metric: [values...], ...}; returns (t, {metric: floats}).
+    Raises ValueError with a message fit for the user.
+    """
+    if not isinstance(samples, dict):
+        raise ValueError("samples must be an object of metric lists")
+    t = samples.get("t")
+    if not isinstance(t, list) or not t:
+        raise ValueError("samples need a non-empty 't' list of second offsets")
+    if len(t) > MAX_SAMPLES:
+        raise ValueError(f"at most {MAX_SAMPLES} samples per metric")
+    try:
+        t = [int(x) for x in t]
+    except (TypeError, ValueError):
+        raise ValueError("'t' must be whole seconds") from None
+    if t[0] < 0 or any(b < a for a, b in zip(t, t[1:])):
+        raise ValueError("'t' must be non-negative and ascending")
+    metrics = {}
+    for name, values in samples.items():
+        if name == "t":
+            continue
+        if name not in METRICS:
+            raise ValueError(f"unknown metric {name!r}; expected one of {', '.join(METRICS)}")
+        if not isinstance(values, list) or len(values) != len(t):
+            raise ValueError(f"{name} must have one value per 't' entry")
+        try:
+            metrics[name] = _clean(values)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} values must be numbers or null") from None
+    return t, metrics
+
+
+# ---------------- Rollups ----------------
+def period_start(d: date, period: str) -> date:
+    if period == "day":
+        return d
+    if period == "week":
+        return d - timedelta(days=d.weekday())
+    return d.replace(day=1)
+
+
+def period_end(start: date, period: str) -> date:
+    if period == "day":
+        return start + timedelta(days=1)
+    if period == "week":
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _bump_rollups(ws: WorkoutSession):
+    day = ws.started_at.date()
+    hr = ws.avg_hr is not None and ws.duration_s
+    rows = [{
+        "user_id": ws.user_id, "period": p, "period_start": period_start(day, p), "activity": ws.activity,
+        "sessions": 1, "duration_s": ws.duration_s or 0, "distance_m": ws.distance_m or 0,
+        "calories": ws.calories or 0, "hr_sum": (ws.avg_hr * ws.duration_s) if hr else 0,
+        "hr_seconds": ws.duration_s if hr else 0, "max_hr": ws.max_hr,
+    } for p in PERIODS]
+    stmt = sqlite_insert(WorkoutRollup).values(rows)
+    ex = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WorkoutRollup.user_id, WorkoutRollup.period, WorkoutRollup.period_start,
+                        WorkoutRollup.activity],
+        set_={c: getattr(WorkoutRollup, c) + getattr(ex, c)
+              for c in ("sessions", "duration_s", "distance_m", "calories", "hr_sum", "hr_seconds")}
+        | {"max_hr": func.max(func.coalesce(WorkoutRollup.max_hr, ex.max_hr),
+                              func.coalesce(ex.max_hr, WorkoutRollup.max_hr))},
+    )
+    db.session.execute(stmt)
+
+
+def _bucket_expr(period: str):
+    started = WorkoutSession.started_at
+    if period == "day":
+        return func.date(started)
+    if period == "week":
+        return func.date(started, "weekday 0", "-6 days")   # the Monday on or before
+    return func.date(started, "start of month")
+
+
+def _rebuild_select(period: str, *where):
+    hr = WorkoutSession.avg_hr.isnot(None)
+    return (select(
+        WorkoutSession.user_id, literal(period), _bucket_expr(period), WorkoutSession.activity,
+        func.count(), func.coalesce(func.sum(WorkoutSession.duration_s), 0),
+        func.coalesce(func.sum(WorkoutSession.distance_m), 0), func.coalesce(func.sum(WorkoutSession.calories), 0),
+        func.coalesce(func.sum(case((hr, WorkoutSession.avg_hr * WorkoutSession.duration_s), else_=0)), 0),
+        func.coalesce(func.sum(case((hr, WorkoutSession.duration_s), else_=0)), 0),
+        func.max(WorkoutSession.max_hr))
+        .where(*where)
+        .group_by(WorkoutSession.user_id, _bucket_expr(period), WorkoutSession.activity))
+
+
+_ROLLUP_COLS = ("user_id", "period", "period_start", "activity", "sessions", "duration_s", "distance_m",
+                "calories", "hr_sum", "hr_seconds", "max_hr")
+
+
+def _rebuild_buckets(user_id: int, activity: str, day: date):
+    """Recompute the day/week/month buckets containing `day` from workout_session."""
+    for p in PERIODS:
+        start = period_start(day, p)
+        end = period_end(start, p)
+        db.session.execute(delete(WorkoutRollup).where(
+            WorkoutRollup.user_id == user_id, WorkoutRollup.period == p,
+            WorkoutRollup.period_start == start, WorkoutRollup.activity == activity))
+        db.session.execute(WorkoutRollup.__table__.insert().from_select(_ROLLUP_COLS, _rebuild_select(
+            p, WorkoutSession.user_id == user_id, WorkoutSession.activity == activity,
+            WorkoutSession.started_at >= datetime.combine(start, datetime.min.time()),
+            WorkoutSession.started_at < datetime.combine(end, datetime.min.time()))))
+
+
+def rebuild(user_id: int | None = None) -> int:
+    """Recompute all rollups (for one user or everyone); no commit. Returns rows written."""
+    cond = [WorkoutRollup.user_id == user_id] if user_id is not None else []
+    db.session.execute(delete(WorkoutRollup).where(*cond))
+    where = [WorkoutSession.user_id == user_id] if user_id is not None else []
+    for p in PERIODS:
+        db.session.execute(WorkoutRollup.__table__.insert().from_select(_ROLLUP_COLS, _rebuild_select(p, *where)))
+    return db.session.query(func.count()).select_from(WorkoutRollup).filter(*cond).scalar()
+
+
+# ---------------- Sessions ----------------
+def local_naive(dt: datetime) -> datetime:
+    """Sessions are bucketed by the local day they started on; aware times are converted."""
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def add_session(user_id: int, activity: str, started_at: datetime, duration_s: int | None = None,
+                distance_m=None, calories=None, avg_hr=None, max_hr=None, title=None, notes=None,
+                source: str = "manual", samples: dict | None = None, source_ref: str | None = None,
+                elevation_gain_m=None) -> WorkoutSession:
+    """
+    Insert a session, its packed samples and its rollups; no commit. Duration,
+    average and max heart rate default to what the samples say.
+    Raises ValueError for bad input.
+    """
+    if activity not in ACTIVITIES:
+        raise ValueError(f"activity must be one of {', '.join(ACTIVITIES)}")
+    t, metrics = check_samples(samples) if samples else ([], {})
+    hr = [v for v in metrics.get("heart_rate", ()) if not math.isnan(v)]
+    if duration_s is None:
+        duration_s = t[-1] - t[0] if t else 0
+    if avg_hr is None and hr:
+        avg_hr = round(sum(hr) / len(hr), 1)
+    if max_hr is None and hr:
+        max_hr = max(hr)
+    if duration_s < 0 or (distance_m or 0) < 0:
+        raise ValueError("duration and distance can't be negative")
+
+    ws = WorkoutSession(user_id=user_id, activity=activity, started_at=local_naive(started_at), duration_s=int(duration_s),
+                        distance_m=distance_m, calories=calories, avg_hr=avg_hr, max_hr=max_hr,
+                        title=title or None, notes=notes or None, source=source, source_ref=source_ref,
+                        elevation_gain_m=elevation_gain_m)
+    db.session.add(ws)
+    db.session.flush()
+    if t:
+        db.session.add_all([_series(ws.id, "t", t)] + [_series(ws.id, m, v) for m, v in metrics.items()])
+    _bump_rollups(ws)
+    return ws
+
+
+def update_session(ws: WorkoutSession, **fields):
+    """Change summary fields (not samples) and refresh the old and new buckets; no commit."""
+    if fields.get("activity", ws.activity) not in ACTIVITIES:
+        raise ValueError(f"activity must be one of {', '.join(ACTIVITIES)}")
+    if (fields.get("duration_s") or 0) < 0 or (fields.get("distance_m") or 0) < 0:
+        raise ValueError("duration and distance can't be negative")
+    old = (ws.activity, ws.started_at.date())
+    if fields.get("started_at"):
+        fields["started_at"] = local_naive(fields["started_at"])
+    for k, v in fields.items():
+        setattr(ws, k, v)
+    db.session.flush()
+    _rebuild_buckets(ws.user_id, *old)
+    if (ws.activity, ws.started_at.date()) != old:
+        _rebuild_buckets(ws.user_id, ws.activity, ws.started_at.date())
+
+
+def delete_session(ws: WorkoutSession):
+    """Delete a session with its samples and route and fix its buckets; no commit."""
+    user_id, activity, day = ws.user_id, ws.activity, ws.started_at.date()
+    db.session.execute(delete(WorkoutSeries).where(WorkoutSeries.session_id == ws.id))
+    db.session.execute(delete(WorkoutRoute).where(WorkoutRoute.session_id == ws.id))
+    db.session.delete(ws)
+    db.session.flush()
+    _rebuild_buckets(user_id, activity, day)
+
+
+def sessions_page(user_id: int, page: int = 1, activity: str | None = None, size: int = PAGE_SIZE):
+    """(sessions, has_next), newest first (ix_workout_session_user_started)."""
+    page = max(1, page)
+    q = WorkoutSession.query.filter(WorkoutSession.user_id == user_id)
+    if activity:
+        q = q.filter(WorkoutSession.activity == activity)
+    rows = q.order_by(WorkoutSession.started_at.desc(), WorkoutSession.id.desc()).offset((page - 1) * size).limit(size + 1).all()
+    return rows[:size], len(rows) > size
+
+
+def samples(session_id: int, points: int | None = None) -> dict:
+    """{"t": [...], metric: [...]} for a session, averaged down to about `points` samples if given."""
+    rows = WorkoutSeries.query.filter_by(session_id=session_id).all()
+    by_metric = {r.metric: unpack(r.data, "I" if r.metric == "t" else "f") for r in rows}
+    t = by_metric.pop("t", array("I"))
+    out = {"t": list(t), **{m: [None if math.isnan(v) else round(v, 2) for v in vals] for m, vals in by_metric.items()}}
+    if not points or len(t) <= points:
+        return out
+    step = math.ceil(len(t) / points)
+    reduced = {"t": out["t"][::step]}
+    for m, vals in out.items():
+        if m == "t":
+            continue
+        chunks = (vals[i:i + step] for i in range(0, len(vals), step))
+        reduced[m] = [round(sum(c) / len(c), 2) if (c := [v for v in chunk if v is not None]) else None
+                      for chunk in chunks]
+    return reduced
+
+
+# ---------------- Trends ----------------
+def trend(user_id: int, period: str = "week", count: int = 26, activity: str | None = None,
+          today: date | None = None) -> list[dict]:
+    """The last `count` periods up to today, oldest first, zero-filled; one rollup range scan."""
+    today = today or date.today()
+    end = period_start(today, period)
+    start = end
+    for _ in range(count - 1):
+        start = period_start(start - timedelta(days=1), period)
+    q = (db.session.query(
+            WorkoutRollup.period_start, func.sum(WorkoutRollup.sessions), func.sum(WorkoutRollup.duration_s),
+            func.sum(WorkoutRollup.distance_m), func.sum(WorkoutRollup.calories),
+            func.sum(WorkoutRollup.hr_sum), func.sum(WorkoutRollup.hr_seconds), func.max(WorkoutRollup.max_hr))
+         .filter(WorkoutRollup.user_id == user_id, WorkoutRollup.period == period,
+                 WorkoutRollup.period_start.between(start, end)))
+    if activity:
+        q = q.filter(WorkoutRollup.activity == activity)
+    rows = {r[0]: r for r in q.group_by(WorkoutRollup.period_start)}
+    out, cur = [], start
+    while cur <= end:
+        r = rows.get(cur)
+        out.append({
+            "start": cur.isoformat(),
+            "sessions": r[1] if r else 0,
+            "duration_s": r[2] if r else 0,
+            "distance_m": round(r[3], 1) if r else 0,
+            "calories": r[4] if r else 0,
+            "avg_hr": round(r[5] / r[6], 1) if r and r[6] else None,
+            "max_hr": r[7] if r else None,
+        })
+        cur = period_end(cur, period)
+    return out
+
+
+def totals(user_id: int, today: date | None = None) -> dict:
+    """This week's and this month's totals plus this year's, from the week/month rollups."""
+    today = today or date.today()
+    week, month, year = period_start(today, "week"), period_start(today, "month"), today.replace(month=1, day=1)
+    r = WorkoutRollup
+    is_week = and_(r.period == "week", r.period_start == week)
+    is_month = and_(r.period == "month", r.period_start == month)
+    is_year = and_(r.period == "month", r.period_start >= year)
+    cols = []
+    for cond in (is_week, is_month, is_year):
+        cols += [func.coalesce(func.sum(case((cond, c), else_=0)), 0) for c in (r.sessions, r.duration_s, r.distance_m)]
+    row = (db.session.query(*cols)
+           .filter(r.user_id == user_id, r.period.in_(("week", "month")), r.period_start >= min(week, year))
+           .one())
+    keys = ("sessions", "duration_s", "distance_m")
+    return {name: dict(zip(keys, row[i * 3:i * 3 + 3])) for i, name in enumerate(("week", "month", "year"))}